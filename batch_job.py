@@ -0,0 +1,237 @@
+"""Офлайн-генерация фактов, вопросов квиза и рекомендаций через Batch API
+
+Число запросов ограничивается свободным местом в пуле (POOL_CAPACITY на тему)
+и RESPONSE_CACHE_VARIANTS для рекомендаций, чтобы не платить за отброшенные ответы.
+Файл пула задача не переписывает: результаты кладутся во входящие пула,
+и работающий бот забирает их сам (ContentPool.submit/take_inbox).
+
+Запуск:
+    python batch_job.py --facts 10 --quiz-per-topic 10 --recommendations 3
+    python batch_job.py --fake   # локальная проверка без обращения к OpenAI
+"""
+import argparse
+import json
+import logging
+import time
+from openai import OpenAI
+from config import CHATGPT_TOKEN, OPENAI_MODEL, RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_VARIANTS
+from data.quiz_topics import QUIZ_TOPICS
+from handlers.recommendations import GENRES, RECOMMENDATION_TEMPLATES
+from services.content_pool import content_pool, FACT_TOPIC, quiz_topic, is_valid_quiz_item
+from services.openai_client import (POOL_FACT_TEMPERATURE, QUIZ_TEMPERATURE, mode_temperature, response_cache_key,
+                                   route_for)
+from services.prompts import FACT_PROMPT, chatgpt_messages, quiz_question_messages
+from services.quiz_question import QuizQuestion
+from services.response_cache import response_cache
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+logger = logging.getLogger(__name__)
+
+COMPLETIONS_URL = "/v1/chat/completions"
+
+
+class OpenAIBatchAPI:
+    """Пакетная генерация через OpenAI Batch API"""
+
+    def __init__(self, api_key: str):
+        self.client = OpenAI(api_key=api_key)
+
+    def submit(self, jsonl: bytes) -> str:
+        """Загрузка JSONL-файла и создание пакета; возвращает id пакета"""
+        batch_file = self.client.files.create(file=("batch.jsonl", jsonl), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=COMPLETIONS_URL,
+            completion_window="24h"
+        )
+        return batch.id
+
+    def poll(self, batch_id: str):
+        """Статус пакета и JSONL с результатами, если он завершён"""
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status == "completed" and batch.output_file_id:
+            return batch.status, self.client.files.content(batch.output_file_id).text
+        return batch.status, None
+
+
+class FakeBatchAPI:
+    """Локальная подмена Batch API с детерминированными ответами"""
+
+    def __init__(self):
+        self._batches = {}
+
+    def submit(self, jsonl: bytes) -> str:
+        batch_id = f"fake_batch_{len(self._batches) + 1}"
+        results = []
+        for line in jsonl.decode('utf-8').splitlines():
+            request = json.loads(line)
+            results.append(json.dumps({
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {"choices": [{"message": {"content": self._answer(request["custom_id"])}}]}
+                },
+                "error": None
+            }, ensure_ascii=False))
+        self._batches[batch_id] = "\n".join(results)
+        return batch_id
+
+    def poll(self, batch_id: str):
+        return "completed", self._batches[batch_id]
+
+    @staticmethod
+    def _answer(custom_id: str) -> str:
+        kind, _, number = custom_id.rpartition(":")
+        if kind.startswith("quiz_"):
+            return QuizQuestion(f"Тестовый вопрос {number} ({kind})?", ["Первый", "Второй", "Третий", "Четвёртый"],
+                                int(number) % 4, f"Тестовое объяснение {number}.").to_json()
+        return f"Тестовый ответ {number} для {kind}."
+
+
+def batch_model(task: str, messages: list):
+    """Модель, которую бот выберет для такого запроса, или None, если задача направлена не в OpenAI"""
+    route = route_for(task, messages)
+    return route.model if route.provider.name == "openai" else None
+
+
+def pool_count(topic: str, wanted: int) -> int:
+    """Число запросов для темы пула: не больше свободного места, лишнее пул всё равно отбросит"""
+    count = min(wanted, content_pool.free(topic))
+    if count < wanted:
+        logger.info(f"Пул {topic}: свободно {content_pool.free(topic)}, запрошу {count} из {wanted}")
+    return count
+
+
+def build_requests(facts: int, quiz_per_topic: int, recommendations: int) -> list:
+    """Список запросов пакета: (custom_id, messages, temperature, model)"""
+    requests = []
+    fact_messages = chatgpt_messages(FACT_PROMPT, "fact")
+    fact_model = batch_model("fact", fact_messages) or OPENAI_MODEL
+    for number in range(pool_count(FACT_TOPIC, facts)):
+        requests.append((f"{FACT_TOPIC}:{number}", fact_messages, POOL_FACT_TEMPERATURE, fact_model))
+
+    for topic_key, topic_data in QUIZ_TOPICS.items():
+        messages = quiz_question_messages(topic_data['prompt'])
+        model = batch_model("quiz", messages) or OPENAI_MODEL
+        for number in range(pool_count(quiz_topic(topic_key), quiz_per_topic)):
+            requests.append((f"{quiz_topic(topic_key)}:{number}", messages, QUIZ_TEMPERATURE, model))
+
+    # Кэш хранит не больше RESPONSE_CACHE_VARIANTS вариантов на ключ
+    if recommendations > RESPONSE_CACHE_VARIANTS:
+        logger.info(f"Рекомендаций на жанр: {RESPONSE_CACHE_VARIANTS} вместо {recommendations} (RESPONSE_CACHE_VARIANTS)")
+        recommendations = RESPONSE_CACHE_VARIANTS
+    for category, template in RECOMMENDATION_TEMPLATES.items():
+        for genre_idx, genre in enumerate(GENRES[category]):
+            if not recommendations:
+                break
+            messages = chatgpt_messages(template.format(genre=genre), "default")
+            # Ключ кэша включает модель: ответы другой модели бот не найдёт
+            model = batch_model("default", messages)
+            if model is None:
+                logger.warning(f"Рекомендации {category}/{genre} бот запрашивает не у OpenAI - пропускаю")
+                continue
+            for number in range(recommendations):
+                requests.append((f"recommend_{category}_{genre_idx}:{number}", messages, mode_temperature("default"),
+                                 model))
+    return requests
+
+
+def to_jsonl(requests: list) -> bytes:
+    """Сериализация запросов в формат Batch API; вопросы квиза запрашиваются в режиме JSON"""
+    lines = []
+    for custom_id, messages, temperature, model in requests:
+        body = {"model": model, "messages": messages, "temperature": temperature}
+        if custom_id.startswith("quiz_"):
+            body["response_format"] = {"type": "json_object"}
+        lines.append(json.dumps({"custom_id": custom_id, "method": "POST", "url": COMPLETIONS_URL, "body": body},
+                                ensure_ascii=False))
+    return "\n".join(lines).encode('utf-8')
+
+
+def store_results(output: str, requests: list) -> dict:
+    """Разбор результатов пакета и сохранение их в пул и кэш ответов"""
+    by_id = {custom_id: (messages, temperature, model) for custom_id, messages, temperature, model in requests}
+    stats = {"stored": 0, "invalid": 0, "failed": 0, "dropped": 0}
+    delivered = {}
+
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        custom_id = result.get("custom_id", "")
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200 or custom_id not in by_id:
+            stats["failed"] += 1
+            continue
+
+        text = response["body"]["choices"][0]["message"]["content"]
+        kind = custom_id.rpartition(":")[0]
+
+        if kind.startswith("recommend_"):
+            messages, temperature, model = by_id[custom_id]
+            response_cache.put(response_cache_key(messages, temperature, model), text, RESPONSE_CACHE_VARIANTS)
+            stats["stored"] += 1
+            continue
+        if kind.startswith("quiz_") and not is_valid_quiz_item(text):
+            stats["invalid"] += 1
+            continue
+
+        # В пул квиза попадает нормализованная запись, а не исходный текст модели
+        item = QuizQuestion.from_json(text).to_json() if kind.startswith("quiz_") else text
+        # Не добавленный элемент - дубликат или пул успел заполниться фоновым пополнением
+        if content_pool.add(kind, [item]):
+            delivered.setdefault(kind, []).append(item)
+            stats["stored"] += 1
+        else:
+            stats["dropped"] += 1
+
+    if delivered:
+        content_pool.submit(delivered)
+    return stats
+
+
+def run(api, facts: int, quiz_per_topic: int, recommendations: int, poll_interval: float) -> dict:
+    """Полный цикл: сборка пакета, отправка, ожидание и сохранение результатов"""
+    if recommendations and RESPONSE_CACHE_BACKEND != "sqlite":
+        logger.warning("Кэш ответов хранится в памяти - рекомендации не сохранятся после завершения задачи")
+
+    # Свободное место - с учётом элементов, которые бот ещё не забрал из входящих
+    content_pool.load(inbox=True)
+    requests = build_requests(facts, quiz_per_topic, recommendations)
+    if not requests:
+        logger.info("Пулы заполнены, рекомендации не запрошены - пакет не нужен")
+        return {"stored": 0, "invalid": 0, "failed": 0, "dropped": 0}
+    batch_id = api.submit(to_jsonl(requests))
+    logger.info(f"Отправлен пакет {batch_id}: {len(requests)} запросов")
+
+    while True:
+        status, output = api.poll(batch_id)
+        if output is not None:
+            break
+        if status in ("failed", "expired", "cancelled"):
+            raise RuntimeError(f"Пакет {batch_id} завершился со статусом {status}")
+        time.sleep(poll_interval)
+
+    stats = store_results(output, requests)
+    logger.info(f"Пакет {batch_id} обработан: {stats}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная генерация контента для бота")
+    parser.add_argument("--facts", type=int, default=20, help="число фактов")
+    parser.add_argument("--quiz-per-topic", type=int, default=10, help="число вопросов на тему квиза")
+    parser.add_argument("--recommendations", type=int, default=0, help="вариантов рекомендаций на жанр")
+    parser.add_argument("--poll-interval", type=float, default=60.0, help="интервал опроса статуса, с")
+    parser.add_argument("--fake", action="store_true", help="использовать локальную подмену API")
+    args = parser.parse_args()
+
+    api = FakeBatchAPI() if args.fake else OpenAIBatchAPI(CHATGPT_TOKEN)
+    run(api, args.facts, args.quiz_per_topic, args.recommendations, args.poll_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,3 +9,166 @@ CHATGPT_TOKEN = os.getenv("CHATGPT_TOKEN")
 
 if not all([TG_BOT_TOKEN, CHATGPT_TOKEN]):
     raise ValueError("Введите токены в .env")
+
+# Параметры OpenAI
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+# Изображения меню и кэш их file_id в Telegram
+IMAGES_DIR = os.getenv("IMAGES_DIR", os.path.join("data", "images"))
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", os.path.join("data", "media_cache.json"))
+
+# Потоковые ответы: частота редактирования сообщения в Telegram и повтора индикатора «печатает»
+# (Telegram показывает его около 5 секунд)
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "0.7"))
+STREAM_EDIT_MIN_CHARS = int(os.getenv("STREAM_EDIT_MIN_CHARS", "40"))
+TYPING_INTERVAL = float(os.getenv("TYPING_INTERVAL", "4"))
+
+# Кэш ответов модели: memory или sqlite
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join("data", "response_cache.sqlite3"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_VARIANTS = int(os.getenv("RESPONSE_CACHE_VARIANTS", "3"))
+
+# Пул заранее сгенерированных фактов и вопросов квиза
+POOL_CAPACITY = int(os.getenv("POOL_CAPACITY", "10"))
+POOL_LOW_WATER = int(os.getenv("POOL_LOW_WATER", "3"))
+POOL_PATH = os.getenv("POOL_PATH", os.path.join("data", "content_pool.json"))
+
+# Хранилище состояния пользователей: memory, sqlite или redis
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join("data", "state.sqlite3"))
+STATE_REDIS_URLS = os.getenv("STATE_REDIS_URLS", "redis://localhost:6379/0")
+STATE_REDIS_TIMEOUT = float(os.getenv("STATE_REDIS_TIMEOUT", "5"))
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "30"))
+STATE_HOT_LIMIT = int(os.getenv("STATE_HOT_LIMIT", "10000"))
+# Копия пользователя, не тронутая дольше STATE_HOT_TTL секунд, перечитывается из хранилища
+STATE_HOT_TTL = float(os.getenv("STATE_HOT_TTL", "300"))
+
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_SET = os.getenv("WEBHOOK_SET", "1") == "1"
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+
+# Параллельная обработка обновлений разных чатов
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+
+# История диалога: бюджет токенов на окно реплик и размер резюме
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+
+# Устойчивость запросов к OpenAI
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_DEADLINE = float(os.getenv("OPENAI_DEADLINE", "30"))
+OPENAI_RETRIES = int(os.getenv("OPENAI_RETRIES", "3"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "8"))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "0") == "1"
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", "10"))
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "60"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+
+# Контроль нагрузки: лимит запросов пользователя к модели и общий бюджет токенов OpenAI
+USER_RATE_PER_MINUTE = float(os.getenv("USER_RATE_PER_MINUTE", "6"))
+USER_BURST = float(os.getenv("USER_BURST", "3"))
+OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "90000"))
+COMPLETION_TOKEN_ESTIMATE = int(os.getenv("COMPLETION_TOKEN_ESTIMATE", "400"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "20"))
+
+# Лимиты исходящих запросов к Telegram Bot API. Flood wait (RetryAfter) повторяет только TelegramRateLimiter:
+# TG_MAX_RETRIES раз по умолчанию, вызов может задать своё число через rate_limit_args (0 - без повторов)
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "30"))
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", "1"))
+TG_CHAT_BURST = float(os.getenv("TG_CHAT_BURST", "3"))
+TG_GROUP_RATE_PER_MINUTE = float(os.getenv("TG_GROUP_RATE_PER_MINUTE", "20"))
+TG_MAX_RETRIES = int(os.getenv("TG_MAX_RETRIES", "2"))
+
+# Семантический кэш вопросов ChatGPT-интерфейса; SEMANTIC_INDEX: exact, approximate или auto
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "0") == "1"
+SEMANTIC_THRESHOLD = float(os.getenv("SEMANTIC_THRESHOLD", "0.92"))
+SEMANTIC_DIM = int(os.getenv("SEMANTIC_DIM", "1024"))
+SEMANTIC_INDEX = os.getenv("SEMANTIC_INDEX", "auto")
+SEMANTIC_EXACT_LIMIT = int(os.getenv("SEMANTIC_EXACT_LIMIT", "5000"))
+SEMANTIC_MAX_ENTRIES = int(os.getenv("SEMANTIC_MAX_ENTRIES", "20000"))
+SEMANTIC_TTL = float(os.getenv("SEMANTIC_TTL", str(7 * 24 * 3600)))
+SEMANTIC_MIN_WORDS = int(os.getenv("SEMANTIC_MIN_WORDS", "3"))
+# Файл аудита попаданий и почти-попаданий с текстами вопросов пользователей; пусто - не пишется
+SEMANTIC_AUDIT_PATH = os.getenv("SEMANTIC_AUDIT_PATH", "")
+
+# Бэкенды моделей: локальный OpenAI-совместимый сервер и детерминированная подмена.
+# LLM_ROUTES направляет задачи (default, translate, fact, personality, quiz, summary)
+# на бэкенды openai, local или fake, при необходимости с моделью: "fact=local,quiz=openai:gpt-4o-mini"
+LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL", "http://127.0.0.1:8080/v1")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "local")
+LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY", "local")
+LOCAL_LLM_CONCURRENCY = int(os.getenv("LOCAL_LLM_CONCURRENCY", "2"))
+LOCAL_LLM_TIMEOUT = float(os.getenv("LOCAL_LLM_TIMEOUT", "120"))
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0"))
+LLM_DEFAULT_PROVIDER = os.getenv("LLM_DEFAULT_PROVIDER", "openai")
+LLM_ROUTES = os.getenv("LLM_ROUTES", "")
+
+# Выбор модели по длине промпта и задержке: длинные промпты уходят по LLM_LONG_ROUTES,
+# при нарушении SLO (p95 в секундах, например "translate=1.5") - на LLM_SLO_FALLBACK
+LLM_LONG_ROUTES = os.getenv("LLM_LONG_ROUTES", "")
+LLM_LONG_PROMPT_TOKENS = int(os.getenv("LLM_LONG_PROMPT_TOKENS", "1500"))
+LLM_SLOS = os.getenv("LLM_SLOS", "translate=1.5")
+LLM_SLO_FALLBACK = os.getenv("LLM_SLO_FALLBACK", "")
+LLM_LATENCY_WINDOW = float(os.getenv("LLM_LATENCY_WINDOW", "300"))
+LLM_LATENCY_MIN_SAMPLES = int(os.getenv("LLM_LATENCY_MIN_SAMPLES", "10"))
+
+# Формат квиза: poll - опрос-викторина Telegram, text - вопрос текстом и ответ буквой
+QUIZ_MODE = os.getenv("QUIZ_MODE", "poll")
+
+# Групповой квиз: число раундов, время на ответ (Telegram допускает 5-600 секунд) и пауза между раундами
+GROUP_QUIZ_ROUNDS = int(os.getenv("GROUP_QUIZ_ROUNDS", "5"))
+GROUP_QUIZ_ROUND_SECONDS = int(os.getenv("GROUP_QUIZ_ROUND_SECONDS", "20"))
+GROUP_QUIZ_PAUSE = float(os.getenv("GROUP_QUIZ_PAUSE", "3"))
+
+# Рассылка "факт дня": время отправки по UTC (ЧЧ:ММ, пусто - без расписания), скорость в сообщениях в секунду
+# (ниже TG_GLOBAL_RATE, чтобы оставался запас для ответов пользователям), параллелизм, размер пачки и повторы
+BROADCAST_TIME = os.getenv("BROADCAST_TIME", "09:00")
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+BROADCAST_BATCH = int(os.getenv("BROADCAST_BATCH", "500"))
+BROADCAST_RETRIES = int(os.getenv("BROADCAST_RETRIES", "3"))
+BROADCAST_DB_PATH = os.getenv("BROADCAST_DB_PATH", os.path.join("data", "broadcast.sqlite3"))
+
+# Метрики Prometheus на локальном HTTP-эндпоинте /metrics; METRICS_PORT=0 отключает сервер метрик
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Трассировка: TRACE_EXPORTER=file пишет спаны в JSONL (TRACE_PATH), otlp - отправляет в коллектор
+# по OTLP/HTTP (TRACE_COLLECTOR_URL); пусто - трассировка выключена. TRACE_SAMPLE_RATE - доля трассируемых обновлений
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "")
+TRACE_PATH = os.getenv("TRACE_PATH", os.path.join("data", "traces.jsonl"))
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL", "http://127.0.0.1:4318/v1/traces")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "5"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "telegram-bot")
+
+# Соединения с Bot API: пул исходящих запросов (с запасом на MAX_CONCURRENT_UPDATES и BROADCAST_CONCURRENCY)
+# из клиентов httpx по TG_POOL_SHARD_SIZE соединений и отдельный пул getUpdates, таймауты в секундах,
+# время жизни простаивающего соединения.
+# TG_HTTP_VERSION=2 требует пакета h2 и HTTPS (подмена Bot API работает только по HTTP/1.1)
+TG_POOL_SIZE = int(os.getenv("TG_POOL_SIZE", "128"))
+TG_POOL_SHARD_SIZE = int(os.getenv("TG_POOL_SHARD_SIZE", "16"))
+TG_POOL_TIMEOUT = float(os.getenv("TG_POOL_TIMEOUT", "5"))
+TG_CONNECT_TIMEOUT = float(os.getenv("TG_CONNECT_TIMEOUT", "5"))
+TG_READ_TIMEOUT = float(os.getenv("TG_READ_TIMEOUT", "10"))
+TG_WRITE_TIMEOUT = float(os.getenv("TG_WRITE_TIMEOUT", "10"))
+TG_MEDIA_WRITE_TIMEOUT = float(os.getenv("TG_MEDIA_WRITE_TIMEOUT", "30"))
+TG_HTTP_VERSION = os.getenv("TG_HTTP_VERSION", "1.1")
+TG_KEEPALIVE_EXPIRY = float(os.getenv("TG_KEEPALIVE_EXPIRY", "60"))
+TG_UPDATES_POOL_SIZE = int(os.getenv("TG_UPDATES_POOL_SIZE", "2"))
+TG_UPDATES_READ_TIMEOUT = float(os.getenv("TG_UPDATES_READ_TIMEOUT", "10"))
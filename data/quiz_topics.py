@@ -6,15 +6,7 @@ QUIZ_TOPICS = {
         "name": "💻 Программирование",
         "emoji": "💻",
         "prompt": """Ты создаешь вопросы для квиза по программированию. 
-Создай один интересный вопрос средней сложности с 4 вариантами ответа (A, B, C, D). 
-Укажи правильный ответ в конце. 
-Формат:
-Вопрос: [твой вопрос]
-A) [вариант 1]
-B) [вариант 2] 
-C) [вариант 3]
-D) [вариант 4]
-Правильный ответ: [буква]"""
+Создай один интересный вопрос средней сложности с 4 вариантами ответа."""
     },
 
     "history": {
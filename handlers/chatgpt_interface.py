@@ -1,11 +1,13 @@
 """Файл реализует интерфейс для взаимодействия с ChatGPT"""
 import logging
 from openai.types.beta.threads import Message
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters, CallbackQueryHandler
-from services.openai_client import get_chatgpt_response
-import os
-from io import BytesIO
+from services.openai_client import stream_chatgpt_response
+from services.media_cache import media_cache
+from services.conversation_memory import get_history, clear_history
+from handlers.live_message import reply_streaming
+from services.rate_limit import admission_controlled
 
 logger = logging.getLogger(__name__)
 
@@ -29,16 +31,13 @@ async def gpt_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def gpt_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Основная функция запуска интерфейса ChatGPT"""
     try:
-        image_path = os.path.join('data', 'images', 'chatgpt.jpg')
-
-        if os.path.exists(image_path):
+        clear_history(context.user_data, "gpt")
+        if media_cache.has('chatgpt.jpg'):
             try:
-                with open(image_path, 'rb') as photo_file:
-                    photo = InputFile(BytesIO(photo_file.read()), filename='chatgpt.jpg')
-
                 target = update.callback_query.message if update.callback_query else update.message
-                await target.reply_photo(
-                    photo=photo,
+                await media_cache.send_photo(
+                    target.reply_photo,
+                    'chatgpt.jpg',
                     caption=CAPTION,
                     parse_mode='HTML'
                 )
@@ -59,6 +58,7 @@ async def gpt_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return -1
 
 
+@admission_controlled
 async def handle_gpt_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка пользовательских сообщений для ChatGPT"""
     try:
@@ -71,25 +71,20 @@ async def handle_gpt_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
             mode = "default"
             prompt = f"Ответь на вопрос:\n{user_message}\n\nОтвечай как эксперт, не предлагай другие функции."
 
-        await context.bot.send_chat_action(
-            chat_id=update.effective_chat.id,
-            action="typing"
-        )
-
-        processing_msg = await update.message.reply_text("🤔 Обрабатываю запрос... ⏳")
-        # Получаем ответ от ChatGPT
-        gpt_response = await get_chatgpt_response(prompt, mode=mode)
-
         keyboard = [
             [InlineKeyboardButton("💬 Новый вопрос", callback_data="gpt_new")],
             [InlineKeyboardButton("🏠 В меню", callback_data="main_menu")]
         ]
 
-        await processing_msg.delete()
-        await update.message.reply_text(
-            f"🤖 <b>Ответ:</b>\n\n{gpt_response}",
-            parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(keyboard))
+        # Ответ ChatGPT выводится в сообщение-заглушку по мере генерации
+        history = get_history(context.user_data, "gpt") if mode == "default" else None
+        semantic_query = user_message if mode == "default" else None
+        await reply_streaming(
+            update, context, "🤔 Обрабатываю запрос... ⏳",
+            stream_chatgpt_response(prompt, mode=mode, history=history, semantic_query=semantic_query),
+            header="🤖 <b>Ответ:</b>\n\n",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
 
         return WAITING_FOR_MESSAGE
 
@@ -0,0 +1,219 @@
+"""Групповой квиз: раунды с опросами-викторинами в групповом чате и таблица лидеров"""
+import asyncio
+import html
+import logging
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Poll
+from telegram.ext import Application, ContextTypes
+from config import GROUP_QUIZ_ROUNDS, GROUP_QUIZ_ROUND_SECONDS, GROUP_QUIZ_PAUSE
+from data.quiz_topics import QUIZ_TOPICS, get_quiz_topic_data
+from services.content_pool import content_pool, quiz_topic
+from services.quiz_game import QuizSession, quiz_games
+from services.quiz_question import QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+ROUND_TOP = 5
+FINAL_TOP = 10
+MEDALS = ("🥇", "🥈", "🥉")
+
+
+async def group_quiz_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /groupquiz [тема] - запуск игры в групповом чате"""
+    chat = update.effective_chat
+    if chat.type == "private":
+        await update.message.reply_text("👥 Групповой квиз работает в группах. Для игры в одиночку используйте /quiz.")
+        return
+
+    if chat.id in quiz_games.sessions:
+        await update.message.reply_text("⏳ В этом чате уже идёт игра. Остановить её можно командой /stopquiz.")
+        return
+
+    topic_key = context.args[0] if context.args else None
+    if topic_key not in QUIZ_TOPICS:
+        keyboard = [
+            [InlineKeyboardButton(topic_data["name"], callback_data=f"group_quiz_{key}")]
+            for key, topic_data in QUIZ_TOPICS.items()
+        ]
+        await update.message.reply_text(
+            "🧠 <b>Групповой квиз</b>\n\nВыберите тему:",
+            parse_mode='HTML',
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return
+
+    if not start_game(context.application, chat.id, topic_key):
+        await update.message.reply_text("⏳ В этом чате уже идёт игра. Остановить её можно командой /stopquiz.")
+
+
+async def group_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор темы группового квиза кнопкой"""
+    query = update.callback_query
+    chat_id = query.message.chat_id
+    topic_key = query.data.replace("group_quiz_", "")
+    if topic_key not in QUIZ_TOPICS:
+        await query.answer()
+        await query.edit_message_text("❌ Ошибка: тема не найдена.")
+        return
+
+    # Игра регистрируется до первого await: из двух одновременных нажатий запускает игру только одно
+    if not start_game(context.application, chat_id, topic_key):
+        await query.answer("Игра уже идёт")
+        return
+
+    await query.answer()
+    await query.edit_message_text(f"🧠 Групповой квиз: {get_quiz_topic_data(topic_key)['name']}")
+
+
+async def stop_quiz_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /stopquiz - досрочное завершение игры в чате"""
+    session = quiz_games.sessions.get(update.effective_chat.id)
+    if session is None:
+        await update.message.reply_text("В этом чате нет активной игры.")
+        return
+    session.task.cancel()
+    await update.message.reply_text(
+        "🛑 Игра остановлена.\n\n" + format_top(session, FINAL_TOP),
+        parse_mode='HTML'
+    )
+
+
+async def leaderboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /leaderboard - общий счёт игроков чата за все игры"""
+    board = (context.chat_data or {}).get('quiz_leaderboard', {})
+    if not board:
+        await update.message.reply_text("🏆 Пока никто не набрал очков. Начните игру командой /groupquiz.")
+        return
+
+    leaders = sorted(board.values(), key=lambda entry: entry["points"], reverse=True)[:FINAL_TOP]
+    lines = [
+        f"{_place(index)} {html.escape(entry['name'])} - {entry['points']}"
+        for index, entry in enumerate(leaders)
+    ]
+    await update.message.reply_text("🏆 <b>Лидеры чата</b>\n\n" + "\n".join(lines), parse_mode='HTML')
+
+
+async def handle_poll_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ответ в опросе групповой игры: только учёт очков в памяти, без сообщений и обращений к модели"""
+    answer = update.poll_answer
+    if answer.user is None or not answer.option_ids:
+        return
+    quiz_games.answer(answer.poll_id, answer.user.id, answer.user.full_name, answer.option_ids[0])
+
+
+def start_game(application: Application, chat_id: int, topic_key: str) -> bool:
+    """Регистрация игры и запуск её раундов фоновой задачей; False, если в чате уже идёт игра"""
+    session = QuizSession(chat_id, topic_key, GROUP_QUIZ_ROUNDS, GROUP_QUIZ_ROUND_SECONDS)
+    if not quiz_games.start(session):
+        return False
+    session.task = asyncio.create_task(run_game(application, session))
+    return True
+
+
+async def stop_games():
+    """Отмена всех идущих игр при остановке бота; набранные очки сохраняются"""
+    tasks = [session.task for session in quiz_games.sessions.values() if session.task]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_game(application: Application, session: QuizSession):
+    """Раунды игры: опрос на время, итоги раунда и запись очков в хранилище"""
+    bot = application.bot
+    chat_id = session.chat_id
+    topic_data = get_quiz_topic_data(session.topic_key)
+    try:
+        await bot.send_message(
+            chat_id=chat_id,
+            text=(
+                f"{topic_data['emoji']} <b>Групповой квиз: {topic_data['name']}</b>\n\n"
+                f"Раундов: {session.rounds}, на ответ {session.round_seconds} с.\n"
+                "Чем быстрее правильный ответ, тем больше очков!"
+            ),
+            parse_mode='HTML'
+        )
+
+        for _ in range(session.rounds):
+            question = QuizQuestion.from_json(await content_pool.get(quiz_topic(session.topic_key)))
+            message = await bot.send_poll(
+                chat_id=chat_id,
+                question=question.question,
+                options=question.options,
+                type=Poll.QUIZ,
+                correct_option_id=question.correct_index,
+                explanation=question.poll_explanation(),
+                is_anonymous=False,
+                open_period=session.round_seconds
+            )
+            session.start_round(message.poll.id, question.correct_index)
+            quiz_games.track_poll(message.poll.id, session)
+
+            await asyncio.sleep(session.round_seconds)
+            result = session.finish_round()
+            flush_points(application, session)
+
+            correct = html.escape(question.options[question.correct_index])
+            await bot.send_message(
+                chat_id=chat_id,
+                text=(
+                    f"⏱ <b>Раунд {session.round}/{session.rounds}</b>\n"
+                    f"Правильный ответ: <b>{correct}</b>\n"
+                    f"Ответили: {result['answered']}, верно: {result['correct']}\n\n"
+                    f"{format_top(session, ROUND_TOP)}"
+                ),
+                parse_mode='HTML'
+            )
+            if session.round < session.rounds:
+                await asyncio.sleep(GROUP_QUIZ_PAUSE)
+
+        await bot.send_message(
+            chat_id=chat_id,
+            text="🏁 <b>Игра окончена!</b>\n\n" + format_top(session, FINAL_TOP),
+            parse_mode='HTML'
+        )
+
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка группового квиза в чате {chat_id}: {e}")
+        try:
+            await bot.send_message(chat_id=chat_id, text="😔 Игра прервана из-за ошибки. Попробуйте /groupquiz позже.")
+        except Exception:
+            pass
+    finally:
+        flush_points(application, session)
+        quiz_games.finish(chat_id)
+
+
+def flush_points(application: Application, session: QuizSession):
+    """Пакетная запись очков, набранных с прошлой записи, в chat_data чата
+
+    Запись выполняется раз в раунд, а не на каждый ответ; сохранение на диск
+    или в Redis делает persistence приложения.
+    """
+    points = session.take_points()
+    if not points:
+        return
+    board = application.chat_data[session.chat_id].setdefault('quiz_leaderboard', {})
+    for player, gained in points.items():
+        entry = board.setdefault(player, {"name": session.names[player], "points": 0})
+        entry["name"] = session.names[player]
+        entry["points"] += gained
+    if application.persistence:
+        application.mark_data_for_update_persistence(chat_ids=session.chat_id)
+
+
+def format_top(session: QuizSession, count: int) -> str:
+    """Лучшие игроки текущей игры для сообщения с parse_mode HTML"""
+    leaders = session.leaderboard.top(count)
+    if not leaders:
+        return "Пока никто не ответил."
+    lines = [
+        f"{_place(index)} {html.escape(session.names[player])} - {points}"
+        for index, (player, points) in enumerate(leaders)
+    ]
+    return "\n".join(lines)
+
+
+def _place(index: int) -> str:
+    return MEDALS[index] if index < len(MEDALS) else f"{index + 1}."
@@ -0,0 +1,151 @@
+"""Сообщение-заглушка, которое редактируется по мере потоковой генерации ответа"""
+import asyncio
+import html
+import logging
+from telegram.error import BadRequest
+from config import STREAM_EDIT_INTERVAL, STREAM_EDIT_MIN_CHARS, TYPING_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+CURSOR = " ▌"
+_END = object()
+
+
+class LiveMessage:
+    """Редактирует сообщение не чаще раза в interval секунд и не реже чем на min_chars новых символов
+
+    Текст модели экранируется (разметка HTML - только в заголовке). Ответ длиннее
+    одного сообщения продолжается в новых сообщениях, клавиатура ставится под последним.
+    """
+
+    def __init__(self, message, header: str = "",
+                 interval: float = STREAM_EDIT_INTERVAL, min_chars: int = STREAM_EDIT_MIN_CHARS):
+        self.message = message
+        self.header = header
+        self.interval = interval
+        self.min_chars = min_chars
+        self._shown = ""
+        # Начало текста текущего сообщения в полном ответе
+        self._start = 0
+
+    async def stream(self, chunks, reply_markup=None) -> str:
+        """Вывод фрагментов из асинхронного генератора и финальная правка с клавиатурой"""
+        loop = asyncio.get_running_loop()
+        text = ""
+        last_edit = 0.0
+        last_length = 0
+
+        async for chunk in chunks:
+            text += chunk
+            now = loop.time()
+            if now - last_edit >= self.interval and len(text) - last_length >= self.min_chars:
+                await self._show(text)
+                last_edit = now
+                last_length = len(text)
+
+        await self._show(text, reply_markup=reply_markup, final=True)
+        return text
+
+    async def _show(self, text: str, reply_markup=None, final: bool = False):
+        """Вывод ответа; не поместившееся в текущее сообщение переносится в новое"""
+        body = text[self._start:]
+        cut = self._fit(body, cursor=not final)
+        while cut < len(body):
+            await self._edit(self._render(body[:cut]), final=True)
+            self._start += cut
+            body = body[cut:]
+            self.message = await self.message.get_bot().send_message(chat_id=self.message.chat_id,
+                                                                     text=CURSOR.strip())
+            self._shown = ""
+            cut = self._fit(body, cursor=not final)
+        await self._edit(self._render(body, cursor=not final), reply_markup=reply_markup, final=final)
+
+    def _render(self, body: str, cursor: bool = False) -> str:
+        header = self.header if self._start == 0 else ""
+        return header + html.escape(body) + (CURSOR if cursor else "")
+
+    def _fit(self, body: str, cursor: bool) -> int:
+        """Длина начала body, которое помещается в сообщение; разрез по переводу строки или пробелу"""
+        budget = MAX_MESSAGE_LENGTH - len(self._render("", cursor))
+        length = 0
+        for index, char in enumerate(body):
+            length += len(html.escape(char))
+            if length > budget:
+                break
+        else:
+            return len(body)
+        cut = max(body.rfind("\n", 0, index), body.rfind(" ", 0, index))
+        return cut + 1 if cut > index // 2 else index
+
+    async def _edit(self, text: str, reply_markup=None, final: bool = False):
+        """Правка сообщения; ошибки промежуточных правок не прерывают генерацию"""
+        if text == self._shown and not final:
+            return
+        try:
+            await self.message.edit_text(text, parse_mode='HTML', reply_markup=reply_markup)
+            self._shown = text
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return
+            if final:
+                raise
+            logger.warning(f"Промежуточная правка пропущена: {e}")
+
+
+async def reply_streaming(update, context, placeholder: str, chunks, header: str = "", reply_markup=None,
+                          error_text: str = None):
+    """Ответ модели на сообщение пользователя без лишних последовательных запросов к Bot API
+
+    Запрос к модели стартует сразу, параллельно с индикатором «печатает» и отправкой
+    заглушки; фрагменты, пришедшие раньше заглушки, буферизуются. Заглушка затем
+    редактируется в ответ, а индикатор повторяется, пока идёт генерация.
+    Если задан error_text, ошибка генерации показывается в заглушке вместо исключения.
+    """
+    queue = asyncio.Queue()
+    producer = asyncio.create_task(_prefetch(chunks, queue))
+    typing = asyncio.create_task(_keep_typing(context.bot, update.effective_chat.id))
+    message = None
+    try:
+        message = await update.message.reply_text(placeholder)
+        return await LiveMessage(message, header=header).stream(_drain(queue), reply_markup=reply_markup)
+    except Exception as e:
+        if error_text is None or message is None:
+            raise
+        logger.error(f"Ошибка генерации ответа: {e}")
+        await message.edit_text(error_text, reply_markup=reply_markup)
+        return None
+    finally:
+        typing.cancel()
+        producer.cancel()
+
+
+async def _prefetch(chunks, queue: asyncio.Queue):
+    """Чтение потока модели независимо от скорости отправки сообщений"""
+    try:
+        async for chunk in chunks:
+            queue.put_nowait(chunk)
+    except Exception as e:
+        queue.put_nowait(e)
+        return
+    queue.put_nowait(_END)
+
+
+async def _drain(queue: asyncio.Queue):
+    while True:
+        item = await queue.get()
+        if item is _END:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+async def _keep_typing(bot, chat_id: int):
+    """Индикатор «печатает» до отмены задачи"""
+    while True:
+        try:
+            await bot.send_chat_action(chat_id=chat_id, action="typing")
+        except Exception as e:
+            logger.debug(f"Не удалось отправить chat action: {e}")
+        await asyncio.sleep(TYPING_INTERVAL)
@@ -2,9 +2,12 @@
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from services.openai_client import get_personality_response
+from services.media_cache import media_cache
+from services.conversation_memory import get_history, clear_history
+from handlers.live_message import reply_streaming
+from services.openai_client import stream_personality_response
 from data.personalities import get_personality_keyboard, get_personality_data
-import os
+from services.rate_limit import admission_controlled
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +22,7 @@ async def talk_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def talk_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Запуск интерфейса выбора личности"""
     try:
-        image_path = "data/images/personality.jpg"
+        image_name = "personality.jpg"
         message_text = (
             "👥 <b>Диалог с известной личностью</b>\n\n"
             "Выберите, с кем хотите поговорить:\n\n"
@@ -34,16 +37,16 @@ async def talk_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         keyboard = get_personality_keyboard()
 
         if update.callback_query:
-            if os.path.exists(image_path):
+            if media_cache.has(image_name):
                 await update.callback_query.message.delete()
-                with open(image_path, 'rb') as photo:
-                    await context.bot.send_photo(
-                        chat_id=update.callback_query.message.chat_id,
-                        photo=photo,
-                        caption=message_text,
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
+                await media_cache.send_photo(
+                    context.bot.send_photo,
+                    image_name,
+                    chat_id=update.callback_query.message.chat_id,
+                    caption=message_text,
+                    parse_mode='HTML',
+                    reply_markup=keyboard
+                )
             else:
                 await update.callback_query.edit_message_text(
                     message_text,
@@ -52,14 +55,14 @@ async def talk_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
             await update.callback_query.answer()
         else:
-            if os.path.exists(image_path):
-                with open(image_path, 'rb') as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=message_text,
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
+            if media_cache.has(image_name):
+                await media_cache.send_photo(
+                    update.message.reply_photo,
+                    image_name,
+                    caption=message_text,
+                    parse_mode='HTML',
+                    reply_markup=keyboard
+                )
             else:
                 await update.message.reply_text(
                     message_text,
@@ -135,6 +138,7 @@ async def personality_selected(update: Update, context: ContextTypes.DEFAULT_TYP
         return -1
 
 
+@admission_controlled
 async def handle_personality_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка сообщения для выбранной личности"""
     try:
@@ -148,14 +152,6 @@ async def handle_personality_message(update: Update, context: ContextTypes.DEFAU
             )
             return -1
 
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-
-        processing_msg = await update.message.reply_text(
-            f"{personality_data['emoji']} {personality_data['name']} размышляет... ⏳"
-        )
-
-        personality_response = await get_personality_response(user_message, personality_data['prompt'])
-
         keyboard = [
             [InlineKeyboardButton("💬 Продолжить диалог", callback_data="continue_chat")],
             [InlineKeyboardButton("👥 Выбрать другую личность", callback_data="change_personality")],
@@ -163,10 +159,15 @@ async def handle_personality_message(update: Update, context: ContextTypes.DEFAU
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await processing_msg.delete()
-        await update.message.reply_text(
-            f"{personality_data['emoji']} <b>{personality_data['name']} отвечает:</b>\n\n{personality_response}",
-            parse_mode='HTML',
+        await reply_streaming(
+            update, context,
+            f"{personality_data['emoji']} {personality_data['name']} размышляет... ⏳",
+            stream_personality_response(
+                user_message,
+                personality_data['prompt'],
+                history=get_history(context.user_data, f"personality_{personality_key}")
+            ),
+            header=f"{personality_data['emoji']} <b>{personality_data['name']} отвечает:</b>\n\n",
             reply_markup=reply_markup
         )
 
@@ -199,6 +200,7 @@ async def handle_personality_callback(update: Update, context: ContextTypes.DEFA
         return await talk_start(update, context)
 
     elif query.data == "finish_talk":
+        clear_history(context.user_data, f"personality_{context.user_data.get('current_personality')}")
         context.user_data.pop('current_personality', None)
         context.user_data.pop('personality_data', None)
         return -1
@@ -1,16 +1,21 @@
 """Файл обработки команд для функционала квизов"""
+import html
 import logging
-import os
-import re
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Poll
 from telegram.ext import ContextTypes
-from services.openai_client import get_personality_response
+from config import QUIZ_MODE
+from services.media_cache import media_cache
+from services.content_pool import content_pool, quiz_topic
+from services.quiz_question import QuizQuestion
 from data.quiz_topics import get_quiz_topics_keyboard, get_quiz_topic_data, get_quiz_continue_keyboard
+from services.rate_limit import admission_controlled
 
 logger = logging.getLogger(__name__)
 
 SELECTING_TOPIC, ANSWERING_QUESTION = range(2)
 
+MAX_TRACKED_POLLS = 10000
+
 
 async def quiz_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /quiz - перенаправляет в quiz_start"""
@@ -21,8 +26,8 @@ async def quiz_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def quiz_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Запуск интерфейса квиза"""
     try:
-        image_path = "data/images/quiz.png"
-        logger.info(f'В квизе используется картинка: {image_path}')
+        image_name = "quiz.jpg"
+        logger.info(f'В квизе используется картинка: {image_name}')
 
         message_text = (
             "🧠 <b>Квиз - проверь свои знания!</b>\n\n"
@@ -42,16 +47,16 @@ async def quiz_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data['quiz_total'] = 0
 
         if update.callback_query:
-            if os.path.exists(image_path):
+            if media_cache.has(image_name):
                 await update.callback_query.message.delete()
-                with open(image_path, 'rb') as photo:
-                    await context.bot.send_photo(
-                        chat_id=update.callback_query.message.chat_id,
-                        photo=photo,
-                        caption=message_text,
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
+                await media_cache.send_photo(
+                    context.bot.send_photo,
+                    image_name,
+                    chat_id=update.callback_query.message.chat_id,
+                    caption=message_text,
+                    parse_mode='HTML',
+                    reply_markup=keyboard
+                )
             else:
                 await update.callback_query.edit_message_text(
                     message_text,
@@ -61,14 +66,14 @@ async def quiz_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.callback_query.answer()
 
         else:
-            if os.path.exists(image_path):
-                with open(image_path, 'rb') as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=message_text,
-                        parse_mode='HTML',
-                        reply_markup=keyboard
-                    )
+            if media_cache.has(image_name):
+                await media_cache.send_photo(
+                    update.message.reply_photo,
+                    image_name,
+                    caption=message_text,
+                    parse_mode='HTML',
+                    reply_markup=keyboard
+                )
             else:
                 await update.message.reply_text(
                     message_text,
@@ -90,6 +95,7 @@ async def quiz_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return -1
 
 
+@admission_controlled
 async def topic_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка выбора темы квиза"""
     query = update.callback_query
@@ -115,18 +121,24 @@ async def topic_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             await query.edit_message_text(processing_text, parse_mode='HTML')
 
-        question = await get_personality_response("Создай вопрос для квиза", topic_data['prompt'])
-        context.user_data['current_question'] = question
+        question = QuizQuestion.from_json(await content_pool.get(quiz_topic(topic_key)))
+        score_line = f"📊 <b>Счет:</b> {context.user_data['quiz_score']}/{context.user_data['quiz_total']}"
 
-        correct_answer = extract_correct_answer(question)
-        context.user_data['correct_answer'] = correct_answer
-
-        message_text = (
-            f"{topic_data['emoji']} <b>Квиз: {topic_data['name']}</b>\n\n"
-            f"{question}\n\n"
-            f"📊 <b>Счет:</b> {context.user_data['quiz_score']}/{context.user_data['quiz_total']}\n\n"
-            "✍️ Напишите ваш ответ (A, B, C или D):"
-        )
+        if QUIZ_MODE == "poll":
+            message_text = (
+                f"{topic_data['emoji']} <b>Квиз: {topic_data['name']}</b>\n\n"
+                f"{score_line}\n\n"
+                "👇 Ответьте в опросе ниже:"
+            )
+        else:
+            # Вопрос хранится строкой JSON: persistence сохраняет только JSON-совместимые данные
+            context.user_data['current_question'] = question.to_json()
+            message_text = (
+                f"{topic_data['emoji']} <b>Квиз: {topic_data['name']}</b>\n\n"
+                f"{question.render()}\n\n"
+                f"{score_line}\n\n"
+                "✍️ Напишите ваш ответ (A, B, C или D):"
+            )
 
         if query.message.photo:
             await query.edit_message_caption(
@@ -139,6 +151,9 @@ async def topic_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 parse_mode='HTML'
             )
 
+        if QUIZ_MODE == "poll":
+            await send_quiz_poll(context, query.message.chat_id, question, topic_key)
+
         return ANSWERING_QUESTION
 
     except Exception as e:
@@ -156,50 +171,88 @@ async def topic_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return -1
 
 
+async def send_quiz_poll(context: ContextTypes.DEFAULT_TYPE, chat_id: int, question: QuizQuestion, topic_key: str):
+    """Отправка вопроса опросом-викториной; правильный ответ запоминается по id опроса"""
+    message = await context.bot.send_poll(
+        chat_id=chat_id,
+        question=question.question,
+        options=question.options,
+        type=Poll.QUIZ,
+        correct_option_id=question.correct_index,
+        explanation=question.poll_explanation(),
+        is_anonymous=False
+    )
+
+    polls = context.bot_data.setdefault('quiz_polls', {})
+    polls[message.poll.id] = {"chat_id": chat_id, "topic": topic_key, "correct_index": question.correct_index}
+    while len(polls) > MAX_TRACKED_POLLS:
+        polls.pop(next(iter(polls)))
+
+
+async def handle_poll_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Проверка ответа в опросе-викторине: поиск по id опроса, без обращения к модели"""
+    answer = update.poll_answer
+    poll = context.bot_data.get('quiz_polls', {}).pop(answer.poll_id, None)
+    if poll is None or not answer.option_ids:
+        return
+
+    try:
+        is_correct = answer.option_ids[0] == poll["correct_index"]
+        context.user_data['quiz_total'] = context.user_data.get('quiz_total', 0) + 1
+        context.user_data['quiz_score'] = context.user_data.get('quiz_score', 0) + int(is_correct)
+
+        topic_data = get_quiz_topic_data(poll["topic"])
+        result_text = "✅ <b>Правильно!</b>" if is_correct else "❌ <b>Неправильно!</b>"
+        await context.bot.send_message(
+            chat_id=poll["chat_id"],
+            text=(
+                f"{topic_data['emoji']} {result_text}\n\n"
+                f"📊 <b>Ваш счет:</b> {context.user_data['quiz_score']}/{context.user_data['quiz_total']}"
+            ),
+            parse_mode='HTML',
+            reply_markup=get_quiz_continue_keyboard(poll["topic"])
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка при обработке ответа в опросе квиза: {e}")
+
+
 async def handle_quiz_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка ответа пользователя на вопрос квиза"""
+    """Обработка ответа пользователя на вопрос квиза: проверка и объяснение без обращения к модели"""
     try:
-        user_answer = update.message.text.strip().upper()
-        correct_answer = context.user_data.get('correct_answer', '').upper()
+        if QUIZ_MODE == "poll":
+            await update.message.reply_text("👆 Выберите ответ в опросе выше.")
+            return ANSWERING_QUESTION
+
         topic_data = context.user_data.get('quiz_topic_data')
-        current_question = context.user_data.get('current_question', '')
+        question = context.user_data.get('current_question')
 
-        if not topic_data or not correct_answer:
+        if not topic_data or not isinstance(question, str):
             await update.message.reply_text(
                 "❌ Произошла ошибка: данные квиза не найдены. Используйте /quiz для начала."
             )
             return -1
 
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-        is_correct = user_answer == correct_answer
+        question = QuizQuestion.from_json(question)
+        answer_index = question.answer_index(update.message.text)
+        if answer_index is None:
+            await update.message.reply_text("✍️ Напишите букву ответа: A, B, C или D.")
+            return ANSWERING_QUESTION
 
+        is_correct = answer_index == question.correct_index
         context.user_data['quiz_total'] += 1
         if is_correct:
             context.user_data['quiz_score'] += 1
 
-        processing_msg = await update.message.reply_text(
-            f"{topic_data['emoji']} Проверяю ответ... ⏳"
-        )
-
-        analysis_prompt = f"""Пользователь ответил '{user_answer}' на вопрос:
-        {current_question}
-
-        Правильный ответ: {correct_answer}
-
-        Дай краткое объяснение (2-3 предложения), почему ответ правильный или неправильный, и интересный факт по теме."""
-
-        # Получаем развернутый ответ от ChatGPT
-        detailed_response = await get_personality_response(analysis_prompt,
-                                                           "Ты эксперт по квизам, объясняешь ответы понятно и интересно.")
-
+        explanation = html.escape(question.explanation)
         if is_correct:
-            result_text = f"✅ <b>Правильно!</b>\n\n{detailed_response}"
+            result_text = f"✅ <b>Правильно!</b>\n\n{explanation}"
         else:
-            result_text = f"❌ <b>Неправильно!</b>\n\nПравильный ответ: <b>{correct_answer}</b>\n\n{detailed_response}"
+            correct = f"{question.correct_letter}) {html.escape(question.options[question.correct_index])}"
+            result_text = f"❌ <b>Неправильно!</b>\n\nПравильный ответ: <b>{correct}</b>\n\n{explanation}"
 
         keyboard = get_quiz_continue_keyboard(context.user_data['current_quiz_topic'])
 
-        await processing_msg.delete()
         await update.message.reply_text(
             f"{topic_data['emoji']} <b>Результат квиза</b>\n\n"
             f"{result_text}\n\n"
@@ -273,7 +326,6 @@ async def handle_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             context.user_data.pop('current_quiz_topic', None)
             context.user_data.pop('quiz_topic_data', None)
             context.user_data.pop('current_question', None)
-            context.user_data.pop('correct_answer', None)
 
             keyboard = [
                 [InlineKeyboardButton("🎲 Случайный факт", callback_data="random_interface")],
@@ -296,23 +348,3 @@ async def handle_quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         return -1
 
     return ANSWERING_QUESTION
-
-
-def extract_correct_answer(question_text):
-    """Извлекает правильный ответ из текста вопроса"""
-    try:
-        lines = question_text.split('\n')
-        for line in lines:
-            if 'правильный ответ' in line.lower():
-                match = re.search(r'[ABCD]', line.upper())
-                if match:
-                    return match.group()
-
-        match = re.search(r'ответ:\s*([ABCD])', question_text.upper())
-        if match:
-            return match.group(1)
-
-        return 'A'
-    except Exception as e:
-        logger.error(f"Ошибка при извлечении правильного ответа: {e}")
-        return 'A'
\ No newline at end of file
@@ -2,7 +2,8 @@
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from services.openai_client import get_random_fact
+from services.content_pool import content_pool, FACT_TOPIC
+from services.broadcast import broadcaster
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +12,7 @@ async def random_fact(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Основная функция для обработки команды /random_fact"""
     try:
         loading_msg = await update.message.reply_text("🎲 Генерирую интересный факт... ⏳")
-        fact = await get_random_fact()
+        fact = await content_pool.get(FACT_TOPIC)
 
         keyboard = [
             [InlineKeyboardButton("🎲 Хочу ещё факт", callback_data="random_more")],
@@ -40,7 +41,7 @@ async def random_fact_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     if query.data == "random_more":
         try:
             await query.edit_message_text("🎲 Генерирую новый факт... ⏳")
-            fact = await get_random_fact()
+            fact = await content_pool.get(FACT_TOPIC)
 
             keyboard = [
                 [InlineKeyboardButton("🎲 Хочу ещё факт", callback_data="random_more")],
@@ -79,7 +80,7 @@ async def random_fact_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     elif query.data == "random_fact":
         try:
             await query.edit_message_text("🎲 Генерирую интересный факт... ⏳")
-            fact = await get_random_fact()
+            fact = await content_pool.get(FACT_TOPIC)
 
             keyboard = [
                 [InlineKeyboardButton("🎲 Хочу ещё факт", callback_data="random_more")],
@@ -98,4 +99,21 @@ async def random_fact_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             await query.edit_message_text(
                 "😔 Произошла ошибка. Попробуйте позже.\n"
                 "Используйте /start чтобы вернуться в меню."
-            )
\ No newline at end of file
+            )
+
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /subscribe - подписка чата на ежедневный факт"""
+    if broadcaster.store.subscribe(update.effective_chat.id):
+        await update.message.reply_text(
+            "📅 Вы подписались на факт дня! Он будет приходить раз в день.\nОтписаться: /unsubscribe"
+        )
+    else:
+        await update.message.reply_text("📅 Вы уже подписаны на факт дня. Отписаться: /unsubscribe")
+
+
+async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /unsubscribe - отказ от ежедневного факта"""
+    if broadcaster.store.unsubscribe([update.effective_chat.id]):
+        await update.message.reply_text("👋 Вы отписались от факта дня. Подписаться снова: /subscribe")
+    else:
+        await update.message.reply_text("Вы не подписаны на факт дня. Подписаться: /subscribe")
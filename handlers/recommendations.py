@@ -3,6 +3,8 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler, CommandHandler, ConversationHandler
 from services.openai_client import get_chatgpt_response
+from config import RESPONSE_CACHE_VARIANTS
+from services.rate_limit import admission_controlled
 
 logger = logging.getLogger(__name__)
 
@@ -102,6 +104,7 @@ async def select_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return SELECT_GENRE
 
 
+@admission_controlled
 async def select_genre(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка выбора жанра и получение рекомендаций"""
     query = update.callback_query
@@ -121,7 +124,7 @@ async def select_genre(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         prompt = RECOMMENDATION_TEMPLATES[category].format(genre=selected_genre)
-        recommendations = await get_chatgpt_response(prompt)
+        recommendations = await get_chatgpt_response(prompt, cache_variants=RESPONSE_CACHE_VARIANTS)
 
         if not recommendations:
             raise ValueError("Пустой ответ от API")
@@ -171,6 +174,8 @@ def setup_recommend_handlers(app):
             SELECT_GENRE: [CallbackQueryHandler(select_genre, pattern="^genre_|back$")]
         },
         fallbacks=[CommandHandler('cancel', cancel)],
-        allow_reentry=True  # Разрешаем повторный вход в диалог
+        allow_reentry=True,  # Разрешаем повторный вход в диалог
+        name="recommend_conversation",
+        persistent=app.persistence is not None
     )
     app.add_handler(conv_handler)
\ No newline at end of file
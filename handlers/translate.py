@@ -1,9 +1,11 @@
 """Файл обработки команд для перевода текста"""
 import logging
-import os
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters, CommandHandler, CallbackQueryHandler
-from services.openai_client import get_chatgpt_response
+from services.openai_client import stream_chatgpt_response
+from services.media_cache import media_cache
+from handlers.live_message import reply_streaming
+from services.rate_limit import admission_controlled
 
 logger = logging.getLogger(__name__)
 
@@ -34,20 +36,20 @@ async def show_lang_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel")])
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        image_path = os.path.join('data', 'images', 'translate.jpg')
+        image_name = 'translate.jpg'
         caption = "🌍 <b>Переводчик текста</b>\n\nВыберите язык для перевода:"
 
         if update.callback_query:
             await update.callback_query.answer()
-            if os.path.exists(image_path):
-                with open(image_path, 'rb') as photo:
-                    await context.bot.send_photo(
-                        chat_id=update.effective_chat.id,
-                        photo=photo,
-                        caption=caption,
-                        parse_mode='HTML',
-                        reply_markup=reply_markup
-                    )
+            if media_cache.has(image_name):
+                await media_cache.send_photo(
+                    context.bot.send_photo,
+                    image_name,
+                    chat_id=update.effective_chat.id,
+                    caption=caption,
+                    parse_mode='HTML',
+                    reply_markup=reply_markup
+                )
             else:
                 await context.bot.send_message(
                     chat_id=update.effective_chat.id,
@@ -56,14 +58,14 @@ async def show_lang_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     reply_markup=reply_markup
                 )
         else:
-            if os.path.exists(image_path):
-                with open(image_path, 'rb') as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=caption,
-                        parse_mode='HTML',
-                        reply_markup=reply_markup
-                    )
+            if media_cache.has(image_name):
+                await media_cache.send_photo(
+                    update.message.reply_photo,
+                    image_name,
+                    caption=caption,
+                    parse_mode='HTML',
+                    reply_markup=reply_markup
+                )
             else:
                 await update.message.reply_text(
                     caption,
@@ -104,6 +106,7 @@ async def lang_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return WAIT_TEXT
 
 
+@admission_controlled
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка текста для перевода"""
     try:
@@ -115,20 +118,6 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Язык не выбран. Используйте /translate")
             return ConversationHandler.END
 
-        await context.bot.send_chat_action(
-            chat_id=update.effective_chat.id,
-            action="typing"
-        )
-
-        processing_msg = await update.message.reply_text("🔄 Перевод... ⏳")
-
-        try:
-            prompt = f"Переведи следующий текст на {lang_name}. Сохрани форматирование и смысл:\n\n{text}"
-            translated = await get_chatgpt_response(prompt, mode="translate")
-        except Exception as e:
-            logger.error(f"Ошибка при запросе к ChatGPT: {e}")
-            translated = "⚠️ Произошла ошибка при переводе. Пожалуйста, попробуйте позже."
-
         keyboard = [
             [InlineKeyboardButton("🔄 Новый текст", callback_data="new_text")],
             [InlineKeyboardButton("🌍 Сменить язык", callback_data="change_lang")],
@@ -136,11 +125,13 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await processing_msg.delete()
-        await update.message.reply_text(
-            f"🌍 <b>Перевод на {lang_name}:</b>\n\n{translated}",
-            parse_mode='HTML',
-            reply_markup=reply_markup
+        prompt = f"Переведи следующий текст на {lang_name}. Сохрани форматирование и смысл:\n\n{text}"
+        await reply_streaming(
+            update, context, "🔄 Перевод... ⏳",
+            stream_chatgpt_response(prompt, mode="translate", cache_variants=1),
+            header=f"🌍 <b>Перевод на {lang_name}:</b>\n\n",
+            reply_markup=reply_markup,
+            error_text="⚠️ Произошла ошибка при переводе. Пожалуйста, попробуйте позже."
         )
 
         return WAIT_TEXT
@@ -198,5 +189,7 @@ def setup_translate_handlers(app):
             ],
         },
         fallbacks=[CommandHandler('cancel', lambda u, c: ConversationHandler.END)],
+        name="translate_conversation",
+        persistent=app.persistence is not None,
     )
     app.add_handler(conv_handler)
\ No newline at end of file
@@ -1,8 +1,21 @@
 """Основной модуль запуска Telegram-бота"""
+import asyncio
 import logging
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ConversationHandler, MessageHandler, filters
-from config import TG_BOT_TOKEN
-from handlers import basic, random_fact, chatgpt_interface, personality_chat, quiz, translate, recommendations
+from telegram.ext import (Application, CommandHandler, CallbackQueryHandler, ConversationHandler, MessageHandler,
+                          PollAnswerHandler, filters)
+from config import TG_BOT_TOKEN, BOT_MODE, TELEGRAM_BASE_URL, UPDATE_QUEUE_SIZE, MAX_CONCURRENT_UPDATES
+from services.media_cache import media_cache
+from services.content_pool import content_pool
+from services.broadcast import broadcaster
+from services.metrics import metrics_server, instrument_application
+from services.tracing import tracer
+from services.state_store import create_persistence
+from services.webhook import run_webhook
+from services.update_processor import ChatOrderedUpdateProcessor
+from services.rate_limit import TelegramRateLimiter
+from services.telegram_transport import create_request, create_updates_request
+from handlers import (basic, random_fact, chatgpt_interface, personality_chat, quiz, group_quiz, translate,
+                      recommendations)
 from warnings import filterwarnings
 from telegram.warnings import PTBUserWarning
 
@@ -15,14 +28,54 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def post_init(application: Application):
+    """Запуск фоновых задач после инициализации бота"""
+    content_pool.start()
+    await metrics_server.start()
+    tracer.start()
+    broadcaster.start(application.bot)
+
+
+async def post_shutdown(application: Application):
+    """Остановка фоновых задач и сохранение состояния"""
+    await broadcaster.stop()
+    await group_quiz.stop_games()
+    await content_pool.stop()
+    await metrics_server.stop()
+    await tracer.stop()
+
+
 def main():
     try:
-        application = Application.builder().token(TG_BOT_TOKEN).build()
+        media_cache.load()
+        builder = (
+            Application.builder()
+            .token(TG_BOT_TOKEN)
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .concurrent_updates(ChatOrderedUpdateProcessor(MAX_CONCURRENT_UPDATES))
+            .rate_limiter(TelegramRateLimiter())
+            .request(create_request())
+            .get_updates_request(create_updates_request())
+        )
+        if TELEGRAM_BASE_URL:
+            builder = builder.base_url(f"{TELEGRAM_BASE_URL}/bot").base_file_url(f"{TELEGRAM_BASE_URL}/file/bot")
+        if BOT_MODE == "webhook":
+            builder = builder.update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+        persistence = create_persistence()
+        if persistence:
+            builder = builder.persistence(persistence)
+        application = builder.build()
         application.add_handler(CommandHandler("start", basic.start))
         application.add_handler(CommandHandler("random", random_fact.random_fact))
+        application.add_handler(CommandHandler("subscribe", random_fact.subscribe_command))
+        application.add_handler(CommandHandler("unsubscribe", random_fact.unsubscribe_command))
         application.add_handler(CommandHandler("gpt", chatgpt_interface.gpt_command))
         application.add_handler(CommandHandler("talk", personality_chat.talk_command))
         application.add_handler(CommandHandler("quiz", quiz.quiz_command))
+        application.add_handler(CommandHandler("groupquiz", group_quiz.group_quiz_command))
+        application.add_handler(CommandHandler("stopquiz", group_quiz.stop_quiz_command, filters.ChatType.GROUPS))
+        application.add_handler(CommandHandler("leaderboard", group_quiz.leaderboard_command, filters.ChatType.GROUPS))
         application.add_handler(CommandHandler("translate", translate.translate_command))
         application.add_handler(CommandHandler("recommend", recommendations.recommend_command))
         translate.setup_translate_handlers(application)
@@ -40,6 +93,8 @@ def main():
                 CallbackQueryHandler(basic.menu_callback, pattern="^(gpt_finish|main_menu)$")
             ],
             per_message=True,
+            name="gpt_conversation",
+            persistent=persistence is not None,
         )
 
         personality_conversation = ConversationHandler(
@@ -61,6 +116,8 @@ def main():
                 CommandHandler("start", basic.start),
                 CallbackQueryHandler(basic.menu_callback, pattern="^main_menu$")
             ],
+            name="personality_conversation",
+            persistent=persistence is not None,
         )
 
         quiz_conversation = ConversationHandler(
@@ -75,24 +132,34 @@ def main():
                 quiz.ANSWERING_QUESTION: [
                     MessageHandler(filters.TEXT & ~filters.COMMAND, quiz.handle_quiz_answer),
                     CallbackQueryHandler(quiz.handle_quiz_callback,
-                                         pattern="^(quiz_continue_|quiz_change_topic|quiz_finish)$")
+                                         pattern="^(quiz_continue_.+|quiz_change_topic|quiz_finish)$")
                 ],
             },
             fallbacks=[
                 CommandHandler("start", basic.start),
                 CallbackQueryHandler(basic.menu_callback, pattern="^main_menu$")
             ],
+            name="quiz_conversation",
+            persistent=persistence is not None,
         )
         application.add_handler(quiz_conversation)
+        # Ответы в опросах-викторинах приходят вне диалога: у poll_answer нет чата
+        application.add_handler(PollAnswerHandler(quiz.handle_poll_answer))
+        application.add_handler(PollAnswerHandler(group_quiz.handle_poll_answer), group=1)
         application.add_handler(personality_conversation)
         application.add_handler(gpt_conversation)
+        application.add_handler(CallbackQueryHandler(group_quiz.group_quiz_callback, pattern="^group_quiz_"))
         application.add_handler(CallbackQueryHandler(random_fact.random_fact_callback, pattern="^random_"))
         application.add_handler(CallbackQueryHandler(recommendations.recommend_callback, pattern="^recommend_"))
         application.add_handler(CallbackQueryHandler(basic.menu_callback))
+        instrument_application(application)
 
         logger.info("Бот запущен успешно!")
 
-        application.run_polling()
+        if BOT_MODE == "webhook":
+            asyncio.run(run_webhook(application))
+        else:
+            application.run_polling()
 
     except Exception as e:
         logger.error(f'Ошибка при запуске: {str(e)}', exc_info=True)
@@ -0,0 +1,283 @@
+"""Рассылка "факт дня" подписчикам: расписание, лимиты отправки и продолжение после перезапуска
+
+Подписки и ход рассылок хранятся в SQLite. Чаты обходятся по возрастанию chat_id
+пачками; после каждой пачки сохраняется курсор - последний обработанный chat_id,
+поэтому прерванная рассылка продолжается с места остановки (повторно может уйти
+не больше одной пачки). Заблокировавшие бота чаты удаляются из подписчиков.
+
+Оценка скорости без Telegram:
+    python -m tests.benchmarks.broadcast 20000
+"""
+import asyncio
+import datetime
+import html
+import logging
+import sqlite3
+import time
+from telegram.error import BadRequest, ChatMigrated, Forbidden, NetworkError, RetryAfter
+from config import (BROADCAST_TIME, BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_BATCH, BROADCAST_RETRIES,
+                    BROADCAST_DB_PATH)
+from services.content_pool import content_pool, FACT_TOPIC
+from services.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Ошибки BadRequest, после которых писать в чат бессмысленно
+GONE_CHAT_ERRORS = ("chat not found", "user is deactivated", "peer_id_invalid")
+
+
+class SubscriptionStore:
+    """Подписчики и состояние рассылок в SQLite"""
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS subscribers (chat_id INTEGER PRIMARY KEY, created REAL NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS broadcasts ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, day TEXT NOT NULL UNIQUE, text TEXT NOT NULL, "
+            "cursor INTEGER, total INTEGER NOT NULL, sent INTEGER NOT NULL DEFAULT 0, "
+            "blocked INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0, "
+            "elapsed REAL NOT NULL DEFAULT 0, finished REAL)"
+        )
+        self._db.commit()
+
+    def subscribe(self, chat_id: int) -> bool:
+        """Подписка чата; False, если он уже подписан"""
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO subscribers (chat_id, created) VALUES (?, ?)", (chat_id, time.time())
+        )
+        self._db.commit()
+        return cursor.rowcount > 0
+
+    def unsubscribe(self, chat_ids: list) -> int:
+        cursor = self._db.executemany("DELETE FROM subscribers WHERE chat_id = ?", [(chat_id,) for chat_id in chat_ids])
+        self._db.commit()
+        return cursor.rowcount
+
+    def is_subscribed(self, chat_id: int) -> bool:
+        return self._db.execute("SELECT 1 FROM subscribers WHERE chat_id = ?", (chat_id,)).fetchone() is not None
+
+    def migrate(self, old_chat_id: int, new_chat_id: int):
+        """Группа стала супергруппой и получила новый id"""
+        self._db.execute("UPDATE OR IGNORE subscribers SET chat_id = ? WHERE chat_id = ?", (new_chat_id, old_chat_id))
+        self._db.execute("DELETE FROM subscribers WHERE chat_id = ?", (old_chat_id,))
+        self._db.commit()
+
+    def count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM subscribers").fetchone()[0]
+
+    def batch(self, after, limit: int) -> list:
+        """Следующие limit подписчиков с chat_id больше курсора"""
+        if after is None:
+            rows = self._db.execute("SELECT chat_id FROM subscribers ORDER BY chat_id LIMIT ?", (limit,))
+        else:
+            rows = self._db.execute(
+                "SELECT chat_id FROM subscribers WHERE chat_id > ? ORDER BY chat_id LIMIT ?", (after, limit)
+            )
+        return [row[0] for row in rows.fetchall()]
+
+    def has_broadcast(self, day: str) -> bool:
+        return self._db.execute("SELECT 1 FROM broadcasts WHERE day = ?", (day,)).fetchone() is not None
+
+    def create_broadcast(self, day: str, text: str) -> dict:
+        self._db.execute("INSERT INTO broadcasts (day, text, total) VALUES (?, ?, ?)", (day, text, self.count()))
+        self._db.commit()
+        return self._broadcast("day = ?", day)
+
+    def unfinished_broadcast(self):
+        """Прерванная рассылка или None"""
+        return self._broadcast("finished IS NULL ORDER BY id LIMIT 1")
+
+    def last_broadcast(self):
+        return self._broadcast("1 ORDER BY id DESC LIMIT 1")
+
+    def save_progress(self, broadcast: dict, finished: bool = False):
+        self._db.execute(
+            "UPDATE broadcasts SET cursor = ?, sent = ?, blocked = ?, failed = ?, elapsed = ?, finished = ? "
+            "WHERE id = ?",
+            (broadcast["cursor"], broadcast["sent"], broadcast["blocked"], broadcast["failed"],
+             broadcast["elapsed"], time.time() if finished else None, broadcast["id"])
+        )
+        self._db.commit()
+
+    def _broadcast(self, condition: str, *args):
+        self._db.row_factory = sqlite3.Row
+        try:
+            row = self._db.execute(f"SELECT * FROM broadcasts WHERE {condition}", args).fetchone()
+        finally:
+            self._db.row_factory = None
+        return dict(row) if row else None
+
+    def close(self):
+        self._db.close()
+
+
+class Broadcaster:
+    """Рассылка одного текста всем подписчикам с общим лимитом скорости
+
+    Без переданного хранилища база BROADCAST_DB_PATH открывается в start(), а не при импорте.
+    """
+
+    def __init__(self, store, rate: float, concurrency: int, batch_size: int, retries: int):
+        self.store = store
+        self.bucket = TokenBucket(rate, 1)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.retries = retries
+        self.bot = None
+        self.current = None
+        self._task = None
+
+    def start(self, bot, send_time: str = BROADCAST_TIME):
+        """Запуск по расписанию; прерванная рассылка продолжается сразу"""
+        if self.store is None:
+            self.store = SubscriptionStore(BROADCAST_DB_PATH)
+        self.bot = bot
+        self._task = asyncio.create_task(self._schedule(send_time))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def broadcast(self, day: str = None) -> dict:
+        """Рассылка факта дня; если предыдущая не завершена, сначала досылается она"""
+        pending = self.store.unfinished_broadcast()
+        if pending is not None:
+            return await self.deliver(pending)
+
+        day = day or datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        fact = await content_pool.get(FACT_TOPIC)
+        # Факт пишет модель: без экранирования символ < или & ломает HTML и рассылку целиком
+        text = f"📅 <b>Факт дня</b>\n\n{html.escape(fact)}\n\nОтписаться: /unsubscribe"
+        return await self.deliver(self.store.create_broadcast(day, text))
+
+    async def deliver(self, broadcast: dict) -> dict:
+        """Отправка по курсору пачками; после каждой пачки курсор и счётчики сохраняются"""
+        if broadcast["cursor"] is not None:
+            logger.info(f"Продолжаю рассылку {broadcast['day']} после chat_id {broadcast['cursor']}")
+        self.current = broadcast
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(chat_id):
+            async with semaphore:
+                return chat_id, await self._send(chat_id, broadcast["text"])
+
+        try:
+            while True:
+                chat_ids = self.store.batch(broadcast["cursor"], self.batch_size)
+                if not chat_ids:
+                    break
+                started = time.monotonic()
+                results = await asyncio.gather(*(send(chat_id) for chat_id in chat_ids))
+                gone = [chat_id for chat_id, result in results if result == "blocked"]
+                if gone:
+                    self.store.unsubscribe(gone)
+                for _, result in results:
+                    broadcast[result] += 1
+                broadcast["cursor"] = chat_ids[-1]
+                broadcast["elapsed"] += time.monotonic() - started
+                self.store.save_progress(broadcast)
+        finally:
+            self.current = None
+
+        self.store.save_progress(broadcast, finished=True)
+        report = self.report(broadcast)
+        logger.info(
+            f"Рассылка {broadcast['day']} завершена: отправлено {report['sent']}, отписано {report['blocked']}, "
+            f"ошибок {report['failed']} за {report['elapsed_s']} с ({report['messages_per_second']} сообщ./с)"
+        )
+        return report
+
+    async def _send(self, chat_id: int, text: str) -> str:
+        """Отправка одному чату: sent, blocked (чат больше недоступен) или failed
+
+        Flood wait повторяет TelegramRateLimiter (не больше self.retries раз), здесь - только сетевые ошибки.
+        """
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML',
+                                            rate_limit_args=self.retries)
+                return "sent"
+            except Forbidden:
+                return "blocked"
+            except ChatMigrated as e:
+                self.store.migrate(chat_id, e.new_chat_id)
+                chat_id = e.new_chat_id
+            except RetryAfter as e:
+                logger.warning(f"Рассылка: чат {chat_id} пропущен после повторов flood wait: {e}")
+                return "failed"
+            except BadRequest as e:
+                if any(error in str(e).lower() for error in GONE_CHAT_ERRORS):
+                    return "blocked"
+                logger.warning(f"Рассылка: чат {chat_id} отклонил сообщение: {e}")
+                return "failed"
+            except NetworkError as e:
+                logger.warning(f"Рассылка: сетевая ошибка для чата {chat_id}: {e}")
+                await asyncio.sleep(2 ** attempt)
+        return "failed"
+
+    @staticmethod
+    def report(broadcast: dict) -> dict:
+        """Итоги рассылки: счётчики, время и скорость"""
+        processed = broadcast["sent"] + broadcast["blocked"] + broadcast["failed"]
+        elapsed = broadcast["elapsed"]
+        return {
+            "day": broadcast["day"],
+            "total": broadcast["total"],
+            "sent": broadcast["sent"],
+            "blocked": broadcast["blocked"],
+            "failed": broadcast["failed"],
+            "elapsed_s": round(elapsed, 1),
+            "messages_per_second": round(processed / elapsed, 1) if elapsed else None
+        }
+
+    def stats(self) -> dict:
+        """Подписчики, ход текущей рассылки с оценкой оставшегося времени и итоги последней"""
+        if self.store is None:
+            return {"started": False}
+        result = {"subscribers": self.store.count()}
+        if self.current is not None:
+            progress = self.report(self.current)
+            speed = progress["messages_per_second"]
+            remaining = max(0, progress["total"] - progress["sent"] - progress["blocked"] - progress["failed"])
+            progress["eta_s"] = round(remaining / speed) if speed else None
+            result["running"] = progress
+        else:
+            last = self.store.last_broadcast()
+            if last is not None:
+                result["last"] = self.report(last)
+        return result
+
+    async def _schedule(self, send_time: str):
+        """Ежедневный запуск в send_time (UTC); пропущенная сегодня рассылка отправляется сразу"""
+        if self.store.unfinished_broadcast() is not None:
+            await self._run()
+        if not send_time:
+            return
+
+        hour, minute = (int(part) for part in send_time.split(':'))
+        while True:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if now >= run_at:
+                if not self.store.has_broadcast(now.date().isoformat()):
+                    await self._run()
+                run_at += datetime.timedelta(days=1)
+            await asyncio.sleep((run_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+    async def _run(self):
+        try:
+            await self.broadcast()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка рассылки: {e}")
+
+
+broadcaster = Broadcaster(
+    None, BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_BATCH, BROADCAST_RETRIES
+)
+
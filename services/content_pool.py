@@ -0,0 +1,276 @@
+"""Пул заранее сгенерированных фактов и вопросов квиза с фоновым пополнением"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+from collections import deque
+from config import POOL_CAPACITY, POOL_LOW_WATER, POOL_PATH
+from data.quiz_topics import QUIZ_TOPICS
+from services.openai_client import generate_fact, generate_quiz_question
+from services.quiz_question import QuizQuestion
+from services.metrics import registry, hit_ratio_families
+
+logger = logging.getLogger(__name__)
+
+FACT_TOPIC = "fact"
+# Сколько пустых или уже виденных элементов допускается за одно пополнение
+MAX_FAILED_ATTEMPTS = 3
+SEEN_HISTORY = 500
+RECENT_HISTORY = 20
+
+
+def quiz_topic(topic_key: str) -> str:
+    """Имя темы пула для вопросов квиза"""
+    return f"quiz_{topic_key}"
+
+
+def _fingerprint(text: str) -> str:
+    """Отпечаток текста для поиска дубликатов"""
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+class ContentPool:
+    """Ограниченные очереди готовых ответов по темам"""
+
+    def __init__(self, path: str, capacity: int, low_water: int):
+        self.path = path
+        # Файл пула переписывает только бот; пакетная задача кладёт готовые элементы во входящие
+        self.inbox_path = os.path.splitext(path)[0] + ".inbox.json"
+        self.capacity = capacity
+        self.low_water = low_water
+        self._generators = {}
+        self._validators = {}
+        self._queues = {}
+        self._seen = {}
+        self._recent = {}
+        self._refills = {}
+        self.hits = {}
+        self.misses = {}
+
+    def register(self, topic: str, generator, validate=None):
+        """Регистрация темы и корутины-генератора для неё
+
+        validate(item) -> bool отсеивает негодные элементы, добавляемые извне
+        (сохранённый пул старого формата, результаты пакетной генерации).
+        """
+        self._generators[topic] = generator
+        self._validators[topic] = validate
+        self._queues[topic] = deque(maxlen=self.capacity)
+        self._seen[topic] = deque(maxlen=SEEN_HISTORY)
+        self._recent[topic] = deque(maxlen=RECENT_HISTORY)
+        self.hits[topic] = 0
+        self.misses[topic] = 0
+
+    def start(self):
+        """Загрузка пула с диска и запуск пополнения всех тем"""
+        self.load()
+        self.take_inbox()
+        for topic in self._generators:
+            self._schedule_refill(topic)
+
+    async def stop(self):
+        """Остановка фоновых задач и сохранение пула"""
+        for task in self._refills.values():
+            task.cancel()
+        await asyncio.gather(*self._refills.values(), return_exceptions=True)
+        self._refills.clear()
+        self.save()
+
+    def take(self, topic: str):
+        """Готовый элемент без ожидания или None, если очередь пуста"""
+        queue = self._queues[topic]
+        item = queue.popleft() if queue else None
+        if item is None:
+            self.misses[topic] += 1
+        else:
+            self.hits[topic] += 1
+            self._recent[topic].append(item)
+        if len(queue) < self.low_water:
+            self._schedule_refill(topic)
+        return item
+
+    async def get(self, topic: str) -> str:
+        """Элемент из пула, а при промахе - сгенерированный сразу
+
+        Если генерация не удалась (например, разомкнут circuit breaker),
+        повторно выдаётся один из недавно показанных элементов.
+        """
+        item = self.take(topic)
+        if item is not None:
+            return item
+
+        try:
+            item = await self._generators[topic]()
+        except Exception as e:
+            if not self._recent[topic]:
+                raise
+            logger.warning(f"Пул {topic} пуст, генерация не удалась ({e}) - повторяю недавний элемент")
+            return random.choice(self._recent[topic])
+
+        self._remember(topic, item)
+        self._recent[topic].append(item)
+        return item
+
+    def stats(self) -> dict:
+        """Размер очереди и счётчики попаданий по темам"""
+        return {
+            topic: {"size": len(queue), "hits": self.hits[topic], "misses": self.misses[topic]}
+            for topic, queue in self._queues.items()
+        }
+
+    def free(self, topic: str) -> int:
+        """Сколько элементов ещё поместится в очередь темы"""
+        return max(0, self.capacity - len(self._queues[topic]))
+
+    def add(self, topic: str, items) -> int:
+        """Добавление готовых элементов без дубликатов; возвращает число добавленных"""
+        queue = self._queues[topic]
+        validate = self._validators[topic]
+        added = 0
+        for item in items:
+            if len(queue) >= self.capacity:
+                break
+            if validate is not None and not validate(item):
+                continue
+            if item and self._remember(topic, item):
+                queue.append(item)
+                added += 1
+        return added
+
+    def _remember(self, topic: str, item: str) -> bool:
+        """Запоминает элемент; False, если такой уже встречался"""
+        fingerprint = _fingerprint(item)
+        if fingerprint in self._seen[topic]:
+            return False
+        self._seen[topic].append(fingerprint)
+        return True
+
+    def _schedule_refill(self, topic: str):
+        """Запуск пополнения темы, если оно ещё не идёт"""
+        task = self._refills.get(topic)
+        if task is None or task.done():
+            self._refills[topic] = asyncio.create_task(self._refill(topic))
+
+    async def _refill(self, topic: str):
+        """Пополнение очереди темы до полной ёмкости; сначала забираются элементы пакетной задачи"""
+        self.take_inbox()
+        queue = self._queues[topic]
+        failures = 0
+        added = 0
+        while len(queue) < self.capacity and failures < MAX_FAILED_ATTEMPTS:
+            try:
+                item = await self._generators[topic]()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Запрос к модели уже повторён ResilientCaller - до следующего take() пул не пополняется
+                logger.error(f"Ошибка пополнения пула {topic}: {e}")
+                break
+
+            if item and self._remember(topic, item):
+                queue.append(item)
+                added += 1
+            else:
+                failures += 1
+
+        if added:
+            logger.info(f"Пул {topic} пополнен на {added}, размер {len(queue)}")
+            self.save()
+
+    def load(self, inbox: bool = False):
+        """Чтение сохранённых очередей; inbox - вместе с входящими, ещё не забранными ботом"""
+        self._add_all(self._read(self.path))
+        if inbox:
+            self._add_all(self._read(self.inbox_path))
+
+    def submit(self, items: dict):
+        """Передача элементов {тема: [элементы]} работающему боту через файл входящих
+
+        Бот забирает их при запуске и перед каждым пополнением. Запись атомарная,
+        а дубликаты, если бот забрал файл во время записи, отсеются при добавлении.
+        """
+        pending = self._read(self.inbox_path)
+        for topic, topic_items in items.items():
+            pending.setdefault(topic, []).extend(topic_items)
+        temporary = self.inbox_path + ".tmp"
+        with open(temporary, 'w', encoding='utf-8') as inbox_file:
+            json.dump(pending, inbox_file, ensure_ascii=False, indent=2)
+        os.replace(temporary, self.inbox_path)
+
+    def take_inbox(self) -> int:
+        """Перенос входящих элементов в очереди; возвращает число добавленных"""
+        taken = self.inbox_path + ".taken"
+        try:
+            os.replace(self.inbox_path, taken)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.error(f"Не удалось забрать входящие элементы пула: {e}")
+            return 0
+        added = self._add_all(self._read(taken))
+        os.remove(taken)
+        if added:
+            logger.info(f"Из пакетной генерации в пул добавлено {added}")
+            self.save()
+        return added
+
+    def _add_all(self, stored: dict) -> int:
+        return sum(self.add(topic, items) for topic, items in stored.items() if topic in self._queues)
+
+    @staticmethod
+    def _read(path: str) -> dict:
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding='utf-8') as pool_file:
+                return json.load(pool_file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать {path}: {e}")
+            return {}
+
+    def save(self):
+        """Сохранение очередей на диск"""
+        try:
+            with open(self.path, 'w', encoding='utf-8') as pool_file:
+                json.dump({topic: list(queue) for topic, queue in self._queues.items()},
+                          pool_file, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить пул: {e}")
+
+
+async def _quiz_item(topic_prompt: str) -> str:
+    """Вопрос квиза хранится в пуле в виде компактного JSON"""
+    return (await generate_quiz_question(topic_prompt)).to_json()
+
+
+def is_valid_quiz_item(item) -> bool:
+    """Элемент пула квиза - корректная JSON-запись вопроса"""
+    if not isinstance(item, str):
+        return False
+    try:
+        QuizQuestion.from_json(item)
+    except ValueError:
+        return False
+    return True
+
+
+content_pool = ContentPool(POOL_PATH, POOL_CAPACITY, POOL_LOW_WATER)
+content_pool.register(FACT_TOPIC, generate_fact)
+for _topic_key, _topic_data in QUIZ_TOPICS.items():
+    content_pool.register(quiz_topic(_topic_key),
+                          lambda prompt=_topic_data['prompt']: _quiz_item(prompt),
+                          validate=is_valid_quiz_item)
+
+
+@registry.collector
+def content_pool_metrics() -> list:
+    stats = content_pool.stats()
+    families = hit_ratio_families("bot_content_pool", "Пул готового контента",
+                                  {(("topic", topic),): (entry["hits"], entry["misses"])
+                                   for topic, entry in stats.items()})
+    families.append(("bot_content_pool_size", "gauge", "Готовые элементы в пуле",
+                     [({"topic": topic}, entry["size"]) for topic, entry in stats.items()]))
+    return families
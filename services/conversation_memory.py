@@ -0,0 +1,93 @@
+"""История диалога с ограничением по токенам и фоновым сжатием старых реплик в резюме
+
+История хранится как обычный словарь в context.user_data, поэтому сохраняется
+вместе с остальным состоянием пользователя (см. services/state_store.py).
+"""
+import asyncio
+import logging
+from config import HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_TOKENS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+# Служебные токены на каждое сообщение в формате chat completions
+MESSAGE_OVERHEAD = 4
+
+_summary_tasks = {}
+
+
+def count_tokens(text: str) -> int:
+    """Число токенов текста (приблизительно, если tiktoken не установлен)"""
+    if _encoding is not None:
+        return len(_encoding.encode(text)) + MESSAGE_OVERHEAD
+    # Для кириллицы в среднем около трёх символов на токен
+    return len(text) // 3 + MESSAGE_OVERHEAD
+
+
+def get_history(storage: dict, key: str) -> dict:
+    """История диалога из хранилища пользователя; создаётся при первом обращении"""
+    return storage.setdefault(f"history_{key}", {"summary": "", "turns": [], "pending": []})
+
+
+def clear_history(storage: dict, key: str):
+    """Удаление истории диалога"""
+    storage.pop(f"history_{key}", None)
+
+
+def remember_turn(history: dict, user_message: str, reply: str, summarize):
+    """Добавление реплик и сдвиг окна; вытесненные реплики сжимаются корутиной summarize в фоне
+
+    summarize(previous_summary, dialog_text) -> новое резюме
+    """
+    turns = history["turns"]
+    turns.append(("user", user_message, count_tokens(user_message)))
+    turns.append(("assistant", reply, count_tokens(reply)))
+
+    budget = HISTORY_TOKEN_BUDGET - count_tokens(history["summary"])
+    used = sum(tokens for _, _, tokens in turns)
+    while turns and used > budget:
+        role, content, tokens = turns.pop(0)
+        history["pending"].append((role, content, tokens))
+        used -= tokens
+
+    if history["pending"]:
+        _schedule_summary(history, summarize)
+
+
+def _schedule_summary(history: dict, summarize):
+    """Запуск сжатия, если для этой истории оно ещё не идёт"""
+    task = _summary_tasks.get(id(history))
+    if task is None or task.done():
+        task = asyncio.create_task(_summarize(history, summarize))
+        _summary_tasks[id(history)] = task
+        task.add_done_callback(lambda _: _summary_tasks.pop(id(history), None))
+
+
+async def _summarize(history: dict, summarize):
+    """Сжатие накопленных вытесненных реплик в резюме"""
+    while history["pending"]:
+        batch = list(history["pending"])
+        dialog = "\n".join(f"{role}: {content}" for role, content, _ in batch)
+        try:
+            summary = await summarize(history["summary"], dialog)
+        except Exception as e:
+            logger.error(f"Не удалось сжать историю диалога: {e}")
+            # Без резюме не копим бесконечно: оставляем только то, что помещается в бюджет
+            while sum(tokens for _, _, tokens in history["pending"]) > HISTORY_TOKEN_BUDGET:
+                history["pending"].pop(0)
+            return
+
+        del history["pending"][:len(batch)]
+        history["summary"] = _truncate(summary, HISTORY_SUMMARY_TOKENS)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Обрезка резюме, если модель вернула слишком длинный текст"""
+    while text and count_tokens(text) > max_tokens:
+        text = text[:int(len(text) * 0.9)]
+    return text
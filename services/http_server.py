@@ -0,0 +1,135 @@
+"""Минимальный асинхронный HTTP/1.1 сервер на asyncio для вебхука и служебных эндпоинтов"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+# Ограничения заголовков: строка длиннее MAX_LINE_SIZE обрывает соединение
+MAX_LINE_SIZE = 8 * 1024
+MAX_HEADER_COUNT = 100
+MAX_HEADERS_SIZE = 32 * 1024
+# Время на заголовки и тело запроса и простой соединения между запросами, с
+READ_TIMEOUT = 10.0
+IDLE_TIMEOUT = 60.0
+REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 413: "Payload Too Large",
+           429: "Too Many Requests", 431: "Request Header Fields Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+class HttpRequest:
+    """Разобранный HTTP-запрос"""
+
+    __slots__ = ("method", "path", "headers", "body")
+
+    def __init__(self, method: str, path: str, headers: dict, body: bytes):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+
+class HttpServer:
+    """Сервер с маршрутизацией по методу и пути; обработчик возвращает (статус, тело, content-type)
+
+    Медленный или молчащий клиент не держит соединение дольше read_timeout
+    (заголовки и тело) и idle_timeout (ожидание следующего запроса).
+    """
+
+    def __init__(self, read_timeout: float = READ_TIMEOUT, idle_timeout: float = IDLE_TIMEOUT):
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self._routes = {}
+        self._prefix_routes = []
+        self._server = None
+
+    def route(self, method: str, path: str, handler, prefix: bool = False):
+        """Регистрация обработчика; prefix=True - для всех путей, начинающихся с path"""
+        if prefix:
+            self._prefix_routes.append((method, path, handler))
+        else:
+            self._routes[(method, path)] = handler
+
+    async def start(self, host: str, port: int) -> int:
+        """Запуск сервера; возвращает фактический порт (удобно при port=0)"""
+        self._server = await asyncio.start_server(self._handle, host, port, limit=MAX_LINE_SIZE)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _find(self, method: str, path: str):
+        handler = self._routes.get((method, path.split('?', 1)[0]))
+        if handler:
+            return handler
+        for route_method, route_path, route_handler in self._prefix_routes:
+            if route_method == method and path.startswith(route_path):
+                return route_handler
+        return None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = await asyncio.wait_for(self._read_headers(reader), self.read_timeout)
+                if headers is None:
+                    await self._respond(writer, 431, b"", "text/plain", close=True)
+                    break
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, 413, b"", "text/plain", close=True)
+                    break
+                body = await asyncio.wait_for(reader.readexactly(length), self.read_timeout) if length else b""
+
+                handler = self._find(method, path)
+                if handler is None:
+                    status, payload, content_type = 404, b"not found", "text/plain"
+                else:
+                    try:
+                        status, payload, content_type = await handler(HttpRequest(method, path, headers, body))
+                    except Exception as e:
+                        logger.error(f"Ошибка обработки {method} {path}: {e}", exc_info=True)
+                        status, payload, content_type = 500, b"error", "text/plain"
+
+                close = headers.get('connection', '').lower() == 'close'
+                await self._respond(writer, status, payload, content_type, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_headers(reader):
+        """Заголовки запроса; None, если их больше MAX_HEADER_COUNT или больше MAX_HEADERS_SIZE байт"""
+        headers = {}
+        size = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            size += len(line)
+            if len(headers) >= MAX_HEADER_COUNT or size > MAX_HEADERS_SIZE:
+                return None
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    @staticmethod
+    async def _respond(writer, status: int, payload: bytes, content_type: str, close: bool = False):
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
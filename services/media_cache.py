@@ -0,0 +1,69 @@
+"""Кэш баннеров меню: изображения загружаются в Telegram один раз и дальше отправляются по file_id"""
+import json
+import logging
+import os
+from telegram import InputFile
+from telegram.error import BadRequest
+from config import IMAGES_DIR, MEDIA_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class MediaCache:
+    """Хранит содержимое изображений в памяти и file_id, выданные Telegram"""
+
+    def __init__(self, images_dir: str, store_path: str):
+        self.images_dir = images_dir
+        self.store_path = store_path
+        self._images = {}
+        self._file_ids = {}
+
+    def load(self):
+        """Однократное чтение изображений и сохранённых file_id при старте"""
+        if os.path.isdir(self.images_dir):
+            for name in os.listdir(self.images_dir):
+                with open(os.path.join(self.images_dir, name), 'rb') as image_file:
+                    self._images[name] = image_file.read()
+
+        if os.path.exists(self.store_path):
+            try:
+                with open(self.store_path, encoding='utf-8') as store_file:
+                    self._file_ids = json.load(store_file)
+            except (OSError, ValueError) as e:
+                logger.error(f"Не удалось прочитать кэш file_id: {e}")
+                self._file_ids = {}
+
+        logger.info(f"Загружено изображений: {len(self._images)}, file_id в кэше: {len(self._file_ids)}")
+
+    def has(self, name: str) -> bool:
+        """Есть ли изображение с таким именем"""
+        return name in self._images or name in self._file_ids
+
+    async def send_photo(self, send, name: str, **kwargs):
+        """Отправка баннера через send(photo=..., **kwargs), например target.reply_photo"""
+        file_id = self._file_ids.get(name)
+        if file_id:
+            try:
+                return await send(photo=file_id, **kwargs)
+            except BadRequest as e:
+                if name not in self._images:
+                    raise
+                logger.warning(f"file_id для {name} недействителен, загружаю заново: {e}")
+                self._file_ids.pop(name, None)
+
+        message = await send(photo=InputFile(self._images[name], filename=name), **kwargs)
+        if message and message.photo:
+            self._file_ids[name] = message.photo[-1].file_id
+            self._save()
+        return message
+
+    def _save(self):
+        """Сохранение file_id на диск, чтобы не загружать баннеры после перезапуска"""
+        try:
+            with open(self.store_path, 'w', encoding='utf-8') as store_file:
+                json.dump(self._file_ids, store_file, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить кэш file_id: {e}")
+
+
+media_cache = MediaCache(IMAGES_DIR, MEDIA_CACHE_PATH)
@@ -0,0 +1,333 @@
+"""Метрики в формате Prometheus: счётчики, gauge, гистограммы задержек и локальный эндпоинт /metrics
+
+Помимо корзин гистограммы для каждой серии отдаются p50/p95/p99 по последним
+замерам (семейство <имя>_quantile), чтобы задержки можно было смотреть без Prometheus.
+"""
+import functools
+import inspect
+import logging
+import time
+from collections import deque
+from telegram.ext import ConversationHandler
+from config import METRICS_LISTEN, METRICS_PORT
+from services.http_server import HttpServer
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+QUANTILE_SAMPLES = 1000
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels: dict) -> str:
+    """Метки серии в синтаксисе Prometheus: {name="value",...}"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Семейство серий с одинаковым набором меток; значения меток передаются позиционно"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._series = {}
+
+    def _labels(self, values: tuple) -> dict:
+        return dict(zip(self.labelnames, values))
+
+    def header(self, name: str = None, kind: str = None) -> list:
+        name = name or self.name
+        return [f"# HELP {name} {self.help_text}", f"# TYPE {name} {kind or self.kind}"]
+
+    def render(self) -> list:
+        lines = self.header()
+        for values, value in self._series.items():
+            lines.append(f"{self.name}{format_labels(self._labels(values))} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self._series[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    """Гистограмма с накопительными корзинами и окном последних замеров для перцентилей"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = {
+                "counts": [0] * len(self.buckets), "sum": 0.0, "count": 0, "recent": deque(maxlen=QUANTILE_SAMPLES)
+            }
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][index] += 1
+                break
+        series["sum"] += value
+        series["count"] += 1
+        series["recent"].append(value)
+
+    def quantiles(self, *labels) -> dict:
+        """p50/p95/p99 по последним QUANTILE_SAMPLES замерам"""
+        series = self._series.get(labels)
+        if not series or not series["recent"]:
+            return {}
+        ordered = sorted(series["recent"])
+        return {quantile: ordered[min(len(ordered) - 1, int(len(ordered) * quantile))] for quantile in QUANTILES}
+
+    def render(self) -> list:
+        lines = self.header()
+        for values, series in self._series.items():
+            labels = self._labels(values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(dict(labels, le=format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(dict(labels, le='+Inf'))} {series['count']}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {series['count']}")
+
+        name = f"{self.name}_quantile"
+        lines.extend(self.header(name, "gauge"))
+        for values in self._series:
+            for quantile, value in self.quantiles(*values).items():
+                labels = dict(self._labels(values), quantile=quantile)
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+
+class Registry:
+    """Все метрики процесса и сборщики, читающие готовую статистику модулей при запросе /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple = ()) -> Gauge:
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def collector(self, collect):
+        """collect() -> [(имя, тип, описание, [(метки, значение)])]; вызывается при каждом запросе /metrics"""
+        self._collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logger.error(f"Ошибка сборщика метрик {collect.__name__}: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{format_labels(labels)} {format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+registry = Registry()
+
+HANDLER_LATENCY = registry.histogram("bot_handler_duration_seconds", "Время работы обработчика", ("handler",))
+HANDLER_IN_FLIGHT = registry.gauge("bot_handler_in_flight", "Выполняющиеся обработчики", ("handler",))
+HANDLER_ERRORS = registry.counter("bot_handler_errors_total", "Исключения, вышедшие из обработчика", ("handler",))
+CALL_LATENCY = registry.histogram("bot_model_call_duration_seconds",
+                                  "Время вызова функции services/openai_client.py целиком", ("function",))
+CALL_IN_FLIGHT = registry.gauge("bot_model_call_in_flight", "Выполняющиеся вызовы services/openai_client.py",
+                                ("function",))
+MODEL_LATENCY = registry.histogram("bot_model_request_duration_seconds", "Время запроса к модели",
+                                   ("task", "provider"))
+MODEL_FIRST_TOKEN = registry.histogram("bot_model_first_token_seconds", "Время до первого фрагмента потока",
+                                       ("task", "provider"))
+MODEL_IN_FLIGHT = registry.gauge("bot_model_requests_in_flight", "Запросы к модели в работе", ("task",))
+MODEL_ERRORS = registry.counter("bot_model_errors_total", "Неудачные запросы к модели", ("task", "provider"))
+MODEL_TOKENS = registry.counter("bot_model_tokens_total", "Токены промпта (in) и ответа (out)", ("task", "direction"))
+TELEGRAM_LATENCY = registry.histogram("bot_telegram_request_duration_seconds", "Время запроса к Bot API",
+                                      ("endpoint",))
+TELEGRAM_WAIT = registry.histogram("bot_telegram_limiter_wait_seconds", "Ожидание лимитов перед запросом к Bot API",
+                                   ("endpoint",))
+TELEGRAM_ERRORS = registry.counter("bot_telegram_errors_total", "Ошибки запросов к Bot API", ("endpoint", "error"))
+TELEGRAM_POOL_WAIT = registry.histogram("bot_telegram_pool_wait_seconds", "Ожидание свободного соединения пула Bot API",
+                                        ("pool",), buckets=(0.001,) + DEFAULT_BUCKETS)
+TELEGRAM_POOL_IN_USE = registry.gauge("bot_telegram_pool_connections_in_use", "Занятые соединения пула Bot API",
+                                      ("pool",))
+TELEGRAM_POOL_TIMEOUTS = registry.counter("bot_telegram_pool_timeouts_total",
+                                          "Запросы, не дождавшиеся соединения пула Bot API", ("pool",))
+
+
+def record_tokens(task: str, usage):
+    """Учёт токенов запроса по задаче (режиму)"""
+    if usage is not None:
+        MODEL_TOKENS.inc(task, "in", amount=usage.prompt_tokens)
+        MODEL_TOKENS.inc(task, "out", amount=usage.completion_tokens)
+
+
+def hit_ratio_families(prefix: str, help_text: str, stats: dict) -> list:
+    """Счётчики попаданий/промахов и их доля для сборщика; stats: {метки: (попадания, промахи)}"""
+    hits, misses, ratios = [], [], []
+    for labels, (hit, miss) in stats.items():
+        labels = dict(labels)
+        hits.append((labels, hit))
+        misses.append((labels, miss))
+        ratios.append((labels, round(hit / (hit + miss), 4) if hit + miss else 0.0))
+    return [
+        (f"{prefix}_hits_total", "counter", f"{help_text}: попадания", hits),
+        (f"{prefix}_misses_total", "counter", f"{help_text}: промахи", misses),
+        (f"{prefix}_hit_ratio", "gauge", f"{help_text}: доля попаданий", ratios)
+    ]
+
+
+def observed(function):
+    """Декоратор функции или асинхронного генератора: задержка и число выполняющихся вызовов"""
+    name = function.__name__
+
+    if inspect.isasyncgenfunction(function):
+        @functools.wraps(function)
+        async def generator_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            CALL_IN_FLIGHT.inc(name)
+            try:
+                async for item in function(*args, **kwargs):
+                    yield item
+            finally:
+                CALL_IN_FLIGHT.dec(name)
+                CALL_LATENCY.observe(time.perf_counter() - started, name)
+        return generator_wrapper
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        CALL_IN_FLIGHT.inc(name)
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            CALL_IN_FLIGHT.dec(name)
+            CALL_LATENCY.observe(time.perf_counter() - started, name)
+    return wrapper
+
+
+def instrument_handler(callback):
+    """Обёртка callback обработчика Telegram: задержка, выполняющиеся вызовы, исключения и спан трассировки"""
+    if getattr(callback, "instrumented", False):
+        return callback
+    name = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        HANDLER_IN_FLIGHT.inc(name)
+        try:
+            with tracer.span("handler", handler=name):
+                return await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_IN_FLIGHT.dec(name)
+            HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument_application(application):
+    """Оборачивает callback всех зарегистрированных обработчиков, включая состояния ConversationHandler"""
+    def instrument(handler):
+        if isinstance(handler, ConversationHandler):
+            for nested in handler.entry_points + handler.fallbacks:
+                instrument(nested)
+            for state_handlers in handler.states.values():
+                for nested in state_handlers:
+                    instrument(nested)
+        elif getattr(handler, "callback", None) is not None:
+            handler.callback = instrument_handler(handler.callback)
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            instrument(handler)
+
+
+class MetricsServer:
+    """Локальный HTTP-сервер с эндпоинтом /metrics и другими служебными эндпоинтами"""
+
+    def __init__(self):
+        self._server = None
+        self._routes = [("GET", "/metrics", self._metrics)]
+
+    def route(self, method: str, path: str, handler):
+        """Служебный эндпоинт, доступный только на METRICS_LISTEN"""
+        self._routes.append((method, path, handler))
+        if self._server is not None:
+            self._server.route(method, path, handler)
+
+    async def start(self):
+        if not METRICS_PORT:
+            return
+        self._server = HttpServer()
+        for method, path, handler in self._routes:
+            self._server.route(method, path, handler)
+        port = await self._server.start(METRICS_LISTEN, METRICS_PORT)
+        logger.info(f"Метрики доступны на http://{METRICS_LISTEN}:{port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            await self._server.stop()
+            self._server = None
+
+    @staticmethod
+    async def _metrics(request):
+        return 200, registry.render().encode('utf-8'), CONTENT_TYPE
+
+
+metrics_server = MetricsServer()
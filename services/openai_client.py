@@ -1,57 +1,349 @@
-"""Модуль для работы с OpenAI"""
-from openai import OpenAI
+"""Модуль для работы с языковыми моделями (бэкенд для каждой задачи выбирает services/providers.py)"""
+import asyncio
 import logging
-from config import CHATGPT_TOKEN
+import time
+from config import OPENAI_MODEL, COMPLETION_TOKEN_ESTIMATE
+from services.response_cache import response_cache
+from services.conversation_memory import count_tokens, remember_turn
+from services.rate_limit import openai_budget, current_user
+from services.semantic_cache import semantic_cache
+from services.providers import router
+from services.prompts import (FACT_PROMPT, chatgpt_messages, dialog_messages, quiz_question_messages,
+                             system_message, prefix_cache_stats)
+from services.quiz_question import QuizQuestion
+from services.tracing import tracer
+from services.metrics import (MODEL_LATENCY, MODEL_FIRST_TOKEN, MODEL_IN_FLIGHT, MODEL_ERRORS, observed, record_tokens,
+                              registry)
 
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=CHATGPT_TOKEN)
+# Повышенная температура, чтобы пул не заполнялся почти одинаковыми фактами
+POOL_FACT_TEMPERATURE = 0.9
+QUIZ_TEMPERATURE = 0.8
 
 
-async def get_chatgpt_response(prompt: str, mode: str = "default") -> str:
-    """Универсальная функция для запросов к ChatGPT"""
+def prompt_tokens(messages: list) -> int:
+    """Оценка длины промпта в токенах"""
+    return sum(count_tokens(message["content"]) for message in messages)
+
+
+def route_for(task: str, messages: list):
+    """Бэкенд и модель для запроса (см. services/providers.py)"""
+    return router.route(task, prompt_tokens(messages))
+
+
+async def reserve_tokens(provider, messages: list) -> int:
+    """Ожидание общего бюджета токенов в очереди пользователя; возвращает зарезервированную оценку"""
+    if not provider.metered:
+        return 0
+    estimate = prompt_tokens(messages) + COMPLETION_TOKEN_ESTIMATE
+    await openai_budget.acquire(current_user.get(), estimate)
+    return estimate
+
+
+def settle_tokens(provider, estimate: int, usage):
+    """Поправка бюджета на фактический расход токенов"""
+    if provider.metered and usage is not None:
+        openai_budget.adjust(usage.total_tokens - estimate)
+
+
+async def create_completion(messages: list, temperature: float, task: str = "default", route=None,
+                            json_mode: bool = False) -> str:
+    """Запрос к модели, выбранной для задачи, с ограничением параллелизма, повторами и circuit breaker"""
+    route = route or route_for(task, messages)
+    with tracer.span("admission", task=task):
+        estimate = await reserve_tokens(route.provider, messages)
+    started = time.perf_counter()
+    MODEL_IN_FLIGHT.inc(task)
     try:
-        system_messages = {
-            "default": "Ты полезный ассистент. Отвечай на вопросы развернуто и точно. " 
-              "Переводи текст ТОЛЬКО если явно указано это в запросе.",
-            "translate": "Ты профессиональный переводчик.",
-            "fact": "Ты энциклопедия интересных фактов.",
-            "personality": "Ты исполняешь роль конкретной личности."
-        }
-
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_messages.get(mode, "Ты полезный ассистент.")},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7 if mode == "default" else 0.3
-        )
-        return response.choices[0].message.content
+        with tracer.span("model", task=task, provider=route.provider.name, model=route.model) as span:
+            text, usage = await route.provider.complete(messages, temperature, route.model, json_mode=json_mode)
+            if span is not None and usage is not None:
+                span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    except Exception:
+        MODEL_ERRORS.inc(task, route.provider.name)
+        raise
+    finally:
+        MODEL_IN_FLIGHT.dec(task)
+    elapsed = time.perf_counter() - started
+    router.record(route, elapsed)
+    MODEL_LATENCY.observe(elapsed, task, route.provider.name)
+    record_tokens(task, usage)
+    settle_tokens(route.provider, estimate, usage)
+    prefix_cache_stats.record(messages, usage)
+    return text
+
+
+async def stream_completion(messages: list, temperature: float, task: str = "default", route=None):
+    """Потоковый запрос к модели: выдаёт фрагменты текста по мере генерации"""
+    route = route or route_for(task, messages)
+    with tracer.span("admission", task=task):
+        estimate = await reserve_tokens(route.provider, messages)
+    started = time.perf_counter()
+    first_token = True
+    MODEL_IN_FLIGHT.inc(task)
+    # Спан не делается текущим: между yield работает потребитель потока (правки сообщения в Telegram)
+    span = tracer.start_span("model", task=task, provider=route.provider.name, model=route.model, stream=True)
+    try:
+        async for text, usage in route.provider.stream(messages, temperature, route.model):
+            if usage is not None:
+                if span is not None:
+                    span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+                record_tokens(task, usage)
+                settle_tokens(route.provider, estimate, usage)
+                prefix_cache_stats.record(messages, usage)
+            if text:
+                if first_token:
+                    MODEL_FIRST_TOKEN.observe(time.perf_counter() - started, task, route.provider.name)
+                    if span is not None:
+                        span.set(first_token_ms=round((time.perf_counter() - started) * 1000, 3))
+                    first_token = False
+                yield text
+    except Exception as e:
+        MODEL_ERRORS.inc(task, route.provider.name)
+        tracer.finish(span, e)
+        span = None
+        raise
+    finally:
+        MODEL_IN_FLIGHT.dec(task)
+        tracer.finish(span)
+    # Для SLO учитывается время до полного ответа, как его видит пользователь
+    elapsed = time.perf_counter() - started
+    router.record(route, elapsed)
+    MODEL_LATENCY.observe(elapsed, task, route.provider.name)
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных запросов: все вызывающие получают результат одного"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, factory):
+        """Выполнение factory() или ожидание уже идущего запроса с тем же ключом"""
+        future = self._inflight.get(key)
+        if future is None:
+            self.leaders += 1
+            # Отдельная задача: отмена первого вызывающего не прерывает запрос для остальных
+            future = asyncio.ensure_future(factory())
+            self._track(key, future)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    def follow(self, key: str):
+        """Будущий результат идущего запроса с этим ключом или None"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        return future
+
+    def lead(self, key: str) -> asyncio.Future:
+        """Регистрация запроса, результат которого вызывающий передаст сам через set_result/set_exception"""
+        self.leaders += 1
+        future = asyncio.get_running_loop().create_future()
+        self._track(key, future)
+        return future
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "leaders": self.leaders, "coalesced": self.coalesced}
+
+    def _track(self, key: str, future: asyncio.Future):
+        self._inflight[key] = future
+        future.add_done_callback(lambda done: self._forget(key, done))
+
+    def _forget(self, key: str, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Ошибка уже передана ожидающим; без этого asyncio предупреждает о непрочитанном исключении
+            future.exception()
+
+
+single_flight = SingleFlight()
+
+
+@registry.collector
+def single_flight_metrics() -> list:
+    stats = single_flight.stats()
+    return [
+        ("bot_single_flight_in_flight", "gauge", "Запросы к модели, которых ждут другие вызовы",
+         [({}, stats["in_flight"])]),
+        ("bot_single_flight_coalesced_total", "counter", "Вызовы, получившие результат чужого запроса",
+         [({}, stats["coalesced"])])
+    ]
+
+
+def flight_key(messages: list, temperature: float, model: str = OPENAI_MODEL) -> str:
+    """Ключ объединения запросов: текст запроса без различий в пробелах"""
+    return response_cache.make_key(model, messages[0]["content"], " ".join(messages[-1]["content"].split()),
+                                   temperature)
+
+
+def mode_temperature(mode: str) -> float:
+    """Температура генерации для режима"""
+    return 0.7 if mode == "default" else 0.3
+
+
+def response_cache_key(messages: list, temperature: float, model: str = OPENAI_MODEL) -> str:
+    """Ключ кэша ответов для запроса"""
+    return response_cache.make_key(model, messages[0]["content"], messages[-1]["content"], temperature)
+
+
+@observed
+async def summarize_dialog(previous_summary: str, dialog: str) -> str:
+    """Сжатие старых реплик диалога в краткое резюме"""
+    prompt = (
+        f"Предыдущее резюме: {previous_summary or 'нет'}\n\n"
+        f"Новые реплики:\n{dialog}\n\n"
+        "Составь обновлённое краткое резюме диалога (до 5 предложений), сохранив важные факты и договорённости."
+    )
+    return await create_completion(
+        [
+            {"role": "system", "content": "Ты кратко и точно резюмируешь диалоги."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.2,
+        task="summary"
+    )
+
+
+@observed
+async def get_chatgpt_response(prompt: str, mode: str = "default", cache_variants: int = 0) -> str:
+    """Универсальная функция для запросов к ChatGPT
+
+    cache_variants > 0 включает кэш ответов: после накопления указанного
+    числа вариантов ответ выбирается из них без запроса к модели.
+    """
+    messages = chatgpt_messages(prompt, mode)
+    temperature = mode_temperature(mode)
+    route = route_for(mode, messages)
+    cache_key = response_cache_key(messages, temperature, route.model) if cache_variants else None
+    if cache_key:
+        cached = response_cache.get(cache_key, cache_variants)
+        if cached is not None:
+            return cached
+
+    try:
+        text = await single_flight.do(flight_key(messages, temperature, route.model),
+                                      lambda: create_completion(messages, temperature=temperature, task=mode,
+                                                                route=route))
+
+    except Exception as e:
+        logger.error(f"Ошибка ChatGPT: {e}")
+        stale = response_cache.get(cache_key) if cache_key else None
+        return stale if stale is not None else f"Извините, произошла ошибка. {str(e)}"
+
+    if cache_key:
+        response_cache.put(cache_key, text, cache_variants)
+    return text
+
+
+@observed
+async def stream_chatgpt_response(prompt: str, mode: str = "default", cache_variants: int = 0, history=None,
+                                  semantic_query: str = None):
+    """Потоковый вариант get_chatgpt_response; history - история диалога из conversation_memory
+
+    semantic_query - исходный вопрос пользователя для семантического кэша; кэш
+    используется только в начале диалога, пока ответ не зависит от контекста.
+    """
+    messages = dialog_messages(system_message(mode), prompt, history)
+    temperature = mode_temperature(mode)
+    route = route_for(mode, messages)
+    cache_key = response_cache_key(messages, temperature, route.model) if cache_variants and history is None else None
+    if cache_key:
+        cached = response_cache.get(cache_key, cache_variants)
+        if cached is not None:
+            yield cached
+            return
+
+    fresh_dialog = history is None or not (history["turns"] or history["summary"])
+    semantic = semantic_cache is not None and semantic_query and fresh_dialog
+    if semantic:
+        cached = semantic_cache.lookup(mode, semantic_query)
+        if cached is not None:
+            yield cached
+            if history is not None:
+                remember_turn(history, prompt, cached, summarize_dialog)
+            return
+
+    # Одинаковый запрос уже генерируется для другого пользователя - ждём его целиком.
+    # Диалоги с историей не объединяются: их контекст у каждого свой
+    key = flight_key(messages, temperature, route.model) if history is None else None
+    leader = single_flight.follow(key) if key else None
+    if leader is not None:
+        try:
+            yield await asyncio.shield(leader)
+        except Exception as e:
+            logger.error(f"Ошибка ChatGPT: {e}")
+            yield f"Извините, произошла ошибка. {str(e)}"
+        return
+
+    flight = single_flight.lead(key) if key else None
+    parts = []
+    try:
+        async for token in stream_completion(messages, temperature=temperature, task=mode, route=route):
+            parts.append(token)
+            yield token
 
     except Exception as e:
         logger.error(f"Ошибка ChatGPT: {e}")
-        return f"Извините, произошла ошибка. {str(e)}"
+        if flight:
+            flight.set_exception(e)
+        stale = response_cache.get(cache_key) if cache_key and not parts else None
+        yield stale if stale is not None else f"Извините, произошла ошибка. {str(e)}"
+        return
+
+    else:
+        if flight:
+            flight.set_result("".join(parts))
 
+    finally:
+        if flight and not flight.done():
+            # Поток прерван до конца (например, закрыт генератор) - ожидающие получат ошибку
+            flight.set_exception(RuntimeError("запрос прерван"))
 
-async def get_random_fact() -> str:
-    """Генерация случайного факта"""
-    return await get_chatgpt_response("Расскажи интересный научный факт (1-2 предложения)", "fact")
+    if cache_key:
+        response_cache.put(cache_key, "".join(parts), cache_variants)
+    if semantic:
+        semantic_cache.add(mode, semantic_query, "".join(parts))
+    if history is not None:
+        remember_turn(history, prompt, "".join(parts), summarize_dialog)
 
 
-async def get_personality_response(user_message: str, personality_prompt: str) -> str:
-    """Генерация ответа от имени личности"""
+@observed
+async def generate_fact() -> str:
+    """Генерация факта для фонового пула; ошибки не перехватываются"""
+    return await create_completion(chatgpt_messages(FACT_PROMPT, "fact"), temperature=POOL_FACT_TEMPERATURE,
+                                   task="fact")
+
+
+@observed
+async def generate_quiz_question(topic_prompt: str) -> QuizQuestion:
+    """Генерация вопроса квиза в режиме JSON; ошибки, в том числе невалидный ответ, не перехватываются"""
+    text = await create_completion(quiz_question_messages(topic_prompt), temperature=QUIZ_TEMPERATURE, task="quiz",
+                                   json_mode=True)
+    return QuizQuestion.from_json(text)
+
+
+@observed
+async def stream_personality_response(user_message: str, personality_prompt: str, history=None):
+    """Потоковый ответ от имени личности"""
+    messages = dialog_messages(personality_prompt, user_message, history)
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": personality_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.8
-        )
-        return response.choices[0].message.content
+        parts = []
+        async for token in stream_completion(messages, temperature=0.8, task="personality"):
+            parts.append(token)
+            yield token
 
     except Exception as e:
         logger.error(f"Ошибка личности: {e}")
-        return "Не удалось получить ответ. Попробуйте позже."
\ No newline at end of file
+        yield "Не удалось получить ответ. Попробуйте позже."
+        return
+
+    if history is not None:
+        remember_turn(history, user_message, "".join(parts), summarize_dialog)
+
@@ -0,0 +1,101 @@
+"""Сборка сообщений для модели со стабильным статическим префиксом
+
+Кэш префиксов OpenAI срабатывает только на побайтно совпадающем начале запроса,
+поэтому статическая часть (системный промпт личности, темы квиза или режима)
+всегда идёт первой и не содержит пользовательских данных, а всё, что зависит
+от пользователя (резюме, история, вопрос), добавляется после неё.
+"""
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+FACT_PROMPT = "Расскажи интересный научный факт (1-2 предложения)"
+QUIZ_QUESTION_PROMPT = (
+    "Создай вопрос для квиза. Верни только JSON-объект вида "
+    '{"question": "текст вопроса", "options": ["вариант 1", "вариант 2", "вариант 3", "вариант 4"], '
+    '"correct_index": номер правильного варианта от 0 до 3, '
+    '"explanation": "почему этот ответ правильный и интересный факт по теме, 1-2 предложения"}. '
+    "Варианты не нумеруй и не помечай буквами."
+)
+
+SYSTEM_MESSAGES = {
+    "default": "Ты полезный ассистент. Отвечай на вопросы развернуто и точно. "
+               "Переводи текст ТОЛЬКО если явно указано это в запросе.",
+    "translate": "Ты профессиональный переводчик.",
+    "fact": "Ты энциклопедия интересных фактов.",
+    "personality": "Ты исполняешь роль конкретной личности."
+}
+DEFAULT_SYSTEM_MESSAGE = "Ты полезный ассистент."
+
+
+def system_message(mode: str) -> str:
+    """Статический системный промпт режима"""
+    return SYSTEM_MESSAGES.get(mode, DEFAULT_SYSTEM_MESSAGE)
+
+
+def chatgpt_messages(prompt: str, mode: str) -> list:
+    """Сообщения для запроса в заданном режиме"""
+    return [
+        {"role": "system", "content": system_message(mode)},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def dialog_messages(system_prompt: str, user_message: str, history=None) -> list:
+    """Системный промпт, затем резюме и окно истории, затем новый вопрос"""
+    messages = [{"role": "system", "content": system_prompt}]
+    if history is not None:
+        if history["summary"]:
+            messages.append({"role": "system",
+                             "content": f"Краткое содержание предыдущего диалога: {history['summary']}"})
+        messages.extend({"role": role, "content": content} for role, content, _ in history["turns"])
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def quiz_question_messages(topic_prompt: str) -> list:
+    """Сообщения для генерации вопроса квиза: полностью статичны для темы"""
+    return [
+        {"role": "system", "content": topic_prompt},
+        {"role": "user", "content": QUIZ_QUESTION_PROMPT}
+    ]
+
+
+class PrefixCacheStats:
+    """Учёт закэшированных токенов промпта по статическим префиксам"""
+
+    def __init__(self):
+        self._stats = {}
+
+    @staticmethod
+    def prefix_key(messages: list) -> str:
+        return hashlib.sha1(messages[0]["content"].encode('utf-8')).hexdigest()[:12]
+
+    def record(self, messages: list, usage):
+        """Запись usage из ответа API"""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) or 0
+        key = self.prefix_key(messages)
+        entry = self._stats.setdefault(key, {
+            "prefix": messages[0]["content"][:40],
+            "requests": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0
+        })
+        entry["requests"] += 1
+        entry["prompt_tokens"] += usage.prompt_tokens
+        entry["cached_tokens"] += cached
+
+    def stats(self) -> dict:
+        """Доля закэшированных токенов промпта по префиксам"""
+        return {
+            key: dict(entry, hit_rate=round(entry["cached_tokens"] / entry["prompt_tokens"], 3)
+                      if entry["prompt_tokens"] else 0.0)
+            for key, entry in self._stats.items()
+        }
+
+
+prefix_cache_stats = PrefixCacheStats()
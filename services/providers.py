@@ -0,0 +1,278 @@
+"""Бэкенды языковых моделей и маршрутизация задач бота между ними
+
+- openai: OpenAI API;
+- local: локальный OpenAI-совместимый сервер (llama.cpp server, vLLM, Ollama) на CPU;
+- fake: детерминированные ответы без сети - для офлайн-проверок и нагрузочных тестов.
+
+Маршруты задаются переменной LLM_ROUTES, например "fact=local,translate=openai:gpt-4o-mini".
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import deque
+from openai import AsyncOpenAI
+from config import (CHATGPT_TOKEN, OPENAI_MODEL, OPENAI_MAX_CONCURRENCY, OPENAI_TIMEOUT, OPENAI_BASE_URL,
+                    LOCAL_LLM_BASE_URL, LOCAL_LLM_MODEL, LOCAL_LLM_API_KEY, LOCAL_LLM_CONCURRENCY, LOCAL_LLM_TIMEOUT,
+                    FAKE_LLM_LATENCY, LLM_DEFAULT_PROVIDER, LLM_ROUTES, LLM_LONG_ROUTES, LLM_LONG_PROMPT_TOKENS,
+                    LLM_SLOS, LLM_SLO_FALLBACK, LLM_LATENCY_WINDOW, LLM_LATENCY_MIN_SAMPLES)
+from services.conversation_memory import count_tokens
+from services.resilience import openai_caller, create_caller, LATENCY_SAMPLES
+
+logger = logging.getLogger(__name__)
+
+# Задачи, которые бот отправляет модели; по ним настраиваются маршруты
+TASKS = ("default", "translate", "fact", "personality", "quiz", "summary")
+
+
+class Usage:
+    """Расход токенов в формате usage из OpenAI API"""
+
+    __slots__ = ("prompt_tokens", "completion_tokens", "total_tokens", "prompt_tokens_details")
+
+    def __init__(self, prompt_tokens: int, completion_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+        self.prompt_tokens_details = None
+
+
+class OpenAICompatibleProvider:
+    """Бэкенд с OpenAI-совместимым API: сам OpenAI или локальный сервер"""
+
+    def __init__(self, name: str, api_key: str, base_url, model: str, timeout: float, concurrency: int,
+                 caller, metered: bool):
+        self.name = name
+        self.model = model
+        # Учитывать ли запросы в общем бюджете токенов (services/rate_limit.py)
+        self.metered = metered
+        self.caller = caller
+        # Повторы выполняет caller, поэтому встроенные повторы клиента отключены
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def complete(self, messages: list, temperature: float, model: str = None, json_mode: bool = False):
+        """Ответ модели целиком: (текст, usage); json_mode требует от модели JSON-объект"""
+        extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+
+        async def request():
+            async with self._semaphore:
+                return await self.client.chat.completions.create(
+                    model=model or self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    **extra
+                )
+
+        response = await self.caller.call(request)
+        return response.choices[0].message.content, response.usage
+
+    async def stream(self, messages: list, temperature: float, model: str = None):
+        """Поток пар (фрагмент текста, usage); usage приходит в последнем элементе"""
+        async with self._semaphore:
+            # Повторы и дедлайн действуют до начала потока; дубликаты потоковых запросов не отправляются
+            stream = await self.caller.call(
+                lambda: self.client.chat.completions.create(
+                    model=model or self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                ),
+                hedge=False
+            )
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text or chunk.usage:
+                    yield text or "", chunk.usage
+
+    def stats(self) -> dict:
+        return dict(self.caller.stats(), model=self.model)
+
+
+class FakeProvider:
+    """Детерминированные ответы без сети с необязательной искусственной задержкой"""
+
+    def __init__(self, latency: float = 0.0):
+        self.name = "fake"
+        self.model = "fake"
+        self.metered = False
+        self.latency = latency
+        self.requests = 0
+
+    @staticmethod
+    def answer(messages: list, json_mode: bool = False) -> str:
+        """Ответ зависит только от содержимого запроса; в режиме JSON - вопрос квиза"""
+        digest = hashlib.sha256(repr(messages).encode('utf-8')).hexdigest()[:8]
+        if json_mode:
+            return json.dumps({
+                "question": f"Тестовый вопрос {digest}?",
+                "options": ["Первый", "Второй", "Третий", "Четвёртый"],
+                "correct_index": int(digest, 16) % 4,
+                "explanation": f"Тестовое объяснение {digest}."
+            }, ensure_ascii=False)
+        return f"Тестовый ответ {digest} на: {messages[-1]['content'][:80]}"
+
+    async def complete(self, messages: list, temperature: float, model: str = None, json_mode: bool = False):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        text = self.answer(messages, json_mode)
+        return text, self._usage(messages, text)
+
+    async def stream(self, messages: list, temperature: float, model: str = None):
+        self.requests += 1
+        text = self.answer(messages)
+        words = text.split(" ")
+        for word in words:
+            await asyncio.sleep(self.latency / len(words))
+            yield word + " ", None
+        yield "", self._usage(messages, text)
+
+    @staticmethod
+    def _usage(messages: list, text: str) -> Usage:
+        return Usage(sum(count_tokens(message["content"]) for message in messages), count_tokens(text))
+
+    def stats(self) -> dict:
+        return {"model": self.model, "requests": self.requests}
+
+
+class Route:
+    """Выбранные для запроса бэкенд и модель"""
+
+    __slots__ = ("provider", "model")
+
+    def __init__(self, provider, model: str):
+        self.provider = provider
+        self.model = model
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider.name}:{self.model}"
+
+
+class LatencyTracker:
+    """Скользящее окно задержек по маршрутам: учитываются только замеры за последние window секунд"""
+
+    def __init__(self, window: float, min_samples: int):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+
+    def record(self, key: str, seconds: float):
+        samples = self._samples.setdefault(key, deque(maxlen=LATENCY_SAMPLES))
+        samples.append((time.monotonic(), seconds))
+
+    def p95(self, key: str):
+        """95-й перцентиль задержки маршрута или None, если свежих замеров мало"""
+        samples = self._samples.get(key)
+        if not samples:
+            return None
+        now = time.monotonic()
+        while samples and now - samples[0][0] > self.window:
+            samples.popleft()
+        if len(samples) < self.min_samples:
+            return None
+        ordered = sorted(seconds for _, seconds in samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def stats(self) -> dict:
+        result = {}
+        for key in self._samples:
+            p95 = self.p95(key)
+            result[key] = {"samples": len(self._samples[key]),
+                           "p95_ms": round(p95 * 1000, 1) if p95 is not None else None}
+        return result
+
+
+def parse_mapping(value: str) -> dict:
+    """Разбор строки вида "fact=local,translate=openai:gpt-4o-mini" в словарь"""
+    mapping = {}
+    for item in value.split(','):
+        key, _, target = item.partition('=')
+        if key.strip() and target.strip():
+            mapping[key.strip()] = target.strip()
+    return mapping
+
+
+class ProviderRouter:
+    """Выбор бэкенда и модели для запроса по задаче, длине промпта и наблюдаемой задержке
+
+    Цель маршрута - "бэкенд" или "бэкенд:модель". Если p95 задержки основного
+    маршрута задачи нарушает её SLO, запросы уходят на fallback, пока старые
+    замеры не выйдут из окна; после этого основной маршрут пробуется снова.
+    """
+
+    def __init__(self, providers: dict, default: str, routes: dict, long_routes: dict, long_prompt_tokens: int,
+                 slos: dict, fallback: str, tracker: LatencyTracker):
+        self.providers = providers
+        self.default = self._target(default)
+        self.routes = {task: self._target(target) for task, target in routes.items()}
+        self.long_routes = {task: self._target(target) for task, target in long_routes.items()}
+        self.long_prompt_tokens = long_prompt_tokens
+        self.slos = {task: float(seconds) for task, seconds in slos.items()}
+        self.fallback = self._target(fallback) if fallback else None
+        self.tracker = tracker
+        self.fallbacks = 0
+        for task in set(routes) | set(long_routes) | set(slos):
+            if task not in TASKS:
+                logger.warning(f"Маршрут для неизвестной задачи {task} не будет использован")
+
+    def route(self, task: str, prompt_tokens: int = 0) -> Route:
+        """Маршрут для запроса задачи task с промптом длиной prompt_tokens"""
+        route = self.routes.get(task, self.default)
+        if prompt_tokens > self.long_prompt_tokens:
+            route = self.long_routes.get(task, route)
+
+        slo = self.slos.get(task)
+        if slo is not None and self.fallback is not None and route.key != self.fallback.key:
+            p95 = self.tracker.p95(route.key)
+            if p95 is not None and p95 > slo:
+                self.fallbacks += 1
+                return self.fallback
+        return route
+
+    def record(self, route: Route, seconds: float):
+        self.tracker.record(route.key, seconds)
+
+    def stats(self) -> dict:
+        return {
+            "providers": {name: provider.stats() for name, provider in self.providers.items()},
+            "latency": self.tracker.stats(),
+            "fallbacks": self.fallbacks
+        }
+
+    def _target(self, target: str) -> Route:
+        name, _, model = target.partition(':')
+        if name not in self.providers:
+            raise ValueError(f"Неизвестный бэкенд моделей в маршрутах: {name}")
+        provider = self.providers[name]
+        return Route(provider, model or provider.model)
+
+
+def create_router() -> ProviderRouter:
+    """Бэкенды и маршруты из конфигурации"""
+    providers = {
+        "openai": OpenAICompatibleProvider(
+            "openai", CHATGPT_TOKEN, OPENAI_BASE_URL, OPENAI_MODEL, OPENAI_TIMEOUT, OPENAI_MAX_CONCURRENCY,
+            caller=openai_caller, metered=True
+        ),
+        "local": OpenAICompatibleProvider(
+            "local", LOCAL_LLM_API_KEY, LOCAL_LLM_BASE_URL, LOCAL_LLM_MODEL, LOCAL_LLM_TIMEOUT, LOCAL_LLM_CONCURRENCY,
+            caller=create_caller(LOCAL_LLM_TIMEOUT, hedge_enabled=False), metered=False
+        ),
+        "fake": FakeProvider(FAKE_LLM_LATENCY)
+    }
+    return ProviderRouter(
+        providers,
+        default=LLM_DEFAULT_PROVIDER,
+        routes=parse_mapping(LLM_ROUTES),
+        long_routes=parse_mapping(LLM_LONG_ROUTES),
+        long_prompt_tokens=LLM_LONG_PROMPT_TOKENS,
+        slos=parse_mapping(LLM_SLOS),
+        fallback=LLM_SLO_FALLBACK,
+        tracker=LatencyTracker(LLM_LATENCY_WINDOW, LLM_LATENCY_MIN_SAMPLES)
+    )
+
+
+router = create_router()
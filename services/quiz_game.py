@@ -0,0 +1,167 @@
+"""Движок группового квиза: раунды на время, подсчёт очков и таблица лидеров
+
+Ответы обрабатываются без обращения к модели: поиск сессии по id опроса - O(1),
+обновление таблицы - O(log S), где S - максимально возможный счёт.
+"""
+import time
+from collections import OrderedDict
+
+# Очки за правильный ответ и бонус за скорость (полный - за мгновенный ответ)
+BASE_POINTS = 10
+SPEED_BONUS = 10
+MAX_TRACKED_POLLS = 1000
+
+
+class Leaderboard:
+    """Очки игроков: дерево Фенвика по значениям счёта и множества игроков с одинаковым счётом"""
+
+    def __init__(self, max_score: int):
+        self.max_score = max_score
+        self._tree = [0] * (max_score + 2)
+        self._scores = {}
+        self._buckets = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def score(self, player) -> int:
+        return self._scores.get(player, 0)
+
+    def add(self, player, points: int):
+        """Начисление очков; игрок с нулём очков тоже попадает в таблицу"""
+        old = self._scores.get(player)
+        if old is not None:
+            self._update(old, -1)
+            bucket = self._buckets[old]
+            bucket.discard(player)
+            if not bucket:
+                del self._buckets[old]
+        new = min(self.max_score, (old or 0) + points)
+        self._scores[player] = new
+        self._update(new, 1)
+        self._buckets.setdefault(new, set()).add(player)
+
+    def rank(self, player) -> int:
+        """Место игрока: 1 + число игроков со строго большим счётом"""
+        return 1 + len(self._scores) - self._prefix(self._scores[player])
+
+    def top(self, count: int) -> list:
+        """Лучшие игроки: [(игрок, очки)] по убыванию очков"""
+        result = []
+        for score in sorted(self._buckets, reverse=True):
+            for player in self._buckets[score]:
+                result.append((player, score))
+                if len(result) == count:
+                    return result
+        return result
+
+    def _update(self, score: int, delta: int):
+        index = score + 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, score: int) -> int:
+        """Число игроков со счётом не больше score"""
+        index = score + 1
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+
+class QuizSession:
+    """Игра в одном групповом чате: текущий раунд, ответы и очки"""
+
+    def __init__(self, chat_id: int, topic_key: str, rounds: int, round_seconds: float):
+        self.chat_id = chat_id
+        self.topic_key = topic_key
+        self.rounds = rounds
+        self.round_seconds = round_seconds
+        self.round = 0
+        self.leaderboard = Leaderboard(rounds * (BASE_POINTS + SPEED_BONUS))
+        self.names = {}
+        self.task = None
+        self._poll_id = None
+        self._correct_index = None
+        self._started_at = 0.0
+        self._answered = set()
+        self._correct = 0
+        self._round_points = {}
+
+    def start_round(self, poll_id: str, correct_index: int):
+        self.round += 1
+        self._poll_id = poll_id
+        self._correct_index = correct_index
+        self._started_at = time.monotonic()
+        self._answered = set()
+        self._correct = 0
+
+    def answer(self, poll_id: str, player: int, name: str, option_id: int) -> bool:
+        """Учёт ответа; False, если опрос уже не текущий или игрок уже отвечал"""
+        if poll_id != self._poll_id or player in self._answered:
+            return False
+        elapsed = time.monotonic() - self._started_at
+        if elapsed > self.round_seconds:
+            return False
+
+        self._answered.add(player)
+        self.names[player] = name
+        points = 0
+        if option_id == self._correct_index:
+            self._correct += 1
+            points = BASE_POINTS + round(SPEED_BONUS * (1 - elapsed / self.round_seconds))
+        self.leaderboard.add(player, points)
+        self._round_points[player] = self._round_points.get(player, 0) + points
+        return True
+
+    def finish_round(self) -> dict:
+        """Итоги раунда; текущий опрос больше не принимает ответы"""
+        self._poll_id = None
+        return {"answered": len(self._answered), "correct": self._correct}
+
+    def take_points(self) -> dict:
+        """Очки, набранные с прошлого вызова - для пакетной записи в хранилище"""
+        points, self._round_points = self._round_points, {}
+        return points
+
+
+class QuizGames:
+    """Активные игры по чатам и поиск игры по id опроса"""
+
+    def __init__(self):
+        self.sessions = {}
+        self._polls = OrderedDict()
+        self.answers = 0
+
+    def start(self, session: QuizSession) -> bool:
+        """Регистрация игры; False, если в чате уже идёт другая"""
+        if session.chat_id in self.sessions:
+            return False
+        self.sessions[session.chat_id] = session
+        return True
+
+    def finish(self, chat_id: int):
+        self.sessions.pop(chat_id, None)
+
+    def track_poll(self, poll_id: str, session: QuizSession):
+        self._polls[poll_id] = session
+        while len(self._polls) > MAX_TRACKED_POLLS:
+            self._polls.popitem(last=False)
+
+    def answer(self, poll_id: str, player: int, name: str, option_id: int):
+        """Ответ в опросе групповой игры; None, если опрос не относится ни к одной игре"""
+        session = self._polls.get(poll_id)
+        if session is None:
+            return None
+        accepted = session.answer(poll_id, player, name, option_id)
+        if accepted:
+            self.answers += 1
+        return accepted
+
+    def stats(self) -> dict:
+        return {"sessions": len(self.sessions), "answers": self.answers}
+
+
+quiz_games = QuizGames()
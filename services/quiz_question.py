@@ -0,0 +1,102 @@
+"""Вопрос квиза в структурированном виде: разбор и проверка ответа модели, локальная проверка ответа игрока"""
+import html
+import json
+import re
+
+LETTERS = "ABCD"
+# Кириллические буквы, которые пользователи часто вводят вместо латинских
+CYRILLIC_LETTERS = {"А": "A", "В": "B", "Б": "B", "С": "C", "Д": "D"}
+MAX_QUESTION_LENGTH = 300
+MAX_OPTION_LENGTH = 100
+MAX_EXPLANATION_LENGTH = 600
+# Ограничение Telegram на длину пояснения в опросе-викторине
+POLL_EXPLANATION_LENGTH = 200
+
+
+class QuizQuestion:
+    """Вопрос, четыре варианта ответа, индекс правильного и объяснение"""
+
+    __slots__ = ("question", "options", "correct_index", "explanation")
+
+    def __init__(self, question: str, options: list, correct_index: int, explanation: str):
+        self.question = question
+        self.options = options
+        self.correct_index = correct_index
+        self.explanation = explanation
+
+    @classmethod
+    def from_dict(cls, data) -> "QuizQuestion":
+        """Проверка полей; ValueError, если запись не подходит для квиза"""
+        if not isinstance(data, dict):
+            raise ValueError("ожидается JSON-объект")
+
+        question = data.get("question")
+        if not isinstance(question, str) or not question.strip() or len(question) > MAX_QUESTION_LENGTH:
+            raise ValueError("некорректный текст вопроса")
+
+        options = data.get("options")
+        if not isinstance(options, list) or len(options) != len(LETTERS):
+            raise ValueError("нужно ровно четыре варианта ответа")
+        options = [option.strip() if isinstance(option, str) else "" for option in options]
+        if not all(options) or any(len(option) > MAX_OPTION_LENGTH for option in options):
+            raise ValueError("некорректный вариант ответа")
+        if len({option.lower() for option in options}) != len(options):
+            raise ValueError("варианты ответа повторяются")
+
+        correct_index = data.get("correct_index")
+        if isinstance(correct_index, str) and correct_index.strip().upper() in LETTERS:
+            correct_index = LETTERS.index(correct_index.strip().upper())
+        if isinstance(correct_index, bool) or not isinstance(correct_index, int) or not 0 <= correct_index < 4:
+            raise ValueError("некорректный индекс правильного ответа")
+
+        explanation = data.get("explanation")
+        if not isinstance(explanation, str) or not explanation.strip() or len(explanation) > MAX_EXPLANATION_LENGTH:
+            raise ValueError("некорректное объяснение")
+
+        return cls(question.strip(), options, correct_index, explanation.strip())
+
+    @classmethod
+    def from_json(cls, text: str) -> "QuizQuestion":
+        """Разбор ответа модели; допускается обёртка в блок ```json"""
+        text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ValueError(f"ответ не является JSON: {e}")
+        return cls.from_dict(data)
+
+    def to_json(self) -> str:
+        """Компактная запись для пула и пакетной генерации"""
+        return json.dumps({
+            "question": self.question,
+            "options": self.options,
+            "correct_index": self.correct_index,
+            "explanation": self.explanation
+        }, ensure_ascii=False)
+
+    @property
+    def correct_letter(self) -> str:
+        return LETTERS[self.correct_index]
+
+    def render(self) -> str:
+        """Вопрос с вариантами для сообщения с parse_mode HTML - без правильного ответа"""
+        lines = [html.escape(self.question), ""]
+        lines.extend(f"{letter}) {html.escape(option)}" for letter, option in zip(LETTERS, self.options))
+        return "\n".join(lines)
+
+    def poll_explanation(self) -> str:
+        """Объяснение, укороченное до лимита опроса-викторины"""
+        if len(self.explanation) <= POLL_EXPLANATION_LENGTH:
+            return self.explanation
+        return self.explanation[:POLL_EXPLANATION_LENGTH - 1] + "…"
+
+    def answer_index(self, answer: str):
+        """Индекс варианта по букве или тексту ответа; None, если ответ не распознан"""
+        answer = answer.strip().rstrip(").").upper()
+        answer = CYRILLIC_LETTERS.get(answer, answer)
+        if len(answer) == 1 and answer in LETTERS:
+            return LETTERS.index(answer)
+        for index, option in enumerate(self.options):
+            if option.upper() == answer:
+                return index
+        return None
@@ -0,0 +1,240 @@
+"""Контроль нагрузки: лимиты пользователей, общий бюджет токенов OpenAI и лимиты отправки в Telegram"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from config import (USER_RATE_PER_MINUTE, USER_BURST, OPENAI_TOKENS_PER_MINUTE, ADMISSION_MAX_WAIT,
+                    TG_GLOBAL_RATE, TG_CHAT_RATE, TG_CHAT_BURST, TG_GROUP_RATE_PER_MINUTE, TG_MAX_RETRIES)
+from services.metrics import TELEGRAM_LATENCY, TELEGRAM_WAIT, TELEGRAM_ERRORS
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACKED_KEYS = 10000
+BACKGROUND_KEY = "background"
+
+# Пользователь, от имени которого выполняется текущий запрос к модели (для справедливой очереди)
+current_user = contextvars.ContextVar("current_user", default=BACKGROUND_KEY)
+
+
+class AdmissionRejected(Exception):
+    """Запрос не допущен: бюджет исчерпан и ожидание превысило лимит"""
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float = 1) -> float:
+        """Списывает amount и возвращает 0, либо возвращает время ожидания в секундах"""
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def wait_time(self, amount: float = 1) -> float:
+        """Через сколько секунд будет доступно amount токенов"""
+        self._refill()
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+    def adjust(self, delta: float):
+        """Поправка после факта (например, реальный расход токенов); баланс может уйти в минус"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+    async def acquire(self, amount: float = 1):
+        while True:
+            wait = self.try_acquire(amount)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class KeyedBuckets:
+    """Вёдра по ключу (пользователь, чат) с ограничением числа отслеживаемых ключей"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = OrderedDict()
+
+    def get(self, key) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+            if len(self._buckets) > MAX_TRACKED_KEYS:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(key)
+        return bucket
+
+
+class FairTokenLimiter:
+    """Общий бюджет токенов в минуту с очередями по пользователям, обслуживаемыми по кругу"""
+
+    def __init__(self, tokens_per_minute: float, max_wait: float):
+        self.bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.max_wait = max_wait
+        self._queues = OrderedDict()
+        self._dispatcher = None
+        self.rejected = 0
+
+    def stats(self) -> dict:
+        return {
+            "waiting": sum(1 for queue in self._queues.values() for future, _ in queue if not future.done()),
+            "users_waiting": len(self._queues),
+            "budget": round(self.bucket.tokens),
+            "rejected": self.rejected
+        }
+
+    async def acquire(self, key, tokens: float):
+        """Ожидание своей очереди и бюджета; AdmissionRejected, если ждать дольше max_wait"""
+        tokens = min(tokens, self.bucket.capacity)
+        if not self._queues and not self.bucket.try_acquire(tokens):
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append((future, tokens))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            future.cancel()
+            self.rejected += 1
+            raise AdmissionRejected("Сервис сейчас перегружен, подождите немного и попробуйте снова.")
+
+    def adjust(self, delta: float):
+        """Учёт разницы между оценкой и фактическим расходом токенов"""
+        self.bucket.adjust(delta)
+
+    async def _dispatch(self):
+        """Выдача бюджета: по одному запросу от каждого пользователя по кругу"""
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            future, tokens = queue[0]
+            if not future.cancelled():
+                await asyncio.sleep(self.bucket.wait_time(tokens))
+                if future.cancelled() or self.bucket.try_acquire(tokens):
+                    continue
+                future.set_result(None)
+
+            queue.popleft()
+            del self._queues[key]
+            if queue:
+                self._queues[key] = queue
+
+
+user_limiter = KeyedBuckets(USER_RATE_PER_MINUTE / 60, USER_BURST)
+openai_budget = FairTokenLimiter(OPENAI_TOKENS_PER_MINUTE, ADMISSION_MAX_WAIT)
+
+
+def admission_controlled(handler):
+    """Декоратор обработчика с платным запросом к модели: лимит на пользователя и вежливый отказ"""
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        user = update.effective_user
+        if user is None:
+            return await handler(update, context)
+
+        wait = user_limiter.get(user.id).try_acquire()
+        if wait:
+            text = f"⏳ Слишком много запросов. Подождите {math.ceil(wait)} с и попробуйте снова."
+            if update.callback_query:
+                await update.callback_query.answer(text, show_alert=False)
+            elif update.message:
+                await update.message.reply_text(text)
+            # None оставляет ConversationHandler в текущем состоянии
+            return None
+
+        token = current_user.set(user.id)
+        try:
+            return await handler(update, context)
+        finally:
+            current_user.reset(token)
+
+    return wrapper
+
+
+class TelegramRateLimiter(BaseRateLimiter):
+    """Лимиты исходящих запросов к Bot API: общий, по чату и повтор после RetryAfter
+
+    Единственное место, где повторяются flood wait. rate_limit_args - число повторов
+    для конкретного вызова (0 - вызывающий код обрабатывает RetryAfter сам), по умолчанию TG_MAX_RETRIES.
+    """
+
+    UNLIMITED_ENDPOINTS = {"getUpdates", "answerCallbackQuery", "getMe", "setWebhook", "deleteWebhook"}
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(TG_GLOBAL_RATE, TG_GLOBAL_RATE)
+        self.chat_buckets = KeyedBuckets(TG_CHAT_RATE, TG_CHAT_BURST)
+        self.group_buckets = KeyedBuckets(TG_GROUP_RATE_PER_MINUTE / 60, TG_CHAT_BURST)
+        self.flood_waits = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @staticmethod
+    def max_retries(rate_limit_args) -> int:
+        if isinstance(rate_limit_args, int) and not isinstance(rate_limit_args, bool):
+            return max(0, rate_limit_args)
+        if rate_limit_args is not None:
+            logger.warning(f"Неизвестный rate_limit_args {rate_limit_args!r}, повторов: {TG_MAX_RETRIES}")
+        return TG_MAX_RETRIES
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        # Запросы вне обработки обновлений (getUpdates, рассылки) не трассируются
+        span = tracer.span("telegram", endpoint=endpoint) if tracer.active else contextlib.nullcontext()
+        with span:
+            return await self._process_request(callback, args, kwargs, endpoint, data, rate_limit_args)
+
+    async def _process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        waited = time.perf_counter()
+        if endpoint not in self.UNLIMITED_ENDPOINTS:
+            chat_id = data.get("chat_id")
+            if chat_id is not None:
+                chat_id = int(chat_id) if str(chat_id).lstrip('-').isdigit() else chat_id
+                is_group = isinstance(chat_id, str) or chat_id < 0
+                buckets = self.group_buckets if is_group else self.chat_buckets
+                await buckets.get(chat_id).acquire()
+            await self.global_bucket.acquire()
+            TELEGRAM_WAIT.observe(time.perf_counter() - waited, endpoint)
+            tracer.annotate(limiter_wait_ms=round((time.perf_counter() - waited) * 1000, 3))
+
+        max_retries = self.max_retries(rate_limit_args)
+        for attempt in range(max_retries + 1):
+            started = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                TELEGRAM_ERRORS.inc(endpoint, type(e).__name__)
+                self.flood_waits += 1
+                if attempt == max_retries:
+                    raise
+                delay = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            except Exception as e:
+                TELEGRAM_ERRORS.inc(endpoint, type(e).__name__)
+                raise
+            finally:
+                TELEGRAM_LATENCY.observe(time.perf_counter() - started, endpoint)
+            logger.warning(f"Flood wait от Telegram для {endpoint}: жду {delay} с")
+            await asyncio.sleep(delay)
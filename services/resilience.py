@@ -0,0 +1,203 @@
+"""Устойчивость запросов к внешнему API: дедлайны, повторы с backoff, хеджирование и circuit breaker"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+import openai
+from config import (OPENAI_DEADLINE, OPENAI_RETRIES, OPENAI_BACKOFF_BASE, OPENAI_BACKOFF_MAX, HEDGE_ENABLED,
+                    HEDGE_MIN_SAMPLES, BREAKER_ERROR_RATE, BREAKER_MIN_REQUESTS, BREAKER_WINDOW, BREAKER_COOLDOWN)
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 200
+
+
+class CircuitOpenError(Exception):
+    """Запрос отклонён без обращения к API: слишком много ошибок в последнее время"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Повторять имеет смысл только перегрузку, ошибки сервера, таймауты и обрывы соединения"""
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status == 429 or (status is not None and status >= 500)
+
+
+def retry_after(error: Exception):
+    """Значение заголовка Retry-After из ответа API, если он есть"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """Размыкается, когда доля ошибок за окно превышает порог; через cooldown пропускает один пробный запрос"""
+
+    def __init__(self, error_rate: float, min_requests: int, window: float, cooldown: float):
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._outcomes = deque()
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def release(self):
+        """Освобождение пробного запроса без исхода - например, если его отменили"""
+        if self.state == "half_open":
+            self._trial_running = False
+
+    def record(self, ok: bool):
+        now = time.monotonic()
+        if self.state == "half_open":
+            self._trial_running = False
+            if ok:
+                logger.info("Circuit breaker замкнут: API снова отвечает")
+                self.state = "closed"
+                self._outcomes.clear()
+            else:
+                self._open(now)
+            return
+
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+        failures = sum(1 for _, success in self._outcomes if not success)
+        if len(self._outcomes) >= self.min_requests and failures / len(self._outcomes) >= self.error_rate:
+            self._open(now)
+
+    def _open(self, now: float):
+        logger.warning(f"Circuit breaker разомкнут на {self.cooldown} с")
+        self.state = "open"
+        self._opened_at = now
+        self._outcomes.clear()
+
+
+class ResilientCaller:
+    """Обёртка над вызовами API: дедлайн на попытку, повторы, хеджирование по p95 и circuit breaker"""
+
+    def __init__(self, deadline: float, retries: int, backoff_base: float, backoff_max: float,
+                 hedge_enabled: bool, hedge_min_samples: int, breaker: CircuitBreaker):
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.retried = 0
+        self.hedged = 0
+        self.rejected = 0
+
+    async def call(self, factory, hedge: bool = True):
+        """Выполнение factory() - функции, создающей новую корутину запроса на каждую попытку"""
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self.rejected += 1
+                raise CircuitOpenError("API временно недоступен")
+
+            started = time.perf_counter()
+            try:
+                result = await self._attempt(factory, hedge)
+            except Exception as e:
+                retryable = is_retryable(e)
+                # Ошибки запроса (4xx кроме 429) не говорят о деградации API
+                self.breaker.record(not retryable)
+                if not retryable or attempt == self.retries:
+                    raise
+                self.retried += 1
+                delay = retry_after(e) or min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                delay = random.uniform(delay / 2, delay)
+                logger.warning(f"Повтор запроса через {delay:.2f} с после ошибки: {e}")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Отмена ничего не говорит о состоянии API, но пробный запрос должен освободиться
+                self.breaker.release()
+                raise
+
+            self.breaker.record(True)
+            self._latencies.append(time.perf_counter() - started)
+            return result
+
+    def p95(self):
+        """95-й перцентиль задержки успешных попыток или None, если данных мало"""
+        if len(self._latencies) < self.hedge_min_samples:
+            return None
+        samples = sorted(self._latencies)
+        return samples[int(len(samples) * 0.95) - 1]
+
+    def stats(self) -> dict:
+        p95 = self.p95()
+        return {
+            "breaker": self.breaker.state,
+            "retried": self.retried,
+            "hedged": self.hedged,
+            "rejected": self.rejected,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+    async def _attempt(self, factory, hedge: bool):
+        """Одна попытка; если ответа нет дольше p95, параллельно отправляется дубликат"""
+        hedge_delay = self.p95() if hedge and self.hedge_enabled else None
+        if hedge_delay is None or hedge_delay >= self.deadline:
+            return await asyncio.wait_for(factory(), self.deadline)
+
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + self.deadline
+        tasks = {asyncio.ensure_future(factory())}
+        hedged = False
+        error = None
+        try:
+            while tasks:
+                remaining = deadline_at - loop.time()
+                timeout = remaining if hedged else min(hedge_delay, remaining)
+                done, tasks = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+
+                if not done:
+                    if hedged or loop.time() >= deadline_at:
+                        raise asyncio.TimeoutError()
+                    self.hedged += 1
+                    hedged = True
+                    tasks.add(asyncio.ensure_future(factory()))
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def create_caller(deadline: float = OPENAI_DEADLINE, hedge_enabled: bool = HEDGE_ENABLED) -> ResilientCaller:
+    """Обёртка с параметрами из конфигурации и собственным circuit breaker"""
+    return ResilientCaller(
+        deadline=deadline,
+        retries=OPENAI_RETRIES,
+        backoff_base=OPENAI_BACKOFF_BASE,
+        backoff_max=OPENAI_BACKOFF_MAX,
+        hedge_enabled=hedge_enabled,
+        hedge_min_samples=HEDGE_MIN_SAMPLES,
+        breaker=CircuitBreaker(BREAKER_ERROR_RATE, BREAKER_MIN_REQUESTS, BREAKER_WINDOW, BREAKER_COOLDOWN)
+    )
+
+
+openai_caller = create_caller()
@@ -0,0 +1,139 @@
+"""Кэш ответов модели для повторяющихся запросов (рекомендации, переводы, факты)"""
+import hashlib
+import json
+import logging
+import random
+import sqlite3
+import time
+from collections import OrderedDict
+from config import (RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_PATH, RESPONSE_CACHE_TTL,
+                    RESPONSE_CACHE_MAX_ENTRIES)
+from services.metrics import registry, hit_ratio_families
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """LRU-хранилище в памяти: key -> (expires_at, [варианты])"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+
+    def load(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def store(self, key: str, expires_at: float, variants: list):
+        self._data[key] = (expires_at, variants)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+
+class SQLiteBackend:
+    """Хранилище на диске; вытесняются записи с самым давним обращением
+
+    Чтение ничего не пишет: время обращений копится в памяти и сохраняется
+    вместе со следующей записью, до вытеснения.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._accessed = {}
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, variants TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def load(self, key: str):
+        row = self._db.execute("SELECT expires_at, variants FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._accessed[key] = time.time()
+        return row[0], json.loads(row[1])
+
+    def store(self, key: str, expires_at: float, variants: list):
+        if self._accessed:
+            accessed, self._accessed = self._accessed, {}
+            self._db.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?",
+                                 [(accessed_at, accessed_key) for accessed_key, accessed_at in accessed.items()])
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, variants, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(variants, ensure_ascii=False), expires_at, time.time())
+        )
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self._db.commit()
+
+    def delete(self, key: str):
+        self._accessed.pop(key, None)
+        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._db.commit()
+
+
+class ResponseCache:
+    """Кэш с TTL, хранящий до K вариантов ответа на один ключ"""
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, system_message: str, prompt: str, temperature: float) -> str:
+        """Ключ из модели, системного сообщения, запроса и округлённой температуры"""
+        raw = json.dumps([model, system_message, prompt, round(temperature, 1)], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, variants: int = 1):
+        """Случайный вариант ответа, если их накоплено не меньше variants, иначе None"""
+        entry = self.backend.load(key)
+        if entry is not None:
+            expires_at, cached = entry
+            if expires_at < time.time():
+                self.backend.delete(key)
+            elif len(cached) >= variants:
+                self.hits += 1
+                return random.choice(cached)
+        self.misses += 1
+        return None
+
+    def put(self, key: str, text: str, variants: int = 1):
+        """Добавление варианта ответа; хранится не больше variants последних"""
+        entry = self.backend.load(key)
+        cached = entry[1] if entry is not None and entry[0] >= time.time() else []
+        if text not in cached:
+            cached.append(text)
+        self.backend.store(key, time.time() + self.ttl, cached[-variants:])
+
+
+def create_response_cache() -> ResponseCache:
+    """Создание кэша с бэкендом из конфигурации"""
+    if RESPONSE_CACHE_BACKEND == "sqlite":
+        backend = SQLiteBackend(RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_ENTRIES)
+    else:
+        backend = MemoryBackend(RESPONSE_CACHE_MAX_ENTRIES)
+    return ResponseCache(backend, RESPONSE_CACHE_TTL)
+
+
+response_cache = create_response_cache()
+
+
+@registry.collector
+def response_cache_metrics() -> list:
+    return hit_ratio_families("bot_response_cache", "Кэш ответов",
+                              {(): (response_cache.hits, response_cache.misses)})
@@ -0,0 +1,310 @@
+"""Семантический кэш: близкие по смыслу вопросы получают сохранённый ответ без запроса к модели
+
+Векторы строятся локально хэшированием основ слов, их пар и символьных триграмм. Поиск точный
+(перебор) или приближённый (LSH по случайным гиперплоскостям) для больших хранилищ.
+NumPy необязателен: без него используется точный поиск по разреженным векторам.
+
+Близость векторов только отбирает кандидата. Ответ выдаётся, если у вопросов
+совпадают значимые слова (с точностью до окончаний, служебных слов и регистра)
+и их порядок: отрицание, другое имя или число, «по возрастанию» вместо «по убыванию»
+дают промах даже при высокой близости. Кэш выключен по умолчанию (SEMANTIC_CACHE_ENABLED).
+"""
+import hashlib
+import json
+import logging
+import math
+import re
+import time
+import zlib
+from collections import OrderedDict
+from config import (SEMANTIC_CACHE_ENABLED, SEMANTIC_THRESHOLD, SEMANTIC_DIM, SEMANTIC_INDEX, SEMANTIC_EXACT_LIMIT,
+                    SEMANTIC_MAX_ENTRIES, SEMANTIC_TTL, SEMANTIC_MIN_WORDS, SEMANTIC_AUDIT_PATH)
+from services.metrics import registry, hit_ratio_families
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+WORD_RE = re.compile(r"\w+")
+# Длина основы слова: «русского» и «русский» совпадают, «ascending» и «descending» - нет
+STEM_LENGTH = 5
+# Служебные слова, не меняющие смысла вопроса; отрицания сюда намеренно не входят
+STOP_WORDS = frozenset((
+    "а", "в", "во", "же", "и", "из", "к", "ко", "ли", "на", "ну", "о", "об", "от", "по", "с", "со", "у",
+    "пожалуйста", "подскажи", "подскажите", "скажи", "скажите",
+    "a", "an", "the", "please",
+))
+
+# Похожие, но не прошедшие порог вопросы тоже пишутся в аудит - по ним подбирается порог
+NEAR_MISS_MARGIN = 0.05
+LSH_TABLES = 4
+LSH_BITS = 12
+LSH_SEED = 20240521
+
+
+def _words(text: str) -> list:
+    return WORD_RE.findall(text.lower().replace('ё', 'е'))
+
+
+def _terms(text: str) -> list:
+    """Основы значимых слов в исходном порядке"""
+    return [word[:STEM_LENGTH] for word in _words(text) if word not in STOP_WORDS]
+
+
+def _features(text: str):
+    # Признаки строятся по тем же основам, что сверяет _same_facts: допустимые различия не снижают близость
+    words = _terms(text)
+    for word in words:
+        yield "w:" + word, 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            yield "c:" + padded[i:i + 3], 0.5
+    # Пары соседних слов различают «с английского на русский» и «с русского на английский»
+    for first, second in zip(words, words[1:]):
+        yield f"b:{first} {second}", 1.0
+
+
+def _digest(text: str) -> str:
+    """Короткий отпечаток текста для журнала вместо самого текста"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+
+
+def _same_facts(question: str, cached_question: str) -> bool:
+    """Защита от ложных совпадений: те же значимые слова, числа, имена и отрицания в том же порядке"""
+    return _terms(question) == _terms(cached_question)
+
+
+def embed(text: str, dim: int = SEMANTIC_DIM) -> dict:
+    """Нормированный разреженный вектор {индекс: вес} хэшированных признаков текста"""
+    vector = {}
+    for feature, weight in _features(text):
+        digest = zlib.crc32(feature.encode('utf-8'))
+        index = digest % dim
+        sign = 1.0 if digest & 0x80000000 else -1.0
+        vector[index] = vector.get(index, 0.0) + sign * weight
+
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    return {index: value / norm for index, value in vector.items() if value} if norm else {}
+
+
+def _sparse_dot(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+class VectorIndex:
+    """Индекс векторов одного пространства имён с поиском ближайшего по косинусной близости"""
+
+    def __init__(self, dim: int, mode: str, exact_limit: int):
+        self.dim = dim
+        self.mode = mode
+        self.exact_limit = exact_limit
+        self._vectors = {}
+        if np is not None:
+            self._matrix = np.zeros((64, dim), dtype=np.float32)
+            self._rows = {}
+            self._row_ids = [None] * 64
+            self._free = list(range(63, -1, -1))
+            self._planes = np.random.default_rng(LSH_SEED).standard_normal((LSH_TABLES, LSH_BITS, dim)).astype(np.float32)
+            self._buckets = [{} for _ in range(LSH_TABLES)]
+            self._signatures = {}
+
+    def __len__(self) -> int:
+        return len(self._rows) if np is not None else len(self._vectors)
+
+    def add(self, entry_id: int, vector: dict):
+        if np is None:
+            self._vectors[entry_id] = vector
+            return
+
+        if not self._free:
+            size = len(self._row_ids)
+            self._matrix = np.vstack([self._matrix, np.zeros((size, self.dim), dtype=np.float32)])
+            self._row_ids.extend([None] * size)
+            self._free = list(range(2 * size - 1, size - 1, -1))
+        row = self._free.pop()
+        dense = self._dense(vector)
+        self._matrix[row] = dense
+        self._rows[entry_id] = row
+        self._row_ids[row] = entry_id
+
+        signatures = self._signature(dense)
+        self._signatures[entry_id] = signatures
+        for table, signature in zip(self._buckets, signatures):
+            table.setdefault(signature, set()).add(entry_id)
+
+    def remove(self, entry_id: int):
+        if np is None:
+            self._vectors.pop(entry_id, None)
+            return
+
+        row = self._rows.pop(entry_id, None)
+        if row is None:
+            return
+        self._matrix[row] = 0
+        self._row_ids[row] = None
+        self._free.append(row)
+        for table, signature in zip(self._buckets, self._signatures.pop(entry_id)):
+            bucket = table[signature]
+            bucket.discard(entry_id)
+            if not bucket:
+                del table[signature]
+
+    def search(self, vector: dict):
+        """(id, близость) ближайшего вектора или (None, 0.0) для пустого индекса"""
+        if not vector or not len(self):
+            return None, 0.0
+
+        if np is None:
+            scores = ((entry_id, _sparse_dot(vector, stored)) for entry_id, stored in self._vectors.items())
+            return max(scores, key=lambda item: item[1])
+
+        dense = self._dense(vector)
+        if self.mode == "approximate" or (self.mode == "auto" and len(self) > self.exact_limit):
+            candidates = set()
+            for table, signature in zip(self._buckets, self._signature(dense)):
+                candidates |= table.get(signature, set())
+            if not candidates:
+                return None, 0.0
+            ids = list(candidates)
+            scores = self._matrix[[self._rows[entry_id] for entry_id in ids]] @ dense
+            best = int(np.argmax(scores))
+            return ids[best], float(scores[best])
+
+        # Свободные строки нулевые и дают близость 0, поэтому не мешают поиску максимума
+        scores = self._matrix @ dense
+        row = int(np.argmax(scores))
+        return self._row_ids[row], float(scores[row])
+
+    def _dense(self, vector: dict):
+        dense = np.zeros(self.dim, dtype=np.float32)
+        dense[list(vector)] = list(vector.values())
+        return dense
+
+    def _signature(self, dense) -> list:
+        bits = (self._planes @ dense) > 0
+        return [int.from_bytes(np.packbits(table_bits).tobytes(), "big") for table_bits in bits]
+
+
+class SemanticCache:
+    """Ответы на вопросы по пространствам имён (режимам) с порогом близости, TTL и LRU-вытеснением"""
+
+    def __init__(self, threshold: float, max_entries: int, ttl: float, min_words: int,
+                 index_mode: str, exact_limit: int, audit_path: str = ""):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_words = min_words
+        self.index_mode = index_mode
+        self.exact_limit = exact_limit
+        self.audit_path = audit_path
+        self._indexes = {}
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self.lookups = 0
+        self.hits = 0
+        self.near_misses = 0
+
+    def lookup(self, namespace: str, question: str):
+        """Сохранённый ответ на близкий вопрос или None"""
+        if not self._eligible(question):
+            return None
+        self.lookups += 1
+        index = self._indexes.get(namespace)
+        if index is None:
+            return None
+
+        entry_id, score = index.search(embed(question))
+        if entry_id is None:
+            return None
+        _, cached_question, answer, created = self._entries[entry_id]
+        if time.time() - created > self.ttl:
+            self._remove(entry_id)
+            return None
+
+        # Близкие векторы бывают у вопросов с противоположным смыслом - решают значимые слова
+        if score >= self.threshold and _same_facts(question, cached_question):
+            self.hits += 1
+            self._entries.move_to_end(entry_id)
+            self._audit("hit", namespace, question, cached_question, score)
+            return answer
+        if score >= self.threshold - NEAR_MISS_MARGIN:
+            self.near_misses += 1
+            self._audit("near_miss", namespace, question, cached_question, score)
+        return None
+
+    def add(self, namespace: str, question: str, answer: str):
+        """Сохранение ответа; повторы уже сохранённых вопросов не добавляются"""
+        if not self._eligible(question) or not answer:
+            return
+        index = self._indexes.get(namespace)
+        if index is None:
+            index = self._indexes[namespace] = VectorIndex(SEMANTIC_DIM, self.index_mode, self.exact_limit)
+
+        vector = embed(question)
+        entry_id, score = index.search(vector)
+        if entry_id is not None and score >= 0.99 and _same_facts(question, self._entries[entry_id][1]):
+            return
+
+        entry_id = self._next_id
+        self._next_id += 1
+        index.add(entry_id, vector)
+        self._entries[entry_id] = (namespace, question, answer, time.time())
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "near_misses": self.near_misses,
+            "numpy": np is not None
+        }
+
+    def _eligible(self, question: str) -> bool:
+        # Короткие реплики («а подробнее?») слишком зависят от контекста
+        return len(WORD_RE.findall(question)) >= self.min_words
+
+    def _remove(self, entry_id: int):
+        namespace = self._entries.pop(entry_id)[0]
+        self._indexes[namespace].remove(entry_id)
+
+    def _audit(self, kind: str, namespace: str, question: str, cached_question: str, score: float):
+        # Тексты вопросов пишутся только в явно заданный файл аудита, в журнал - лишь отпечатки
+        logger.debug(f"Семантический кэш {kind} ({namespace}, {score:.3f}): "
+                     f"{_digest(question)}/{len(question)} ~ {_digest(cached_question)}/{len(cached_question)}")
+        if not self.audit_path:
+            return
+        record = {"time": time.time(), "kind": kind, "namespace": namespace, "similarity": round(score, 4),
+                  "question": question, "cached_question": cached_question}
+        try:
+            with open(self.audit_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"Не удалось записать аудит семантического кэша: {e}")
+
+
+semantic_cache = SemanticCache(
+    threshold=SEMANTIC_THRESHOLD,
+    max_entries=SEMANTIC_MAX_ENTRIES,
+    ttl=SEMANTIC_TTL,
+    min_words=SEMANTIC_MIN_WORDS,
+    index_mode=SEMANTIC_INDEX,
+    exact_limit=SEMANTIC_EXACT_LIMIT,
+    audit_path=SEMANTIC_AUDIT_PATH
+) if SEMANTIC_CACHE_ENABLED else None
+
+
+@registry.collector
+def semantic_cache_metrics() -> list:
+    if semantic_cache is None:
+        return []
+    stats = semantic_cache.stats()
+    return hit_ratio_families("bot_semantic_cache", "Семантический кэш",
+                              {(): (stats["hits"], stats["lookups"] - stats["hits"])})
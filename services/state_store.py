@@ -0,0 +1,408 @@
+"""Хранилище состояния пользователей и диалогов (SQLite или Redis) для persistence бота"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from urllib.parse import urlparse
+from telegram.ext import BasePersistence, PersistenceInput
+from config import (STATE_BACKEND, STATE_DB_PATH, STATE_REDIS_URLS, STATE_REDIS_TIMEOUT, STATE_FLUSH_INTERVAL,
+                    STATE_HOT_LIMIT, STATE_HOT_TTL)
+
+logger = logging.getLogger(__name__)
+
+
+def encode_state(value) -> bytes:
+    """Запись состояния в JSON; кортежи и словари с нестроковыми ключами помечаются
+
+    Хранилище не исполняет код при чтении, в отличие от pickle: запись в Redis
+    не даёт выполнить код в боте. Объекты других типов дают TypeError.
+    """
+    return json.dumps(_tag(value), ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+
+def decode_state(stored: bytes):
+    """Обратное преобразование encode_state; ValueError, если запись не в JSON"""
+    return json.loads(stored, object_hook=_untag)
+
+
+def _tag(value):
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {key: _tag(item) for key, item in value.items()}
+        return {"__items__": [[_tag(key), _tag(item)] for key, item in value.items()]}
+    if isinstance(value, tuple):
+        return {"__tuple__": [_tag(item) for item in value]}
+    if isinstance(value, list):
+        return [_tag(item) for item in value]
+    return value
+
+
+def _untag(value: dict):
+    if len(value) == 1:
+        if "__items__" in value:
+            return {key: item for key, item in value["__items__"]}
+        if "__tuple__" in value:
+            return tuple(value["__tuple__"])
+    return value
+
+
+class SQLiteStateBackend:
+    """Пространства имён ключ-значение в одной таблице SQLite
+
+    Запросы выполняются в потоке (asyncio.to_thread), чтобы запись на диск не останавливала
+    цикл событий; соединение одно, поэтому запросы идут по очереди.
+    """
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._db.commit()
+
+    async def get(self, namespace: str, key: str):
+        row = await self._run(
+            "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key), fetch="one"
+        )
+        return row[0] if row else None
+
+    async def set_many(self, namespace: str, values: dict):
+        await self._run(
+            "INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+            [(namespace, key, value) for key, value in values.items()], many=True
+        )
+
+    async def delete(self, namespace: str, key: str):
+        await self._run("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    async def items(self, namespace: str) -> dict:
+        return dict(await self._run("SELECT key, value FROM state WHERE namespace = ?", (namespace,), fetch="all"))
+
+    async def close(self):
+        await asyncio.to_thread(self._db.close)
+
+    async def _run(self, sql: str, params, fetch: str = None, many: bool = False):
+        return await asyncio.to_thread(self._execute, sql, params, fetch, many)
+
+    def _execute(self, sql: str, params, fetch: str, many: bool):
+        with self._lock:
+            if many:
+                self._db.executemany(sql, params)
+            else:
+                cursor = self._db.execute(sql, params)
+                if fetch == "one":
+                    return cursor.fetchone()
+                if fetch == "all":
+                    return cursor.fetchall()
+            self._db.commit()
+
+
+class RedisStateBackend:
+    """Минимальный клиент протокола Redis (RESP): пространство имён - хеш-таблица"""
+
+    def __init__(self, url: str, prefix: str = "tgbot:", timeout: float = STATE_REDIS_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, namespace: str, key: str):
+        return await self._command("HGET", self.prefix + namespace, key)
+
+    async def set_many(self, namespace: str, values: dict):
+        if not values:
+            return
+        args = []
+        for key, value in values.items():
+            args.extend((key, value))
+        await self._command("HSET", self.prefix + namespace, *args)
+
+    async def delete(self, namespace: str, key: str):
+        await self._command("HDEL", self.prefix + namespace, key)
+
+    async def items(self, namespace: str) -> dict:
+        flat = await self._command("HGETALL", self.prefix + namespace) or []
+        return {flat[i].decode('utf-8'): flat[i + 1] for i in range(0, len(flat), 2)}
+
+    async def close(self):
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            writer.close()
+            await writer.wait_closed()
+
+    async def _command(self, *args):
+        """Отправка команды и чтение ответа по одному за раз; соединение открывается при первом обращении
+
+        Если ответ не дочитан (ошибка, timeout или отмена вызывающего), соединение
+        закрывается: иначе следующая команда прочитала бы чужой ответ.
+        """
+        async with self._lock:
+            try:
+                return await asyncio.wait_for(self._exchange(args), self.timeout)
+            except BaseException:
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+                raise
+
+    async def _exchange(self, args):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            if self.password:
+                await self._send("AUTH", self.password)
+            if self.db:
+                await self._send("SELECT", str(self.db))
+        return await self._send(*args)
+
+    async def _send(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._writer.write(b"".join(parts))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def _read_reply(self):
+        line = await self._reader.readuntil(b"\r\n")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RuntimeError(f"Ошибка Redis: {payload.decode()}")
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            if count < 0:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise RuntimeError(f"Неизвестный ответ Redis: {line!r}")
+
+
+class ShardedStateBackend:
+    """Распределение ключей по нескольким бэкендам по хешу ключа"""
+
+    def __init__(self, shards: list):
+        self.shards = shards
+
+    def _index(self, key: str) -> int:
+        return zlib.crc32(key.encode('utf-8')) % len(self.shards)
+
+    def _shard(self, key: str):
+        return self.shards[self._index(key)]
+
+    async def get(self, namespace: str, key: str):
+        return await self._shard(key).get(namespace, key)
+
+    async def set_many(self, namespace: str, values: dict):
+        parts = [{} for _ in self.shards]
+        for key, value in values.items():
+            parts[self._index(key)][key] = value
+        await asyncio.gather(*(shard.set_many(namespace, part) for shard, part in zip(self.shards, parts) if part))
+
+    async def delete(self, namespace: str, key: str):
+        await self._shard(key).delete(namespace, key)
+
+    async def items(self, namespace: str) -> dict:
+        result = {}
+        for part in await asyncio.gather(*(shard.items(namespace) for shard in self.shards)):
+            result.update(part)
+        return result
+
+    async def close(self):
+        await asyncio.gather(*(shard.close() for shard in self.shards))
+
+
+class StatePersistence(BasePersistence):
+    """Persistence для Application: ленивое чтение, LRU горячих пользователей и пакетная запись
+
+    Данные пользователей и чатов не загружаются целиком при старте: они читаются
+    из хранилища перед первым обновлением от пользователя. Когда горячих записей
+    становится больше hot_limit, самая давняя сохраняется и освобождается из памяти.
+
+    Несколько процессов с общим Redis держат свои копии горячих записей. Копия,
+    к которой не обращались дольше hot_ttl, перечитывается из хранилища: к этому
+    времени её собственные изменения уже записаны (hot_ttl не меньше двух циклов
+    записи), а чужие - подхватываются. Одновременные изменения одного пользователя
+    в двух процессах не сливаются, побеждает последняя запись, поэтому обновления
+    пользователя лучше направлять в один процесс. bot_data читается один раз при старте.
+    """
+
+    def __init__(self, backend, hot_limit: int, update_interval: float, hot_ttl: float = STATE_HOT_TTL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.backend = backend
+        self.hot_limit = hot_limit
+        self.hot_ttl = max(hot_ttl, 2 * update_interval)
+        self._hot = {"user": OrderedDict(), "chat": OrderedDict()}
+        self._touched = {"user": {}, "chat": {}}
+        self._pending = {}
+        self._flush_task = None
+
+    async def get_user_data(self):
+        return {}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        stored = await self.backend.get("bot", "data")
+        return decode_state(stored) if stored is not None else {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str):
+        stored = await self.backend.items(f"conversation:{name}")
+        return {tuple(json.loads(key)): decode_state(value) for key, value in stored.items()}
+
+    async def update_conversation(self, name: str, key, new_state):
+        namespace = f"conversation:{name}"
+        if new_state is None:
+            self._pending.get(namespace, {}).pop(json.dumps(key), None)
+            await self.backend.delete(namespace, json.dumps(key))
+        else:
+            self._stage(namespace, json.dumps(key), new_state)
+
+    async def update_user_data(self, user_id: int, data: dict):
+        self._update_hot("user", user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        self._update_hot("chat", chat_id, data)
+
+    async def update_bot_data(self, data):
+        self._stage("bot", "data", data)
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_user_data(self, user_id: int):
+        await self._drop("user", user_id)
+
+    async def drop_chat_data(self, chat_id: int):
+        await self._drop("chat", chat_id)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        await self._touch("user", user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        await self._touch("chat", chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        for namespace, hot in self._hot.items():
+            for key, data in hot.items():
+                self._stage(namespace, str(key), data, schedule=False)
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._write_pending()
+        await self.backend.close()
+
+    def _update_hot(self, namespace: str, key: int, data: dict):
+        """Запись изменений; данные, выгруженные из памяти, уже сохранены при вытеснении"""
+        if key not in self._hot[namespace] and not data:
+            return
+        self._stage(namespace, str(key), data)
+
+    async def _touch(self, namespace: str, key: int, data: dict):
+        """Подгрузка данных при первом обращении, обновление простаивавшей копии и вытеснение давно неактивных"""
+        hot = self._hot[namespace]
+        touched = self._touched[namespace]
+        now = time.monotonic()
+        if key not in hot:
+            if not data:
+                await self._load(namespace, key, data)
+        elif now - touched.get(key, now) > self.hot_ttl and not self._writing(namespace, str(key)):
+            await self._load(namespace, key, data)
+        hot[key] = data
+        hot.move_to_end(key)
+        touched[key] = now
+
+        while len(hot) > self.hot_limit:
+            old_key, old_data = hot.popitem(last=False)
+            touched.pop(old_key, None)
+            await self.backend.set_many(namespace, {str(old_key): encode_state(old_data)})
+            self._pending.get(namespace, {}).pop(str(old_key), None)
+            old_data.clear()
+
+    async def _load(self, namespace: str, key: int, data: dict):
+        """Замена содержимого data записью из хранилища; словарь остаётся тем же объектом, что у Application"""
+        stored = await self.backend.get(namespace, str(key))
+        if stored is None:
+            return
+        try:
+            loaded = decode_state(stored)
+        except ValueError:
+            logger.warning(f"Запись {namespace}:{key} не в формате JSON и пропущена")
+            return
+        data.clear()
+        data.update(loaded)
+
+    def _writing(self, namespace: str, key: str) -> bool:
+        """Есть ли у записи изменения, ещё не дошедшие до хранилища"""
+        if key in self._pending.get(namespace, {}):
+            return True
+        return self._flush_task is not None and not self._flush_task.done()
+
+    async def _drop(self, namespace: str, key: int):
+        self._hot[namespace].pop(key, None)
+        self._touched[namespace].pop(key, None)
+        self._pending.get(namespace, {}).pop(str(key), None)
+        await self.backend.delete(namespace, str(key))
+
+    def _stage(self, namespace: str, key: str, value, schedule: bool = True):
+        """Постановка записи в очередь; все записи одного цикла уходят одной пачкой"""
+        self._pending.setdefault(namespace, {})[key] = encode_state(value)
+        if schedule and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self):
+        await asyncio.sleep(0)
+        pending, self._pending = self._pending, {}
+        for namespace, values in pending.items():
+            try:
+                await self.backend.set_many(namespace, values)
+            except Exception as e:
+                logger.error(f"Ошибка записи состояния {namespace}: {e}")
+                # Неудачная пачка повторится в следующем цикле, если её не перезапишут свежие данные
+                retry = self._pending.setdefault(namespace, {})
+                for key, value in values.items():
+                    retry.setdefault(key, value)
+
+
+def create_persistence():
+    """Persistence по настройке STATE_BACKEND или None, если состояние хранится только в памяти"""
+    if STATE_BACKEND == "sqlite":
+        backend = SQLiteStateBackend(STATE_DB_PATH)
+    elif STATE_BACKEND == "redis":
+        shards = [RedisStateBackend(url.strip()) for url in STATE_REDIS_URLS.split(",") if url.strip()]
+        backend = shards[0] if len(shards) == 1 else ShardedStateBackend(shards)
+    else:
+        return None
+
+    logger.info(f"Состояние хранится в {STATE_BACKEND}")
+    return StatePersistence(backend, STATE_HOT_LIMIT, STATE_FLUSH_INTERVAL)
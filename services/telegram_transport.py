@@ -0,0 +1,161 @@
+"""HTTP-транспорт к Bot API: отдельные пулы соединений для getUpdates и остальных запросов
+
+Размер пула, таймауты, keep-alive и версия HTTP задаются в config.py. Запрос ждёт
+свободное соединение на семафоре размером с пул, поэтому время ожидания видно
+в метрике bot_telegram_pool_wait_seconds, а не теряется внутри httpx.
+Большой пул делится на несколько клиентов httpx (TG_POOL_SHARD_SIZE соединений в каждом).
+HTTP/2 требует пакета h2 (pip install "httpx[http2]"); без него используется HTTP/1.1.
+
+Сравнение размеров пула на подмене Bot API (запросов, параллельно, задержка ответа в секундах):
+    python -m tests.benchmarks.telegram_transport 2000 200 0.05
+"""
+import asyncio
+import logging
+import time
+import httpx
+from telegram.error import TimedOut
+from telegram.request import BaseRequest, HTTPXRequest
+from config import (TG_POOL_SIZE, TG_POOL_SHARD_SIZE, TG_POOL_TIMEOUT, TG_CONNECT_TIMEOUT, TG_READ_TIMEOUT,
+                    TG_WRITE_TIMEOUT, TG_MEDIA_WRITE_TIMEOUT, TG_HTTP_VERSION, TG_KEEPALIVE_EXPIRY, TG_UPDATES_POOL_SIZE,
+                    TG_UPDATES_READ_TIMEOUT)
+from services.metrics import TELEGRAM_POOL_WAIT, TELEGRAM_POOL_IN_USE, TELEGRAM_POOL_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+# Пулы по имени - для /status
+pools = {}
+
+
+class PooledRequest(BaseRequest):
+    """Пул соединений Bot API из нескольких клиентов httpx по shard_size соединений
+
+    Пул httpcore при каждом запросе перебирает все свои соединения, и при сотнях
+    соединений это заметная нагрузка на процессор. Запрос уходит в наименее занятый
+    клиент, так что один большой пул ведёт себя как несколько маленьких.
+    """
+
+    def __init__(self, name: str, pool_size: int, shard_size: int, pool_timeout: float, keepalive_expiry: float,
+                 read_timeout: float, http_version: str = "1.1", **kwargs):
+        if http_version in ("2", "2.0") and h2 is None:
+            logger.warning(f"Пакет h2 не установлен, пул {name} работает по HTTP/1.1")
+            http_version = "1.1"
+        self.name = name
+        self.size = pool_size
+        self.http_version = http_version
+        self.wait_timeout = pool_timeout
+        self.requests = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self._read_timeout = read_timeout
+        self._slots = asyncio.Semaphore(pool_size)
+        self._shards = []
+        for offset in range(0, pool_size, shard_size):
+            connections = min(shard_size, pool_size - offset)
+            limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections,
+                                  keepalive_expiry=keepalive_expiry)
+            self._shards.append(HTTPXRequest(
+                connection_pool_size=connections, pool_timeout=pool_timeout, read_timeout=read_timeout,
+                http_version=http_version, httpx_kwargs={"limits": limits}, **kwargs
+            ))
+        self._load = [0] * len(self._shards)
+        pools[name] = self
+
+    @property
+    def read_timeout(self):
+        return self._read_timeout
+
+    async def initialize(self):
+        await asyncio.gather(*(shard.initialize() for shard in self._shards))
+
+    async def shutdown(self):
+        await asyncio.gather(*(shard.shutdown() for shard in self._shards))
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        # Явный None - ждать без ограничения; значение по умолчанию PTB передаёт объектом DefaultValue
+        if pool_timeout is None or isinstance(pool_timeout, (int, float)):
+            timeout = pool_timeout
+        else:
+            timeout = self.wait_timeout
+        waited = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            TELEGRAM_POOL_TIMEOUTS.inc(self.name)
+            raise TimedOut(f"Pool timeout: все {self.size} соединений пула {self.name} заняты, запрос не отправлен")
+        TELEGRAM_POOL_WAIT.observe(time.perf_counter() - waited, self.name)
+
+        # Семафор не пускает больше size запросов, поэтому в наименее занятом клиенте всегда есть свободное соединение
+        index = min(range(len(self._shards)), key=self._load.__getitem__)
+        self._load[index] += 1
+        self.requests += 1
+        self.in_use += 1
+        TELEGRAM_POOL_IN_USE.inc(self.name)
+        try:
+            return await self._shards[index].do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout, write_timeout=write_timeout,
+                connect_timeout=connect_timeout, pool_timeout=pool_timeout
+            )
+        finally:
+            self._load[index] -= 1
+            self.in_use -= 1
+            TELEGRAM_POOL_IN_USE.dec(self.name)
+            self._slots.release()
+
+    def stats(self) -> dict:
+        quantiles = TELEGRAM_POOL_WAIT.quantiles(self.name)
+        return {
+            "size": self.size,
+            "shards": len(self._shards),
+            "http_version": self.http_version,
+            "in_use": self.in_use,
+            "requests": self.requests,
+            "timeouts": self.timeouts,
+            "wait_p99_ms": round(quantiles[0.99] * 1000, 3) if quantiles else None
+        }
+
+
+def create_request(name: str = "bot", pool_size: int = TG_POOL_SIZE, shard_size: int = TG_POOL_SHARD_SIZE,
+                   http_version: str = TG_HTTP_VERSION) -> PooledRequest:
+    """Пул для всех методов Bot API, кроме getUpdates"""
+    return PooledRequest(
+        name,
+        pool_size=pool_size,
+        shard_size=shard_size,
+        pool_timeout=TG_POOL_TIMEOUT,
+        keepalive_expiry=TG_KEEPALIVE_EXPIRY,
+        connect_timeout=TG_CONNECT_TIMEOUT,
+        read_timeout=TG_READ_TIMEOUT,
+        write_timeout=TG_WRITE_TIMEOUT,
+        media_write_timeout=TG_MEDIA_WRITE_TIMEOUT,
+        http_version=http_version
+    )
+
+
+def create_updates_request() -> PooledRequest:
+    """Пул для long polling: getUpdates не ждёт за исходящими сообщениями и не занимает их соединения
+
+    К read_timeout PTB сам добавляет timeout long polling.
+    """
+    return PooledRequest(
+        "get_updates",
+        pool_size=TG_UPDATES_POOL_SIZE,
+        shard_size=TG_UPDATES_POOL_SIZE,
+        pool_timeout=TG_POOL_TIMEOUT,
+        keepalive_expiry=TG_KEEPALIVE_EXPIRY,
+        connect_timeout=TG_CONNECT_TIMEOUT,
+        read_timeout=TG_UPDATES_READ_TIMEOUT,
+        write_timeout=TG_WRITE_TIMEOUT,
+        http_version=TG_HTTP_VERSION
+    )
+
+
+def pool_stats() -> dict:
+    return {name: pool.stats() for name, pool in pools.items()}
+
@@ -0,0 +1,268 @@
+"""Трассировка обработки обновлений: спаны update -> обработчик -> модель -> запросы к Bot API
+
+Спаны связываются через contextvars и выгружаются пачками в JSONL-файл
+или в OTLP-коллектор (OpenTelemetry Collector, Jaeger, Tempo) по HTTP/JSON.
+
+Разбор файла трасс - длительность и начало каждого вызова относительно начала обновления:
+    python -m services.tracing data/traces.jsonl
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import random
+import secrets
+import sys
+import time
+from config import (TRACE_EXPORTER, TRACE_PATH, TRACE_COLLECTOR_URL, TRACE_SAMPLE_RATE, TRACE_FLUSH_INTERVAL,
+                    TRACE_SERVICE_NAME)
+
+logger = logging.getLogger(__name__)
+
+MAX_BUFFERED_SPANS = 10000
+
+
+class Span:
+    """Один замер: имя, время начала и конца, атрибуты и родитель"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error", "sampled")
+
+    def __init__(self, name: str, parent=None, sampled: bool = True, attributes: dict = None):
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.sampled = parent.sampled if parent else sampled
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class FileExporter:
+    """Спаны построчно в JSONL-файл"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def export(self, spans: list):
+        with open(self.path, 'a', encoding='utf-8') as trace_file:
+            for span in spans:
+                trace_file.write(json.dumps(span.to_dict(), ensure_ascii=False) + "\n")
+
+    async def close(self):
+        pass
+
+
+class OTLPExporter:
+    """Отправка спанов в коллектор по OTLP/HTTP в JSON-кодировке"""
+
+    def __init__(self, url: str, service_name: str):
+        import httpx
+        self.url = url
+        self.service_name = service_name
+        self._client = httpx.AsyncClient(timeout=10)
+
+    async def export(self, spans: list):
+        body = {"resourceSpans": [{
+            "resource": {"attributes": self._attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "bot"}, "spans": [self._span(span) for span in spans]}]
+        }]}
+        response = await self._client.post(self.url, json=body)
+        response.raise_for_status()
+
+    async def close(self):
+        await self._client.aclose()
+
+    def _span(self, span: Span) -> dict:
+        data = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": self._attributes(span.attributes),
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+        }
+        if span.parent_id:
+            data["parentSpanId"] = span.parent_id
+        return data
+
+    @staticmethod
+    def _attributes(attributes: dict) -> list:
+        result = []
+        for key, value in attributes.items():
+            if isinstance(value, bool):
+                encoded = {"boolValue": value}
+            elif isinstance(value, int):
+                encoded = {"intValue": str(value)}
+            elif isinstance(value, float):
+                encoded = {"doubleValue": value}
+            else:
+                encoded = {"stringValue": str(value)}
+            result.append({"key": key, "value": encoded})
+        return result
+
+
+class Tracer:
+    """Создание спанов в текущем контексте и фоновая выгрузка завершённых"""
+
+    def __init__(self, exporter, sample_rate: float, flush_interval: float):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.current = contextvars.ContextVar("current_span", default=None)
+        self.dropped = 0
+        self._buffer = []
+        self._task = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    @property
+    def active(self) -> bool:
+        """Идёт ли трассировка в текущем контексте (например, обработка обновления)"""
+        return self.current.get() is not None
+
+    def start_span(self, name: str, **attributes):
+        """Спан без активации: для асинхронных генераторов, где контекст общий с потребителем"""
+        if not self.enabled:
+            return None
+        parent = self.current.get()
+        return Span(name, parent, sampled=random.random() < self.sample_rate, attributes=attributes)
+
+    def finish(self, span, error: BaseException = None):
+        if span is None:
+            return
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        if not span.sampled:
+            return
+        if len(self._buffer) >= MAX_BUFFERED_SPANS:
+            self.dropped += 1
+            return
+        self._buffer.append(span)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes):
+        """Спан вокруг блока кода; вложенные спаны и вызовы из него становятся дочерними"""
+        span = self.start_span(name, **attributes)
+        if span is None:
+            yield None
+            return
+        token = self.current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.finish(span, e)
+            raise
+        else:
+            self.finish(span)
+        finally:
+            self.current.reset(token)
+
+    def annotate(self, **attributes):
+        """Атрибуты для текущего спана, если он есть"""
+        span = self.current.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def start(self):
+        if self.enabled:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.enabled:
+            await self.flush()
+            await self.exporter.close()
+
+    async def flush(self):
+        spans, self._buffer = self._buffer, []
+        if not spans:
+            return
+        try:
+            await self.exporter.export(spans)
+        except Exception as e:
+            self.dropped += len(spans)
+            logger.error(f"Не удалось выгрузить {len(spans)} спанов: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+def create_tracer() -> Tracer:
+    """Трассировщик с экспортёром из TRACE_EXPORTER; без экспортёра спаны не создаются"""
+    if TRACE_EXPORTER == "file":
+        exporter = FileExporter(TRACE_PATH)
+    elif TRACE_EXPORTER == "otlp":
+        exporter = OTLPExporter(TRACE_COLLECTOR_URL, TRACE_SERVICE_NAME)
+    else:
+        exporter = None
+    return Tracer(exporter, TRACE_SAMPLE_RATE, TRACE_FLUSH_INTERVAL)
+
+
+tracer = create_tracer()
+
+
+def print_traces(path: str, limit: int = 20):
+    """Последние трассы из файла в виде дерева: смещение от начала, длительность, имя и атрибуты"""
+    traces = {}
+    with open(path, encoding='utf-8') as trace_file:
+        for line in trace_file:
+            if line.strip():
+                span = json.loads(line)
+                traces.setdefault(span["trace_id"], []).append(span)
+
+    for spans in list(traces.values())[-limit:]:
+        spans.sort(key=lambda span: span["start_ns"])
+        children = {}
+        for span in spans:
+            children.setdefault(span["parent_id"], []).append(span)
+        known = {span["span_id"] for span in spans}
+        roots = [span for span in spans if span["parent_id"] not in known]
+        origin = spans[0]["start_ns"]
+
+        def show(span, depth):
+            offset = (span["start_ns"] - origin) / 1e6
+            error = f"  ! {span['error']}" if span["error"] else ""
+            print(f"{offset:9.1f} {span['duration_ms']:9.1f}  {'  ' * depth}{span['name']} {span['attributes']}{error}")
+            for child in children.get(span["span_id"], []):
+                show(child, depth + 1)
+
+        print(f"{'начало мс':>9} {'длит. мс':>9}  трасса {spans[0]['trace_id']}")
+        for root in roots:
+            show(root, 0)
+        print()
+
+
+if __name__ == "__main__":
+    print_traces(sys.argv[1] if len(sys.argv) > 1 else TRACE_PATH)
@@ -0,0 +1,124 @@
+"""Параллельная обработка обновлений с сохранением порядка для каждого пользователя в чате"""
+import asyncio
+import contextlib
+import inspect
+import logging
+import time
+from collections import deque
+from telegram.ext import BaseUpdateProcessor
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+WAIT_SAMPLES = 1000
+UPDATE_KINDS = ("message", "edited_message", "callback_query", "poll_answer", "inline_query", "my_chat_member")
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Обновления разных собеседников идут параллельно (до max_concurrent_updates),
+    обновления одного пользователя в одном чате - строго по очереди
+
+    Ключ очереди (чат, пользователь) совпадает с ключом состояния ConversationHandler:
+    состояния диалога не гоняются, а участники группы не ждут чужого ответа модели.
+    Общий лимит - семафор базового класса; его слот берётся только после очереди ключа.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}
+        self._waiters = {}
+        self._wait_samples = deque(maxlen=WAIT_SAMPLES)
+        self.waiting = 0
+        self.in_flight = 0
+        self.processed = 0
+
+    async def process_update(self, update, coroutine):
+        # Сначала очередь ключа, затем слот базового класса: ожидающие обновления одного
+        # пользователя не занимают слоты, и остальные чаты не стоят за ними
+        key = self._order_key(update)
+        lock = self._acquire_lock(key) if key is not None else contextlib.nullcontext()
+        arrived = time.perf_counter()
+        self.waiting += 1
+        run = None
+        try:
+            with tracer.span("update", **self._trace_attributes(update)) as span:
+                async with lock:
+                    run = self._run(coroutine, arrived, span)
+                    await super().process_update(update, run)
+        finally:
+            if run is None or inspect.getcoroutinestate(run) == inspect.CORO_CREATED:
+                # Отмена до получения слота: обработка не начиналась
+                self.waiting -= 1
+                if inspect.iscoroutine(coroutine):
+                    coroutine.close()
+            if run is not None:
+                run.close()
+            if key is not None:
+                self._release_lock(key)
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def _run(self, coroutine, arrived: float, span):
+        """Обработка после получения слота; время ожидания включает очередь ключа и семафор"""
+        self.waiting -= 1
+        wait = time.perf_counter() - arrived
+        self._wait_samples.append(wait)
+        if span is not None:
+            span.set(queue_wait_ms=round(wait * 1000, 3))
+        self.in_flight += 1
+        try:
+            await coroutine
+        finally:
+            self.in_flight -= 1
+            self.processed += 1
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stats(self) -> dict:
+        """Глубина очереди, число выполняющихся обновлений и время ожидания"""
+        samples = sorted(self._wait_samples)
+        return {
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "active_keys": len(self._locks),
+            "wait_p50_ms": round(samples[len(samples) // 2] * 1000, 1) if samples else 0.0,
+            "wait_p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 1) if samples else 0.0,
+        }
+
+    @staticmethod
+    def _trace_attributes(update) -> dict:
+        attributes = {"update_id": getattr(update, "update_id", None)}
+        attributes["kind"] = next((kind for kind in UPDATE_KINDS if getattr(update, kind, None) is not None), "other")
+        chat = getattr(update, "effective_chat", None)
+        user = getattr(update, "effective_user", None)
+        if chat is not None:
+            attributes["chat_id"] = chat.id
+        if user is not None:
+            attributes["user_id"] = user.id
+        return attributes
+
+    @staticmethod
+    def _order_key(update):
+        """(чат, пользователь), как у ConversationHandler с per_chat и per_user; None - без очереди"""
+        chat = getattr(update, "effective_chat", None)
+        user = getattr(update, "effective_user", None)
+        if chat is None and user is None:
+            return None
+        return (chat.id if chat is not None else None, user.id if user is not None else None)
+
+    def _acquire_lock(self, key) -> asyncio.Lock:
+        """Замок ключа; удаляется, когда у ключа не остаётся ожидающих обновлений"""
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        return self._locks.setdefault(key, asyncio.Lock())
+
+    def _release_lock(self, key):
+        self._waiters[key] -= 1
+        if not self._waiters[key]:
+            del self._waiters[key]
+            del self._locks[key]
@@ -0,0 +1,130 @@
+"""Режим вебхука: встроенный HTTP-сервер принимает обновления Telegram и кладёт их в ограниченную очередь"""
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+import signal
+from telegram import Update
+from telegram.ext import Application
+from config import (WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+                    WEBHOOK_SET, WEBHOOK_MAX_CONNECTIONS)
+from services.http_server import HttpServer
+from services.metrics import metrics_server
+from services.prompts import prefix_cache_stats
+from services.providers import router
+from services.rate_limit import openai_budget
+from services.openai_client import single_flight
+from services.semantic_cache import semantic_cache
+from services.quiz_game import quiz_games
+from services.broadcast import broadcaster
+from services.telegram_transport import pool_stats
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookReceiver:
+    """Проверка секретного токена и постановка обновлений в очередь приложения"""
+
+    def __init__(self, application: Application, secret_token: str):
+        self.application = application
+        self.secret_token = secret_token
+        self.accepted = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    async def handle(self, request):
+        received = request.headers.get('x-telegram-bot-api-secret-token', '')
+        # Байты, а не str: compare_digest не принимает строки с не-ASCII символами
+        if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+            self.rejected += 1
+            return 403, b"forbidden", "text/plain"
+
+        try:
+            update = Update.de_json(json.loads(request.body), self.application.bot)
+        except (ValueError, KeyError, TypeError):
+            self.rejected += 1
+            return 400, b"bad update", "text/plain"
+
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram повторит доставку позже - это естественное ограничение нагрузки
+            self.dropped += 1
+            return 503, b"queue is full", "text/plain"
+
+        self.accepted += 1
+        return 200, b"ok", "text/plain"
+
+    async def health(self, request):
+        """Проверка живости для балансировщика; подробности - в status() на локальном сервере метрик"""
+        return 200, b'{"status": "ok"}', "application/json"
+
+    async def status(self, request):
+        status = {
+            "queue": self.application.update_queue.qsize(),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "dropped": self.dropped
+        }
+        processor_stats = getattr(self.application.update_processor, "stats", None)
+        if processor_stats:
+            status["processor"] = processor_stats()
+        status["prefix_cache"] = prefix_cache_stats.stats()
+        status["models"] = router.stats()
+        status["admission"] = openai_budget.stats()
+        status["single_flight"] = single_flight.stats()
+        status["group_quiz"] = quiz_games.stats()
+        status["broadcast"] = broadcaster.stats()
+        status["telegram_pools"] = pool_stats()
+        if semantic_cache is not None:
+            status["semantic_cache"] = semantic_cache.stats()
+        body = json.dumps(status)
+        return 200, body.encode(), "application/json"
+
+
+def create_server(receiver: WebhookReceiver) -> HttpServer:
+    """Публичный сервер вебхука; подробный /status - только на локальном сервере метрик"""
+    server = HttpServer()
+    server.route("POST", WEBHOOK_PATH, receiver.handle)
+    server.route("GET", "/health", receiver.health)
+    metrics_server.route("GET", "/status", receiver.status)
+    return server
+
+
+async def run_webhook(application: Application):
+    """Запуск бота в режиме вебхука до получения SIGINT/SIGTERM"""
+    secret_token = WEBHOOK_SECRET
+    if not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK_SECRET не задан - сгенерирован временный токен, он подойдёт только одному процессу")
+
+    receiver = WebhookReceiver(application, secret_token)
+    server = create_server(receiver)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        port = await server.start(WEBHOOK_LISTEN, WEBHOOK_PORT)
+        logger.info(f"Вебхук слушает {WEBHOOK_LISTEN}:{port}{WEBHOOK_PATH}")
+
+        if WEBHOOK_SET:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL,
+                secret_token=secret_token,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES
+            )
+
+        await stop_event.wait()
+
+        await server.stop()
+        await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,40 @@
+"""Оценка скорости рассылки без Telegram: подписчики в памяти, подмена Bot API
+
+Запуск:
+    python -m tests.benchmarks.broadcast 20000
+"""
+import asyncio
+import logging
+import sys
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_BATCH, BROADCAST_RETRIES
+from services.broadcast import Broadcaster, SubscriptionStore
+from services.rate_limit import TelegramRateLimiter
+from tests.fakes.fake_telegram import FakeBotAPIServer
+
+
+async def simulate(subscribers: int):
+    """Рассылка через подмену Bot API: каждый 50-й чат заблокировал бота"""
+    server = FakeBotAPIServer(blocked_chats=set(range(1, subscribers + 1, 50)))
+    port = await server.start()
+    store = SubscriptionStore(":memory:")
+    for chat_id in range(1, subscribers + 1):
+        store.subscribe(chat_id)
+    engine = Broadcaster(store, BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_BATCH, BROADCAST_RETRIES)
+    engine.bot = ExtBot("0:fake", base_url=f"http://127.0.0.1:{port}/bot",
+                        request=HTTPXRequest(connection_pool_size=BROADCAST_CONCURRENCY),
+                        rate_limiter=TelegramRateLimiter())
+    try:
+        async with engine.bot:
+            text = "📅 <b>Факт дня</b>\n\nТестовый факт."
+            report = await engine.deliver(store.create_broadcast("simulation", text))
+    finally:
+        await server.stop()
+    print(report)
+    print(f"Оценка для {subscribers} подписчиков при {BROADCAST_RATE} сообщ./с: {subscribers / BROADCAST_RATE:.0f} с")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(simulate(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
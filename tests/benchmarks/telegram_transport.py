@@ -0,0 +1,68 @@
+"""Сравнение размеров пула соединений Bot API на подмене (запросов, параллельно, задержка ответа в секундах)
+
+Запуск:
+    python -m tests.benchmarks.telegram_transport 2000 200 0.05
+"""
+import asyncio
+import logging
+import sys
+import time
+from telegram import Bot
+from telegram.error import TimedOut
+from config import TG_POOL_SIZE, TG_POOL_SHARD_SIZE
+from services.metrics import TELEGRAM_POOL_WAIT
+from services.telegram_transport import create_request
+from tests.fakes.fake_telegram import FakeBotAPIServer
+
+
+async def benchmark(requests: int, concurrency: int, latency: float):
+    """sendMessage через подмену Bot API при разных размерах пула (подмена понимает только HTTP/1.1)
+
+    Пул TG_POOL_SIZE прогоняется дважды: одним клиентом httpx и клиентами по TG_POOL_SHARD_SIZE.
+    """
+    server = FakeBotAPIServer(latency=latency)
+    port = await server.start()
+    print(f"{requests} запросов, {concurrency} параллельно, задержка Bot API {latency * 1000:.0f} мс")
+    print(f"{'пул':>6} {'клиентов':>9} {'запр./с':>9} {'p50 мс':>8} {'p99 мс':>8} {'ожид. p99 мс':>13} "
+          f"{'таймауты':>9}")
+    variants = [(1, 1), (8, 8), (TG_POOL_SIZE, TG_POOL_SIZE), (TG_POOL_SIZE, TG_POOL_SHARD_SIZE)]
+    try:
+        for size, shard_size in variants:
+            request = create_request(f"benchmark_{size}_{shard_size}", size, shard_size, http_version="1.1")
+            request.wait_timeout = None
+            bot = Bot("0:fake", base_url=f"http://127.0.0.1:{port}/bot", request=request)
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies = []
+            failed = 0
+
+            async def send(number):
+                nonlocal failed
+                async with semaphore:
+                    started = time.perf_counter()
+                    try:
+                        await bot.send_message(chat_id=1000 + number % 100, text=f"Сообщение {number}")
+                    except TimedOut:
+                        failed += 1
+                    latencies.append(time.perf_counter() - started)
+
+            async with bot:
+                started = time.perf_counter()
+                await asyncio.gather(*(send(number) for number in range(requests)))
+                elapsed = time.perf_counter() - started
+
+            latencies.sort()
+            wait = TELEGRAM_POOL_WAIT.quantiles(request.name).get(0.99, 0.0)
+            print(f"{size:>6} {request.stats()['shards']:>9} {requests / elapsed:>9.1f} {latencies[len(latencies) // 2] * 1000:>8.1f} "
+                  f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:>8.1f} {wait * 1000:>13.1f} {failed:>9}")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    arguments = sys.argv[1:]
+    asyncio.run(benchmark(
+        int(arguments[0]) if len(arguments) > 0 else 1000,
+        int(arguments[1]) if len(arguments) > 1 else 100,
+        float(arguments[2]) if len(arguments) > 2 else 0.05
+    ))
@@ -0,0 +1,7 @@
+"""Общие настройки тестов: config.py требует токены, тестам подходят любые"""
+import os
+import sys
+
+os.environ.setdefault("TG_BOT_TOKEN", "0:test")
+os.environ.setdefault("CHATGPT_TOKEN", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
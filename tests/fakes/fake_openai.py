@@ -0,0 +1,92 @@
+"""Локальная подмена OpenAI Chat Completions API с настраиваемой задержкой и долей ошибок
+
+Запуск:
+    python -m tests.fakes.fake_openai 8082 --latency 0.5 --error-rate 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8082/v1 python main.py
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from services.http_server import HttpServer
+from services.quiz_question import QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+
+class FakeOpenAIServer:
+    """Отвечает на /v1/chat/completions, в том числе в потоковом режиме (SSE)"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 500):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self._server = HttpServer()
+        self._server.route("POST", "/v1/chat/completions", self._completions)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        return await self._server.start(host, port)
+
+    async def stop(self):
+        await self._server.stop()
+
+    async def _completions(self, request):
+        self.requests += 1
+        body = json.loads(request.body)
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+        if random.random() < self.error_rate:
+            error = {"error": {"message": "fake upstream error", "type": "server_error", "code": None}}
+            return self.error_status, json.dumps(error).encode(), "application/json"
+
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+        text = self.answer(body["messages"], json_mode)
+        usage = {"prompt_tokens": 10, "completion_tokens": len(text.split()), "total_tokens": 10 + len(text.split()),
+                 "prompt_tokens_details": {"cached_tokens": 0}}
+        base = {"id": f"chatcmpl-fake{self.requests}", "created": int(time.time()), "model": body.get("model", "fake")}
+
+        if not body.get("stream"):
+            payload = dict(base, object="chat.completion", usage=usage, choices=[
+                {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}
+            ])
+            return 200, json.dumps(payload, ensure_ascii=False).encode(), "application/json"
+
+        events = []
+        for word in text.split(" "):
+            chunk = dict(base, object="chat.completion.chunk", choices=[
+                {"index": 0, "finish_reason": None, "delta": {"content": word + " "}}
+            ])
+            events.append(chunk)
+        events.append(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+        stream = "".join(f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events) + "data: [DONE]\n\n"
+        return 200, stream.encode(), "text/event-stream"
+
+    @staticmethod
+    def answer(messages: list, json_mode: bool = False) -> str:
+        """Детерминированный ответ по последнему сообщению пользователя; в режиме JSON - вопрос квиза"""
+        if json_mode:
+            return QuizQuestion("Тестовый вопрос?", ["Первый", "Второй", "Третий", "Четвёртый"], 0,
+                                "Тестовое объяснение.").to_json()
+        return f"Тестовый ответ на: {messages[-1]['content'][:80]}"
+
+
+async def _serve(args):
+    server = FakeOpenAIServer(args.latency, args.jitter, args.error_rate, args.error_status)
+    port = await server.start(port=args.port)
+    logger.info(f"Тестовый OpenAI API слушает порт {port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Локальная подмена OpenAI API")
+    parser.add_argument("port", type=int, nargs="?", default=8082)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    asyncio.run(_serve(parser.parse_args()))
@@ -0,0 +1,93 @@
+"""Локальный сервер протокола Redis для проверки RedisStateBackend без настоящего Redis
+
+Запуск:
+    python -m tests.fakes.fake_redis 6380
+    STATE_BACKEND=redis STATE_REDIS_URLS=redis://localhost:6380/0 python main.py
+"""
+import asyncio
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+class FakeRedisServer:
+    """Хранит хеш-таблицы в памяти и поддерживает команды, нужные хранилищу состояния"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.hashes = {}
+        self._server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Запуск сервера; возвращает фактический порт"""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(self._execute(command))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader) -> list:
+        header = await reader.readuntil(b"\r\n")
+        args = []
+        for _ in range(int(header[1:-2])):
+            length = int((await reader.readuntil(b"\r\n"))[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def _execute(self, command: list) -> bytes:
+        name = command[0].decode().upper()
+        args = command[1:]
+        if name in ("PING", "AUTH", "SELECT"):
+            return b"+OK\r\n"
+        if name == "HSET":
+            table = self.hashes.setdefault(args[0], {})
+            added = 0
+            for i in range(1, len(args), 2):
+                added += args[i] not in table
+                table[args[i]] = args[i + 1]
+            return b":%d\r\n" % added
+        if name == "HGET":
+            value = self.hashes.get(args[0], {}).get(args[1])
+            return b"$-1\r\n" if value is None else self._bulk(value)
+        if name == "HDEL":
+            table = self.hashes.get(args[0], {})
+            removed = sum(table.pop(key, None) is not None for key in args[1:])
+            return b":%d\r\n" % removed
+        if name == "HGETALL":
+            table = self.hashes.get(args[0], {})
+            return b"*%d\r\n" % (len(table) * 2) + b"".join(
+                self._bulk(part) for pair in table.items() for part in pair
+            )
+        return b"-ERR unknown command '%s'\r\n" % name.encode()
+
+    @staticmethod
+    def _bulk(value: bytes) -> bytes:
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+async def _serve(port: int):
+    server = FakeRedisServer()
+    actual_port = await server.start(port=port)
+    logger.info(f"Тестовый Redis слушает порт {actual_port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve(int(sys.argv[1]) if len(sys.argv) > 1 else 6380))
@@ -0,0 +1,128 @@
+"""Локальная подмена Bot API для прогона бота без Telegram
+
+Запуск:
+    python -m tests.fakes.fake_telegram 8081
+    TELEGRAM_BASE_URL=http://127.0.0.1:8081 BOT_MODE=webhook WEBHOOK_SET=0 python main.py
+"""
+import asyncio
+import email.parser
+import itertools
+import json
+import logging
+import sys
+import time
+from urllib.parse import parse_qs
+from services.http_server import HttpServer
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+MESSAGE_METHODS = {"sendMessage", "sendPhoto", "editMessageText", "editMessageCaption", "sendPoll"}
+
+
+def parse_parameters(request) -> dict:
+    """Параметры запроса Bot API из JSON, form-urlencoded или multipart"""
+    content_type = request.headers.get('content-type', '')
+    if not request.body:
+        return {}
+    if content_type.startswith('application/json'):
+        return json.loads(request.body)
+    if content_type.startswith('multipart/'):
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + request.body
+        )
+        return {
+            part.get_param('name', header='content-disposition'): part.get_payload(decode=True).decode('utf-8', 'replace')
+            for part in message.get_payload()
+            if not part.get_filename()
+        }
+    return {key: values[0] for key, values in parse_qs(request.body.decode('utf-8')).items()}
+
+
+class FakeBotAPIServer:
+    """Отвечает на методы Bot API правдоподобными результатами и записывает вызовы"""
+
+    def __init__(self, latency: float = 0.0, blocked_chats=None):
+        self.latency = latency
+        # Чаты, заблокировавшие бота: отправка в них завершается ошибкой 403, как в Telegram
+        self.blocked_chats = blocked_chats or set()
+        self.calls = []
+        self._message_ids = itertools.count(1)
+        self._server = HttpServer()
+        self._server.route("POST", "/bot", self._handle, prefix=True)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        return await self._server.start(host, port)
+
+    async def stop(self):
+        await self._server.stop()
+
+    async def _handle(self, request):
+        method = request.path.rsplit('/', 1)[-1]
+        parameters = parse_parameters(request)
+        self.calls.append((method, parameters))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method in MESSAGE_METHODS and int(parameters.get("chat_id", 0)) in self.blocked_chats:
+            body = json.dumps({"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"})
+            return 403, body.encode(), "application/json"
+
+        body = json.dumps({"ok": True, "result": self._result(method, parameters)})
+        return 200, body.encode(), "application/json"
+
+    def _result(self, method: str, parameters: dict):
+        if method == "getMe":
+            return BOT_USER
+        if method in MESSAGE_METHODS:
+            message = {
+                "message_id": int(parameters.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": int(parameters.get("chat_id", 0)), "type": "private"},
+                "from": BOT_USER
+            }
+            if "text" in parameters:
+                message["text"] = parameters["text"]
+            if method == "sendPhoto":
+                message["photo"] = [{"file_id": f"fake_photo_{message['message_id']}",
+                                     "file_unique_id": f"u{message['message_id']}", "width": 1, "height": 1}]
+            if method == "sendPoll":
+                message["poll"] = self._poll(message["message_id"], parameters)
+            return message
+        if method == "getUpdates":
+            return []
+        return True
+
+    @staticmethod
+    def _poll(message_id: int, parameters: dict) -> dict:
+        options = parameters.get("options", "[]")
+        if isinstance(options, str):
+            options = json.loads(options)
+        poll = {
+            "id": f"fake_poll_{message_id}",
+            "question": parameters.get("question", ""),
+            "options": [{"text": option["text"] if isinstance(option, dict) else option, "voter_count": 0}
+                        for option in options],
+            "total_voter_count": 0,
+            "is_closed": False,
+            "is_anonymous": str(parameters.get("is_anonymous", "true")).lower() == "true",
+            "type": parameters.get("type", "regular"),
+            "allows_multiple_answers": False
+        }
+        if "correct_option_id" in parameters:
+            poll["correct_option_id"] = int(parameters["correct_option_id"])
+        if "explanation" in parameters:
+            poll["explanation"] = parameters["explanation"]
+        return poll
+
+
+async def _serve(port: int):
+    server = FakeBotAPIServer()
+    actual_port = await server.start(port=port)
+    logger.info(f"Тестовый Bot API слушает порт {actual_port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve(int(sys.argv[1]) if len(sys.argv) > 1 else 8081))
@@ -0,0 +1,60 @@
+"""Пакетная генерация: передача результатов работающему боту через входящие пула"""
+import asyncio
+import batch_job
+from data.quiz_topics import QUIZ_TOPICS
+from services.content_pool import ContentPool, FACT_TOPIC, quiz_topic, is_valid_quiz_item
+
+
+def make_pool(path: str, generator=None) -> ContentPool:
+    async def unavailable():
+        raise RuntimeError("API недоступен")
+
+    pool = ContentPool(path, capacity=5, low_water=2)
+    pool.register(FACT_TOPIC, generator or unavailable)
+    for topic_key in QUIZ_TOPICS:
+        pool.register(quiz_topic(topic_key), unavailable, validate=is_valid_quiz_item)
+    return pool
+
+
+def test_batch_results_survive_bot_saving_its_pool(tmp_path, monkeypatch):
+    path = str(tmp_path / "pool.json")
+    bot_pool = make_pool(path)
+    bot_pool.add(FACT_TOPIC, ["факт бота 1", "факт бота 2"])
+    bot_pool.save()
+
+    job_pool = make_pool(path)
+    monkeypatch.setattr(batch_job, "content_pool", job_pool)
+    stats = batch_job.run(batch_job.FakeBatchAPI(), facts=10, quiz_per_topic=0, recommendations=0, poll_interval=0)
+    assert stats["stored"] == 3
+
+    # Бот не знает о пакете: выдаёт элемент и переписывает файл пула своим состоянием
+    async def bot_side():
+        first = bot_pool.take(FACT_TOPIC)
+        bot_pool.save()
+        await asyncio.gather(*bot_pool._refills.values())
+        return first
+
+    assert asyncio.run(bot_side()) == "факт бота 1"
+    assert bot_pool.stats()[FACT_TOPIC]["size"] == 4
+
+    restored = make_pool(path)
+    restored.load()
+    assert restored.free(FACT_TOPIC) == 1
+    assert restored.add(FACT_TOPIC, ["Тестовый ответ 0 для fact."]) == 0
+
+
+def test_job_counts_items_not_yet_taken_by_bot(tmp_path, monkeypatch):
+    path = str(tmp_path / "pool.json")
+    results = []
+    for _ in range(2):
+        job_pool = make_pool(path)
+        monkeypatch.setattr(batch_job, "content_pool", job_pool)
+        results.append(batch_job.run(batch_job.FakeBatchAPI(), facts=3, quiz_per_topic=0, recommendations=0,
+                                     poll_interval=0))
+
+    # Во второй раз свободно только 2 места из 5: 3 элемента ждут во входящих
+    assert results[0]["stored"] == 3
+    assert results[1]["stored"] + results[1]["dropped"] == 2
+    bot_pool = make_pool(path)
+    assert bot_pool.take_inbox() == 3
+    assert bot_pool.take_inbox() == 0
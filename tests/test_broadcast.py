@@ -0,0 +1,113 @@
+"""Подписки и рассылка факта дня"""
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from telegram.error import BadRequest, ChatMigrated, Forbidden, RetryAfter
+from handlers import random_fact
+from services import broadcast as broadcast_module
+from services.broadcast import Broadcaster, SubscriptionStore
+
+
+def make_broadcaster(bot, subscribers=(1, 2, 3)) -> Broadcaster:
+    store = SubscriptionStore(":memory:")
+    for chat_id in subscribers:
+        store.subscribe(chat_id)
+    engine = Broadcaster(store, rate=1000, concurrency=4, batch_size=2, retries=1)
+    engine.bot = bot
+    return engine
+
+
+def test_fact_is_html_escaped(monkeypatch):
+    monkeypatch.setattr(broadcast_module.content_pool, "get", AsyncMock(return_value="2 < 3 & <b>жирный</b>"))
+    bot = AsyncMock()
+    report = asyncio.run(make_broadcaster(bot).broadcast("2026-01-01"))
+
+    assert report["sent"] == 3
+    text = bot.send_message.await_args.kwargs["text"]
+    assert "2 &lt; 3 &amp; &lt;b&gt;жирный&lt;/b&gt;" in text
+    assert text.startswith("📅 <b>Факт дня</b>")
+
+
+def test_subscribe_and_unsubscribe():
+    store = SubscriptionStore(":memory:")
+    assert store.subscribe(1)
+    assert not store.subscribe(1)
+    assert store.is_subscribed(1)
+    assert store.unsubscribe([1, 2]) == 1
+    assert store.unsubscribe([1]) == 0
+    assert not store.is_subscribed(1)
+    assert store.count() == 0
+
+
+def test_subscription_commands_reply_with_current_state(monkeypatch):
+    engine = make_broadcaster(AsyncMock(), subscribers=())
+    monkeypatch.setattr(random_fact, "broadcaster", engine)
+    message = SimpleNamespace(reply_text=AsyncMock())
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=7), message=message)
+
+    async def scenario():
+        for command in (random_fact.subscribe_command, random_fact.subscribe_command,
+                        random_fact.unsubscribe_command, random_fact.unsubscribe_command):
+            await command(update, None)
+
+    asyncio.run(scenario())
+    replies = [call.args[0] for call in message.reply_text.await_args_list]
+    assert replies[0].startswith("📅 Вы подписались")
+    assert replies[1].startswith("📅 Вы уже подписаны")
+    assert replies[2].startswith("👋 Вы отписались")
+    assert replies[3].startswith("Вы не подписаны")
+    assert not engine.store.is_subscribed(7)
+
+
+def test_failed_deliveries_are_counted_and_gone_chats_unsubscribed(monkeypatch):
+    monkeypatch.setattr(broadcast_module.content_pool, "get", AsyncMock(return_value="факт"))
+    errors = {
+        2: Forbidden("Forbidden: bot was blocked by the user"),
+        3: BadRequest("Chat not found"),
+        4: BadRequest("Message is too long"),
+        -5: ChatMigrated(-1000000000005),
+        6: RetryAfter(30),
+    }
+    calls = []
+
+    async def send_message(chat_id, **kwargs):
+        calls.append((chat_id, kwargs["rate_limit_args"]))
+        if chat_id in errors:
+            raise errors[chat_id]
+
+    engine = make_broadcaster(AsyncMock(send_message=AsyncMock(side_effect=send_message)),
+                              subscribers=(-5, 1, 2, 3, 4, 6))
+    report = asyncio.run(engine.broadcast("2026-01-01"))
+
+    assert (report["total"], report["sent"], report["blocked"], report["failed"]) == (6, 2, 2, 2)
+    assert engine.store.batch(None, 10) == [-1000000000005, 1, 4, 6]
+    assert [chat_id for chat_id, _ in calls].count(6) == 1
+    assert {retries for _, retries in calls} == {1}
+    assert engine.store.last_broadcast()["finished"] is not None
+
+
+def test_interrupted_broadcast_resumes_after_cursor(monkeypatch):
+    monkeypatch.setattr(broadcast_module.content_pool, "get", AsyncMock(return_value="факт"))
+    sent = []
+    crash = {"enabled": True}
+
+    async def send_message(chat_id, **kwargs):
+        if chat_id == 3 and crash["enabled"]:
+            raise RuntimeError("бот остановлен")
+        sent.append(chat_id)
+
+    engine = make_broadcaster(AsyncMock(send_message=AsyncMock(side_effect=send_message)),
+                              subscribers=(1, 2, 3, 4))
+    with pytest.raises(RuntimeError):
+        asyncio.run(engine.broadcast("2026-01-01"))
+    assert engine.store.unfinished_broadcast()["cursor"] == 2
+
+    crash["enabled"] = False
+    report = asyncio.run(engine.broadcast("2026-01-02"))
+    assert report["day"] == "2026-01-01"
+    assert report["sent"] == 4
+    # Повторно уходит только прерванная пачка
+    assert sorted(set(sent)) == [1, 2, 3, 4]
+    assert sent.count(1) == sent.count(2) == 1
+    assert engine.store.unfinished_broadcast() is None
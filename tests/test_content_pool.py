@@ -0,0 +1,118 @@
+"""Пул готовых фактов и вопросов квиза"""
+import asyncio
+import pytest
+from services.content_pool import ContentPool
+
+
+def make_pool(tmp_path, generator, capacity: int = 3, low_water: int = 1, validate=None) -> ContentPool:
+    pool = ContentPool(str(tmp_path / "pool.json"), capacity, low_water)
+    pool.register("facts", generator, validate)
+    return pool
+
+
+def counter_generator():
+    counter = iter(range(1000))
+
+    async def generate():
+        return f"факт {next(counter)}"
+
+    return generate
+
+
+def test_refill_fills_to_capacity_and_persists(tmp_path):
+    async def scenario():
+        pool = make_pool(tmp_path, counter_generator())
+        pool.start()
+        await asyncio.gather(*pool._refills.values())
+        size = pool.stats()["facts"]["size"]
+        await pool.stop()
+        return size
+
+    assert asyncio.run(scenario()) == 3
+
+    restored = make_pool(tmp_path, counter_generator())
+    restored.load()
+    assert restored.stats()["facts"]["size"] == 3
+
+
+def test_add_skips_duplicates_invalid_items_and_overflow(tmp_path):
+    pool = make_pool(tmp_path, counter_generator(), validate=lambda item: item != "плохой")
+    assert pool.add("facts", ["а", "А ", "плохой", "б", "в", "г"]) == 3
+    assert pool.free("facts") == 0
+
+
+def test_get_generates_on_miss(tmp_path):
+    async def scenario():
+        pool = make_pool(tmp_path, counter_generator())
+        item = await pool.get("facts")
+        await pool.stop()
+        return item, pool.stats()["facts"]
+
+    item, stats = asyncio.run(scenario())
+    assert item == "факт 0"
+    assert stats["misses"] == 1
+
+
+def test_get_repeats_recent_item_when_generation_fails(tmp_path):
+    async def failing():
+        raise RuntimeError("API недоступен")
+
+    async def scenario():
+        pool = make_pool(tmp_path, failing)
+        pool.add("facts", ["старый факт"])
+        first = await pool.get("facts")
+        second = await pool.get("facts")
+        await pool.stop()
+        return first, second
+
+    assert asyncio.run(scenario()) == ("старый факт", "старый факт")
+
+
+def test_get_raises_when_nothing_to_repeat(tmp_path):
+    async def failing():
+        raise RuntimeError("API недоступен")
+
+    async def scenario():
+        pool = make_pool(tmp_path, failing)
+        try:
+            await pool.get("facts")
+        finally:
+            await pool.stop()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+
+
+def test_refill_stops_after_generation_error(tmp_path):
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        raise RuntimeError("API недоступен")
+
+    async def scenario():
+        pool = make_pool(tmp_path, failing)
+        pool.start()
+        await asyncio.gather(*pool._refills.values())
+        await pool.stop()
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+
+
+def test_take_below_low_water_schedules_single_refill(tmp_path):
+    async def scenario():
+        pool = make_pool(tmp_path, counter_generator(), capacity=4, low_water=2)
+        pool.add("facts", ["а", "б", "в"])
+        assert pool.take("facts") == "а"
+        assert "facts" not in pool._refills
+        pool.take("facts")
+        refill = pool._refills["facts"]
+        pool.take("facts")
+        assert pool._refills["facts"] is refill
+        await refill
+        size = pool.stats()["facts"]["size"]
+        await pool.stop()
+        return size
+
+    assert asyncio.run(scenario()) == 4
@@ -0,0 +1,142 @@
+"""Групповой квиз: запуск игры кнопкой выбора темы, раунды на время и запись очков"""
+import asyncio
+from collections import defaultdict
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from data.quiz_topics import QUIZ_TOPICS
+from handlers import group_quiz
+from services.quiz_game import BASE_POINTS, QuizGames, QuizSession
+from services.quiz_question import QuizQuestion
+
+QUESTION = QuizQuestion("Столица Франции?", ["Лион", "Париж", "Марсель", "Ницца"], 1, "Париж - столица Франции.")
+
+
+def make_callback(chat_id: int, topic_key: str):
+    async def answer(*args, **kwargs):
+        await asyncio.sleep(0)
+
+    query = SimpleNamespace(
+        data=f"group_quiz_{topic_key}",
+        message=SimpleNamespace(chat_id=chat_id),
+        answer=AsyncMock(side_effect=answer),
+        edit_message_text=AsyncMock(side_effect=answer),
+    )
+    return SimpleNamespace(callback_query=query)
+
+
+def test_concurrent_topic_clicks_start_one_game(monkeypatch):
+    games = QuizGames()
+    started = []
+
+    async def run_game(application, session):
+        started.append(session)
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(group_quiz, "quiz_games", games)
+    monkeypatch.setattr(group_quiz, "run_game", run_game)
+    topic_key = next(iter(QUIZ_TOPICS))
+    context = SimpleNamespace(application=SimpleNamespace())
+    updates = [make_callback(-100, topic_key), make_callback(-100, topic_key)]
+
+    async def scenario():
+        await asyncio.gather(*(group_quiz.group_quiz_callback(update, context) for update in updates))
+        await asyncio.sleep(0)
+        session = games.sessions[-100]
+        session.task.cancel()
+        await asyncio.gather(session.task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert len(started) == 1
+    answers = [update.callback_query.answer.await_args.args for update in updates]
+    assert sorted(answers) == [(), ("Игра уже идёт",)]
+    assert sum(update.callback_query.edit_message_text.await_count for update in updates) == 1
+
+
+def make_game(monkeypatch, rounds: int = 2, round_seconds: float = 0.05, answers=()):
+    """Игра с фейковым ботом; answers - [(раунд, задержка, игрок, вариант)] ответов в опросах"""
+    games = QuizGames()
+    monkeypatch.setattr(group_quiz, "quiz_games", games)
+    monkeypatch.setattr(group_quiz, "GROUP_QUIZ_PAUSE", 0)
+
+    async def get(topic):
+        return QUESTION.to_json()
+
+    monkeypatch.setattr(group_quiz.content_pool, "get", get)
+    polls = []
+
+    async def send_poll(**kwargs):
+        poll_id = f"poll{len(polls) + 1}"
+        polls.append(poll_id)
+        loop = asyncio.get_running_loop()
+        for round_number, delay, player, option in answers:
+            if round_number == len(polls):
+                loop.call_later(delay, games.answer, poll_id, player, f"Игрок {player}", option)
+        return SimpleNamespace(poll=SimpleNamespace(id=poll_id))
+
+    bot = SimpleNamespace(send_message=AsyncMock(), send_poll=AsyncMock(side_effect=send_poll))
+    application = SimpleNamespace(bot=bot, chat_data=defaultdict(dict), persistence=None)
+    session = QuizSession(-100, next(iter(QUIZ_TOPICS)), rounds, round_seconds)
+    games.start(session)
+    return games, application, session
+
+
+def test_rounds_score_answers_within_time_limit(monkeypatch):
+    answers = [(1, 0.01, 1, 1), (1, 0.01, 2, 0), (1, 0.02, 1, 1), (1, 0.2, 3, 1), (2, 0.01, 2, 1)]
+    games, application, session = make_game(monkeypatch, answers=answers)
+    asyncio.run(group_quiz.run_game(application, session))
+
+    assert application.bot.send_poll.await_count == 2
+    board = application.chat_data[-100]["quiz_leaderboard"]
+    assert set(board) == {1, 2}
+    assert board[1]["points"] > BASE_POINTS
+    assert board[1]["points"] == session.leaderboard.score(1)
+    assert board[2]["points"] == session.leaderboard.score(2) > BASE_POINTS
+    assert games.answers == 3
+    assert -100 not in games.sessions
+    texts = [call.kwargs["text"] for call in application.bot.send_message.await_args_list]
+    assert len(texts) == 4
+    assert "Ответили: 2, верно: 1" in texts[1]
+    assert "Ответили: 1, верно: 1" in texts[2]
+    assert texts[-1].startswith("🏁")
+
+
+def test_answer_to_previous_round_poll_is_ignored(monkeypatch):
+    games, application, session = make_game(monkeypatch, answers=[(2, 0.01, 1, 1)])
+
+    async def scenario():
+        game = asyncio.create_task(group_quiz.run_game(application, session))
+        while application.bot.send_poll.await_count < 2:
+            await asyncio.sleep(0.005)
+        late = games.answer("poll1", 2, "Игрок 2", 1)
+        await game
+        return late
+
+    assert asyncio.run(scenario()) is False
+    assert set(application.chat_data[-100]["quiz_leaderboard"]) == {1}
+
+
+def test_points_are_kept_when_game_is_stopped(monkeypatch):
+    games, application, session = make_game(monkeypatch, rounds=3, round_seconds=10, answers=[(1, 0, 1, 1)])
+
+    async def scenario():
+        game = asyncio.create_task(group_quiz.run_game(application, session))
+        while not games.answers:
+            await asyncio.sleep(0.005)
+        game.cancel()
+        await asyncio.gather(game, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert application.chat_data[-100]["quiz_leaderboard"][1]["points"] > BASE_POINTS
+    assert -100 not in games.sessions
+
+
+def test_game_error_is_reported_and_session_released(monkeypatch):
+    games, application, session = make_game(monkeypatch)
+
+    async def failing(topic):
+        raise RuntimeError("API недоступен")
+
+    monkeypatch.setattr(group_quiz.content_pool, "get", failing)
+    asyncio.run(group_quiz.run_game(application, session))
+    assert application.bot.send_message.await_args.kwargs["text"].startswith("😔")
+    assert -100 not in games.sessions
@@ -0,0 +1,79 @@
+"""Встроенный HTTP-сервер: маршрутизация и защита от медленных и чрезмерных запросов"""
+import asyncio
+import time
+from services.http_server import MAX_HEADER_COUNT, HttpServer
+
+
+async def echo(request):
+    return 200, request.body, "text/plain"
+
+
+def serve(scenario, **options):
+    async def run():
+        server = HttpServer(**options)
+        server.route("POST", "/echo", echo)
+        port = await server.start("127.0.0.1", 0)
+        try:
+            return await scenario(port)
+        finally:
+            await server.stop()
+
+    return asyncio.run(run())
+
+
+async def exchange(port: int, data: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    response = await asyncio.wait_for(reader.read(), 2)
+    writer.close()
+    return response
+
+
+def test_request_is_routed():
+    async def scenario(port):
+        return await exchange(port, b"POST /echo HTTP/1.1\r\nContent-Length: 5\r\nConnection: close\r\n\r\nhello")
+
+    response = serve(scenario)
+    assert response.startswith(b"HTTP/1.1 200 OK")
+    assert response.endswith(b"hello")
+
+
+def test_idle_connection_is_closed():
+    async def scenario(port):
+        started = time.perf_counter()
+        assert await exchange(port, b"") == b""
+        return time.perf_counter() - started
+
+    assert serve(scenario, idle_timeout=0.1) < 1
+
+
+def test_slow_headers_are_cut_off():
+    async def scenario(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"POST /echo HTTP/1.1\r\nX-Slow: 1\r\n")
+        await writer.drain()
+        started = time.perf_counter()
+        response = await asyncio.wait_for(reader.read(), 2)
+        writer.close()
+        return response, time.perf_counter() - started
+
+    response, elapsed = serve(scenario, read_timeout=0.1)
+    assert response == b""
+    assert elapsed < 1
+
+
+def test_too_many_headers_are_rejected():
+    headers = b"".join(b"X-Header-%d: 1\r\n" % number for number in range(MAX_HEADER_COUNT + 1))
+
+    async def scenario(port):
+        return await exchange(port, b"POST /echo HTTP/1.1\r\n" + headers + b"\r\n")
+
+    assert serve(scenario).startswith(b"HTTP/1.1 431")
+
+
+def test_overlong_header_line_closes_connection():
+    async def scenario(port):
+        return await exchange(port, b"POST /echo HTTP/1.1\r\nX-Long: " + b"a" * 100_000 + b"\r\n\r\n")
+
+    assert serve(scenario) == b""
@@ -0,0 +1,68 @@
+"""Потоковый ответ: экранирование текста модели и продолжение длинного ответа в новых сообщениях"""
+import asyncio
+import html
+from handlers.live_message import CURSOR, MAX_MESSAGE_LENGTH, LiveMessage
+
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text):
+        message = FakeMessage(self, chat_id, text)
+        self.messages.append(message)
+        return message
+
+
+class FakeMessage:
+    def __init__(self, bot: FakeBot, chat_id: int, text: str):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.text = text
+        self.reply_markup = None
+
+    def get_bot(self):
+        return self.bot
+
+    async def edit_text(self, text, parse_mode=None, reply_markup=None):
+        self.text = text
+        self.reply_markup = reply_markup
+
+
+async def chunks_of(text: str, size: int = 50):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def stream(text: str, header: str = "", reply_markup=None):
+    bot = FakeBot()
+
+    async def scenario():
+        placeholder = await bot.send_message(1, "⏳")
+        live = LiveMessage(placeholder, header=header, interval=0, min_chars=1)
+        return await live.stream(chunks_of(text), reply_markup=reply_markup)
+
+    return asyncio.run(scenario()), bot.messages
+
+
+def test_model_text_is_escaped_and_header_kept():
+    result, messages = stream("a < b && <i>не тег</i>", header="<b>Ответ</b>\n\n", reply_markup="keyboard")
+    assert result == "a < b && <i>не тег</i>"
+    assert len(messages) == 1
+    assert messages[0].text == "<b>Ответ</b>\n\na &lt; b &amp;&amp; &lt;i&gt;не тег&lt;/i&gt;"
+    assert messages[0].reply_markup == "keyboard"
+
+
+def test_long_answer_continues_in_new_messages():
+    text = "".join(f"Строка {number} с символами < и &.\n" for number in range(600))
+    result, messages = stream(text, header="<b>Ответ</b>\n\n", reply_markup="keyboard")
+
+    assert result == text
+    assert len(messages) > 1
+    assert all(len(message.text) <= MAX_MESSAGE_LENGTH for message in messages)
+    assert not any(message.text.endswith(CURSOR) for message in messages)
+    assert [message.reply_markup for message in messages] == [None] * (len(messages) - 1) + ["keyboard"]
+    assert messages[0].text.startswith("<b>Ответ</b>")
+    assert not any(message.text.startswith("<b>") for message in messages[1:])
+    shown = messages[0].text[len("<b>Ответ</b>\n\n"):] + "".join(message.text for message in messages[1:])
+    assert html.unescape(shown) == text
@@ -0,0 +1,70 @@
+"""Кэш ответов в get_chatgpt_response: накопление вариантов, ответы из кэша и устаревшие ответы при ошибке"""
+import asyncio
+import pytest
+from services import openai_client
+from services.providers import FakeProvider, Route
+from services.response_cache import ResponseCache, MemoryBackend
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = FakeProvider()
+    monkeypatch.setattr(openai_client, "route_for", lambda task, messages: Route(provider, provider.model))
+    monkeypatch.setattr(openai_client, "response_cache", ResponseCache(MemoryBackend(max_entries=10), ttl=60))
+    return provider
+
+
+def test_cached_variants_are_served_without_model_call(provider):
+    async def scenario():
+        first = await openai_client.get_chatgpt_response("Посоветуй книгу", cache_variants=1)
+        second = await openai_client.get_chatgpt_response("Посоветуй книгу", cache_variants=1)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert provider.requests == 1
+
+
+def test_requests_go_to_model_until_variants_are_collected(provider, monkeypatch):
+    complete = provider.complete
+
+    async def varying(messages, *args, **kwargs):
+        text, usage = await complete(messages, *args, **kwargs)
+        return f"{text} #{provider.requests}", usage
+
+    monkeypatch.setattr(provider, "complete", varying)
+
+    async def scenario():
+        for _ in range(3):
+            await openai_client.get_chatgpt_response("Посоветуй фильм", cache_variants=2)
+
+    asyncio.run(scenario())
+    assert provider.requests == 2
+
+
+def test_without_variants_cache_is_not_used(provider):
+    async def scenario():
+        for _ in range(2):
+            await openai_client.get_chatgpt_response("Посоветуй сериал")
+
+    asyncio.run(scenario())
+    assert provider.requests == 2
+
+
+def test_error_returns_cached_answer_and_is_not_cached(provider, monkeypatch):
+    async def failing(*args, **kwargs):
+        raise RuntimeError("API недоступен")
+
+    async def scenario():
+        cached = await openai_client.get_chatgpt_response("Переведи: кот", "translate", cache_variants=1)
+        monkeypatch.setattr(provider, "complete", failing)
+        stale = await openai_client.get_chatgpt_response("Переведи: кот", "translate", cache_variants=2)
+        error = await openai_client.get_chatgpt_response("Переведи: пёс", "translate", cache_variants=1)
+        return cached, stale, error
+
+    cached, stale, error = asyncio.run(scenario())
+    assert stale == cached
+    assert error.startswith("Извините, произошла ошибка.")
+    key = openai_client.response_cache_key(openai_client.chatgpt_messages("Переведи: пёс", "translate"),
+                                           openai_client.mode_temperature("translate"), provider.model)
+    assert openai_client.response_cache.get(key) is None
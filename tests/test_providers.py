@@ -0,0 +1,98 @@
+"""Бэкенды моделей и маршрутизация задач между ними"""
+import asyncio
+import json
+import pytest
+from services.providers import FakeProvider, LatencyTracker, ProviderRouter, parse_mapping
+from services.quiz_question import QuizQuestion
+
+MESSAGES = [{"role": "system", "content": "Ты помощник."}, {"role": "user", "content": "Расскажи факт"}]
+
+
+def test_fake_provider_is_deterministic():
+    provider = FakeProvider()
+    first, usage = asyncio.run(provider.complete(MESSAGES, 0.7))
+    second, _ = asyncio.run(provider.complete(MESSAGES, 0.7))
+    assert first == second
+    assert usage.prompt_tokens > 0
+    assert usage.total_tokens == usage.prompt_tokens + usage.completion_tokens
+    assert provider.requests == 2
+
+
+def test_fake_provider_json_mode_returns_valid_quiz_question():
+    text, _ = asyncio.run(FakeProvider().complete(MESSAGES, 0.8, json_mode=True))
+    question = QuizQuestion.from_json(text)
+    assert len(question.options) == 4
+    assert json.loads(text)["correct_index"] == question.correct_index
+
+
+def test_fake_provider_stream_matches_complete_and_ends_with_usage():
+    provider = FakeProvider()
+
+    async def collect():
+        return [item async for item in provider.stream(MESSAGES, 0.7)]
+
+    chunks = asyncio.run(collect())
+    assert "".join(text for text, _ in chunks).strip() == provider.answer(MESSAGES)
+    assert all(usage is None for _, usage in chunks[:-1])
+    assert chunks[-1][1] is not None
+
+
+def test_parse_mapping_skips_malformed_items():
+    assert parse_mapping("fact=local, translate = openai:gpt-4o-mini,broken,=local,quiz=") == {
+        "fact": "local", "translate": "openai:gpt-4o-mini"
+    }
+
+
+def test_unknown_provider_in_routes_is_rejected():
+    with pytest.raises(ValueError):
+        ProviderRouter({"fake": FakeProvider()}, default="fake", routes={"fact": "local"}, long_routes={},
+                       long_prompt_tokens=1000, slos={}, fallback="", tracker=LatencyTracker(60, 1))
+
+
+def make_router(routes=None, long_routes=None, slos=None, fallback="", min_samples: int = 3) -> ProviderRouter:
+    providers = {}
+    for name in ("openai", "local"):
+        providers[name] = FakeProvider()
+        providers[name].name = name
+    return ProviderRouter(providers, default="openai", routes=routes or {}, long_routes=long_routes or {},
+                          long_prompt_tokens=1000, slos=slos or {}, fallback=fallback,
+                          tracker=LatencyTracker(60, min_samples))
+
+
+def test_route_by_task_and_model():
+    router = make_router(routes={"fact": "local", "translate": "openai:mini"})
+    assert router.route("fact").key == "local:fake"
+    assert router.route("translate").key == "openai:mini"
+    assert router.route("default").key == "openai:fake"
+
+
+def test_long_prompt_uses_long_route():
+    router = make_router(routes={"default": "local"}, long_routes={"default": "openai:large"})
+    assert router.route("default", 1000).key == "local:fake"
+    assert router.route("default", 1001).key == "openai:large"
+    assert router.route("fact", 5000).key == "openai:fake"
+
+
+def test_slo_violation_switches_to_fallback_until_window_expires():
+    router = make_router(routes={"fact": "local"}, slos={"fact": "1"}, fallback="openai")
+    route = router.route("fact")
+    for _ in range(2):
+        router.record(route, 5)
+    assert router.route("fact").key == "local:fake"
+
+    router.record(route, 5)
+    assert router.route("fact").key == "openai:fake"
+    assert router.fallbacks == 1
+    assert router.route("translate").key == "openai:fake"
+
+    router.tracker.window = -1
+    assert router.route("fact").key == "local:fake"
+
+
+def test_fast_route_stays_within_slo():
+    router = make_router(routes={"fact": "local"}, slos={"fact": "1"}, fallback="openai")
+    route = router.route("fact")
+    for _ in range(10):
+        router.record(route, 0.1)
+    assert router.route("fact").key == "local:fake"
+    assert router.fallbacks == 0
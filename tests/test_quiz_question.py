@@ -0,0 +1,70 @@
+"""Разбор и проверка JSON-записей вопросов квиза"""
+import asyncio
+import json
+import pytest
+from services import openai_client
+from services.content_pool import ContentPool, is_valid_quiz_item
+from services.quiz_question import QuizQuestion
+
+VALID = {
+    "question": "Столица Франции?",
+    "options": ["Париж", "Лион", "Марсель", "Ницца"],
+    "correct_index": 0,
+    "explanation": "Париж - столица Франции."
+}
+
+
+def record(**changes) -> str:
+    return json.dumps(dict(VALID, **changes), ensure_ascii=False)
+
+
+@pytest.mark.parametrize("text", [
+    "не JSON",
+    "",
+    '["Столица Франции?"]',
+    '{"question": "Столица Франции?"',
+    record(question=" "),
+    record(options=["Париж", "Лион", "Марсель"]),
+    record(options=["Париж", "Лион", "Марсель", None]),
+    record(options=["Париж", "париж", "Марсель", "Ницца"]),
+    record(correct_index=4),
+    record(correct_index=True),
+    record(correct_index="E"),
+    record(explanation=""),
+    record(question="?" * 301),
+])
+def test_invalid_records_are_rejected(text):
+    with pytest.raises(ValueError):
+        QuizQuestion.from_json(text)
+    assert not is_valid_quiz_item(text)
+
+
+def test_fenced_record_with_letter_index_is_accepted():
+    question = QuizQuestion.from_json(f"```json\n{record(correct_index='b')}\n```")
+    assert question.correct_index == 1
+    assert QuizQuestion.from_json(question.to_json()).correct_letter == "B"
+
+
+@pytest.mark.parametrize("item", [None, 42, {"question": "Столица Франции?"}])
+def test_non_string_item_is_invalid(item):
+    assert not is_valid_quiz_item(item)
+
+
+def test_pool_drops_invalid_saved_records(tmp_path):
+    path = tmp_path / "pool.json"
+    path.write_text(json.dumps({"quiz_science": [record(), "не JSON", None, record(correct_index=7)]},
+                               ensure_ascii=False), encoding='utf-8')
+    pool = ContentPool(str(path), capacity=5, low_water=0)
+    pool.register("quiz_science", None, validate=is_valid_quiz_item)
+    pool.load()
+    assert pool.take("quiz_science") == record()
+    assert pool.stats()["quiz_science"]["size"] == 0
+
+
+def test_invalid_model_output_raises(monkeypatch):
+    async def completion(*args, **kwargs):
+        return '{"question": "Столица Франции?", "options": []}'
+
+    monkeypatch.setattr(openai_client, "create_completion", completion)
+    with pytest.raises(ValueError):
+        asyncio.run(openai_client.generate_quiz_question("география"))
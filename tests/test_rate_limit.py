@@ -0,0 +1,68 @@
+"""Повторы flood wait в TelegramRateLimiter: единственное место, где повторяется RetryAfter"""
+import asyncio
+import pytest
+from telegram.error import RetryAfter
+from config import TG_MAX_RETRIES
+from services.rate_limit import TelegramRateLimiter
+
+
+def flooding(failures: int):
+    """callback, который первые failures вызовов отвечает RetryAfter"""
+    calls = []
+
+    async def callback():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise RetryAfter(0)
+        return "ok"
+
+    return callback, calls
+
+
+def send(limiter: TelegramRateLimiter, callback, rate_limit_args=None):
+    return asyncio.run(limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": 1}, rate_limit_args))
+
+
+@pytest.mark.parametrize("rate_limit_args, expected", [
+    (None, TG_MAX_RETRIES), (0, 0), (3, 3), (-1, 0), (True, TG_MAX_RETRIES), ("2", TG_MAX_RETRIES)
+])
+def test_max_retries(rate_limit_args, expected):
+    assert TelegramRateLimiter.max_retries(rate_limit_args) == expected
+
+
+def test_flood_wait_is_retried_up_to_limit():
+    limiter = TelegramRateLimiter()
+    callback, calls = flooding(2)
+    assert send(limiter, callback, 2) == "ok"
+    assert len(calls) == 3
+    assert limiter.flood_waits == 2
+
+
+def test_flood_wait_is_raised_after_last_retry():
+    limiter = TelegramRateLimiter()
+    callback, calls = flooding(5)
+    with pytest.raises(RetryAfter):
+        send(limiter, callback, 1)
+    assert len(calls) == 2
+
+
+def test_zero_retries_leave_flood_wait_to_caller():
+    limiter = TelegramRateLimiter()
+    callback, calls = flooding(1)
+    with pytest.raises(RetryAfter):
+        send(limiter, callback, 0)
+    assert len(calls) == 1
+    assert limiter.flood_waits == 1
+
+
+def test_other_errors_are_not_retried():
+    limiter = TelegramRateLimiter()
+    calls = []
+
+    async def callback():
+        calls.append(1)
+        raise ValueError("плохой запрос")
+
+    with pytest.raises(ValueError):
+        send(limiter, callback, 3)
+    assert len(calls) == 1
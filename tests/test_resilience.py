@@ -0,0 +1,92 @@
+"""Circuit breaker и ResilientCaller"""
+import asyncio
+import pytest
+from services.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+class ServerError(Exception):
+    status_code = 500
+
+
+def make_caller(breaker: CircuitBreaker, retries: int = 0) -> ResilientCaller:
+    return ResilientCaller(deadline=1.0, retries=retries, backoff_base=0.001, backoff_max=0.001,
+                           hedge_enabled=False, hedge_min_samples=1000, breaker=breaker)
+
+
+def test_breaker_opens_on_error_rate_and_recovers_after_cooldown():
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=4, window=60, cooldown=0)
+    for ok in (True, False, True, False):
+        breaker.record(ok)
+    assert breaker.state == "open"
+
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_breaker():
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=1, window=60, cooldown=0)
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+
+
+def test_open_breaker_rejects_without_calling_api():
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=1, window=60, cooldown=60)
+    breaker.record(False)
+    caller = make_caller(breaker)
+    calls = []
+
+    async def request():
+        calls.append(1)
+        return "ok"
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(caller.call(request))
+    assert not calls
+    assert caller.rejected == 1
+
+
+def test_retryable_errors_are_retried():
+    caller = make_caller(CircuitBreaker(error_rate=1.0, min_requests=100, window=60, cooldown=60), retries=2)
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ServerError("503")
+        return "ok"
+
+    assert asyncio.run(caller.call(request)) == "ok"
+    assert len(attempts) == 3
+    assert caller.retried == 2
+
+
+def test_cancelled_trial_releases_half_open_breaker():
+    breaker = CircuitBreaker(error_rate=0.5, min_requests=1, window=60, cooldown=0)
+    breaker.record(False)
+    caller = make_caller(breaker)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def slow_request():
+            started.set()
+            await asyncio.sleep(10)
+
+        trial = asyncio.create_task(caller.call(slow_request))
+        await started.wait()
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        async def request():
+            return "ok"
+
+        return await caller.call(request)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert breaker.state == "closed"
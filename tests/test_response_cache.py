@@ -0,0 +1,35 @@
+"""Кэш ответов: варианты, TTL и LRU-вытеснение на диске"""
+import time
+from services.response_cache import ResponseCache, SQLiteBackend
+
+
+def test_read_does_not_write(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"), max_entries=10)
+    cache = ResponseCache(backend, ttl=60)
+    cache.put("key", "ответ")
+    changes = backend._db.total_changes
+    assert cache.get("key") == "ответ"
+    assert backend._db.total_changes == changes
+    assert not backend._db.in_transaction
+
+
+def test_recently_read_entry_survives_eviction(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache = ResponseCache(backend, ttl=60)
+    cache.put("old", "1")
+    time.sleep(0.01)
+    cache.put("newer", "2")
+    time.sleep(0.01)
+    assert cache.get("old") == "1"
+    cache.put("newest", "3")
+    assert cache.get("old") == "1"
+    assert cache.get("newer") is None
+
+
+def test_variants_accumulate_up_to_limit(tmp_path):
+    cache = ResponseCache(SQLiteBackend(str(tmp_path / "cache.sqlite3"), max_entries=10), ttl=60)
+    cache.put("key", "a", variants=2)
+    assert cache.get("key", variants=2) is None
+    cache.put("key", "b", variants=2)
+    cache.put("key", "c", variants=2)
+    assert cache.get("key", variants=2) in ("b", "c")
@@ -0,0 +1,107 @@
+"""Семантический кэш: совпадения, защита от ложных попаданий, TTL и вытеснение"""
+import time
+import pytest
+from services.semantic_cache import SemanticCache
+
+
+def make_cache(**overrides) -> SemanticCache:
+    options = dict(threshold=0.92, max_entries=100, ttl=3600, min_words=3, index_mode="exact", exact_limit=1000)
+    options.update(overrides)
+    return SemanticCache(**options)
+
+
+def test_same_question_hits_and_other_namespace_misses():
+    cache = make_cache()
+    cache.add("chatgpt", "Как работает фотосинтез у растений?", "С помощью света")
+    assert cache.lookup("chatgpt", "как работает фотосинтез у растений") == "С помощью света"
+    assert cache.lookup("personality", "Как работает фотосинтез у растений?") is None
+
+
+def test_different_numbers_do_not_hit():
+    cache = make_cache()
+    cache.add("chatgpt", "Сколько будет 17 умножить на 3?", "51")
+    assert cache.lookup("chatgpt", "Сколько будет 17 умножить на 4?") is None
+
+
+def test_word_order_matters():
+    cache = make_cache()
+    cache.add("chatgpt", "Переведи с английского на русский слово привет", "hello → привет")
+    assert cache.lookup("chatgpt", "Переведи с русского на английский слово привет") is None
+
+    cache.add("chatgpt", "Переведи с русского на английский слово привет", "привет → hello")
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("chatgpt", "Переведи с русского на английский слово привет") == "привет → hello"
+    assert cache.lookup("chatgpt", "Переведи с английского на русский слово привет") == "hello → привет"
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("Как посмотреть список процессов в Linux?", "Как посмотреть список процессов в Windows?"),
+    ("Как отсортировать список по убыванию в Python?", "Как отсортировать список по возрастанию в Python?"),
+    ("Стоит ли учить Python в 2024 году?", "Не стоит ли учить Python в 2024 году?"),
+    ("How to sort a list descending in Python?", "How to sort a list ascending in Python?"),
+])
+def test_opposite_meaning_does_not_hit(cached, asked):
+    cache = make_cache(threshold=0.5)
+    cache.add("chatgpt", cached, "ответ")
+    assert cache.lookup("chatgpt", asked) is None
+
+
+def test_function_words_and_inflections_still_hit():
+    cache = make_cache()
+    cache.add("chatgpt", "Как работает фотосинтез у растений?", "ответ")
+    assert cache.lookup("chatgpt", "Скажи, как работает фотосинтез растения") == "ответ"
+
+
+def test_repeated_question_is_stored_once():
+    cache = make_cache()
+    cache.add("chatgpt", "Как работает фотосинтез у растений?", "первый")
+    cache.add("chatgpt", "Как работает фотосинтез у растений?", "второй")
+    assert cache.stats()["entries"] == 1
+
+
+def test_short_questions_are_not_cached():
+    cache = make_cache()
+    cache.add("chatgpt", "а подробнее?", "ответ")
+    assert cache.lookup("chatgpt", "а подробнее?") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entry_is_removed(monkeypatch):
+    cache = make_cache(ttl=10)
+    cache.add("chatgpt", "Как работает фотосинтез у растений?", "ответ")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.lookup("chatgpt", "Как работает фотосинтез у растений?") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_oldest_entry_is_evicted():
+    cache = make_cache(max_entries=2)
+    cache.add("chatgpt", "Как работает фотосинтез у растений?", "1")
+    cache.add("chatgpt", "Почему небо днём голубого цвета?", "2")
+    cache.add("chatgpt", "Кто написал роман война и мир?", "3")
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("chatgpt", "Как работает фотосинтез у растений?") is None
+
+
+@pytest.mark.parametrize("index_mode", ["exact", "approximate"])
+def test_index_modes_find_same_question(index_mode):
+    cache = make_cache(index_mode=index_mode)
+    cache.add("chatgpt", "Почему небо днём голубого цвета?", "рассеяние")
+    assert cache.lookup("chatgpt", "Почему небо днём голубого цвета?") == "рассеяние"
+
+
+def test_question_text_stays_out_of_log_and_audit_is_opt_in(tmp_path, caplog):
+    question = "Как работает фотосинтез у растений?"
+    cache = make_cache()
+    cache.add("chatgpt", question, "ответ")
+    with caplog.at_level("DEBUG", logger="services.semantic_cache"):
+        assert cache.lookup("chatgpt", question) == "ответ"
+    assert caplog.records
+    assert "фотосинтез" not in caplog.text
+
+    audit = tmp_path / "audit.jsonl"
+    cache = make_cache(audit_path=str(audit))
+    cache.add("chatgpt", question, "ответ")
+    cache.lookup("chatgpt", question)
+    assert "фотосинтез" in audit.read_text(encoding="utf-8")
@@ -0,0 +1,70 @@
+"""Объединение одинаковых одновременных запросов"""
+import asyncio
+import pytest
+from services.openai_client import SingleFlight
+
+
+def test_concurrent_calls_share_one_request():
+    flight = SingleFlight()
+    calls = []
+
+    async def request():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("key", request) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["answer"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+
+
+def test_error_reaches_every_caller_and_key_is_forgotten():
+    flight = SingleFlight()
+
+    async def request():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        return await asyncio.gather(flight.do("key", request), flight.do("key", request), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+
+    async def request():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do("key", request))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", request))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == "answer"
+
+
+def test_lead_and_follow():
+    flight = SingleFlight()
+
+    async def scenario():
+        future = flight.lead("key")
+        assert flight.follow("key") is future
+        assert flight.follow("other") is None
+        future.set_result("answer")
+        await asyncio.sleep(0)
+        return flight.follow("key")
+
+    assert asyncio.run(scenario()) is None
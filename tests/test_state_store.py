@@ -0,0 +1,95 @@
+"""Хранилище состояния: формат записи и обновление горячих копий"""
+import asyncio
+import pytest
+from services.state_store import (RedisStateBackend, SQLiteStateBackend, StatePersistence, decode_state,
+                                  encode_state)
+from tests.fakes.fake_redis import FakeRedisServer
+
+
+def test_state_round_trip_keeps_int_keys_and_tuples():
+    value = {"quiz_leaderboard": {42: {"name": "Аня", "points": 3}}, "key": (1, "a"), "turns": [[1, 2]]}
+    assert decode_state(encode_state(value)) == value
+
+
+def test_arbitrary_objects_are_rejected():
+    with pytest.raises(TypeError):
+        encode_state({"object": object()})
+
+
+def test_idle_copy_is_refreshed_from_shared_backend(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+
+    async def scenario():
+        first = StatePersistence(SQLiteStateBackend(path), hot_limit=10, update_interval=0.01, hot_ttl=0.05)
+        second = StatePersistence(SQLiteStateBackend(path), hot_limit=10, update_interval=0.01, hot_ttl=0.05)
+        first_data, second_data = {}, {}
+
+        await first.refresh_user_data(1, first_data)
+        first_data["score"] = 1
+        await first.update_user_data(1, first_data)
+        await asyncio.sleep(0.01)
+
+        await second.refresh_user_data(1, second_data)
+        assert second_data == {"score": 1}
+        second_data["score"] = 2
+        await second.update_user_data(1, second_data)
+        await asyncio.sleep(0.01)
+
+        await first.refresh_user_data(1, first_data)
+        assert first_data == {"score": 1}
+        await asyncio.sleep(0.06)
+        await first.refresh_user_data(1, first_data)
+        assert first_data == {"score": 2}
+
+    asyncio.run(scenario())
+
+
+def with_redis(scenario, timeout: float = 1.0):
+    async def run():
+        server = FakeRedisServer()
+        port = await server.start()
+        backend = RedisStateBackend(f"redis://127.0.0.1:{port}/1", timeout=timeout)
+        try:
+            return await scenario(server, backend)
+        finally:
+            await backend.close()
+            await server.stop()
+
+    return asyncio.run(run())
+
+
+def test_redis_reply_of_cancelled_command_is_not_read_by_next_one():
+    async def scenario(server, backend):
+        await backend.set_many("user", {"1": b"first", "2": b"second"})
+        server.latency = 0.1
+        slow = asyncio.create_task(backend.get("user", "1"))
+        await asyncio.sleep(0.02)
+        slow.cancel()
+        server.latency = 0
+        return await backend.get("user", "2")
+
+    assert with_redis(scenario) == b"second"
+
+
+def test_redis_command_times_out_and_reconnects():
+    async def scenario(server, backend):
+        await backend.set_many("user", {"1": b"value"})
+        server.latency = 0.2
+        with pytest.raises(asyncio.TimeoutError):
+            await backend.get("user", "1")
+        server.latency = 0
+        return await backend.items("user")
+
+    assert with_redis(scenario, timeout=0.05) == {"1": b"value"}
+
+
+def test_sqlite_backend_round_trip(tmp_path):
+    async def scenario():
+        backend = SQLiteStateBackend(str(tmp_path / "state.sqlite3"))
+        await backend.set_many("chat", {"1": b"a", "2": b"b"})
+        await backend.delete("chat", "2")
+        result = await backend.get("chat", "1"), await backend.get("chat", "2"), await backend.items("chat")
+        await backend.close()
+        return result
+
+    assert asyncio.run(scenario()) == (b"a", None, {"1": b"a"})
@@ -0,0 +1,68 @@
+"""Порядок обработки обновлений по ключу (чат, пользователь)"""
+import asyncio
+import time
+from types import SimpleNamespace
+from services.update_processor import ChatOrderedUpdateProcessor
+
+
+def make_update(update_id: int, chat_id, user_id):
+    return SimpleNamespace(
+        update_id=update_id,
+        effective_chat=SimpleNamespace(id=chat_id) if chat_id is not None else None,
+        effective_user=SimpleNamespace(id=user_id) if user_id is not None else None,
+    )
+
+
+def run_updates(updates: list, delays: dict):
+    processor = ChatOrderedUpdateProcessor(16)
+    finished = []
+
+    async def handle(update):
+        await asyncio.sleep(delays.get(update.update_id, 0))
+        finished.append(update.update_id)
+
+    async def scenario():
+        await asyncio.gather(*(processor.process_update(update, handle(update)) for update in updates))
+
+    asyncio.run(scenario())
+    return processor, finished
+
+
+def test_same_user_in_same_chat_is_processed_in_order():
+    updates = [make_update(number, 10, 1) for number in range(5)]
+    processor, finished = run_updates(updates, {0: 0.03, 1: 0.02, 2: 0.01})
+    assert finished == [0, 1, 2, 3, 4]
+    assert processor.stats()["active_keys"] == 0
+    assert processor.stats()["processed"] == 5
+
+
+def test_other_user_in_group_is_not_blocked():
+    updates = [make_update(1, 10, 1), make_update(2, 10, 2)]
+    _, finished = run_updates(updates, {1: 0.05})
+    assert finished == [2, 1]
+
+
+def test_updates_without_chat_and_user_run_in_parallel():
+    updates = [make_update(1, None, None), make_update(2, None, None)]
+    _, finished = run_updates(updates, {1: 0.05})
+    assert finished == [2, 1]
+
+
+def test_busy_chat_does_not_take_all_slots():
+    processor = ChatOrderedUpdateProcessor(4)
+
+    async def scenario():
+        busy = [asyncio.create_task(processor.process_update(make_update(number, 10, 1), asyncio.sleep(1)))
+                for number in range(6)]
+        await asyncio.sleep(0.01)
+        started = time.perf_counter()
+        await processor.process_update(make_update(100, 20, 2), asyncio.sleep(0))
+        waited = time.perf_counter() - started
+        for task in busy:
+            task.cancel()
+        await asyncio.gather(*busy, return_exceptions=True)
+        return waited
+
+    assert asyncio.run(scenario()) < 0.1
+    assert processor.stats()["waiting"] == 0
+    assert processor.stats()["in_flight"] == 0
@@ -0,0 +1,55 @@
+"""Приём обновлений вебхуком: секретный токен и разделение публичного и служебного эндпоинтов"""
+import asyncio
+import json
+from types import SimpleNamespace
+from config import WEBHOOK_PATH
+from services import webhook
+from services.http_server import HttpRequest
+from services.metrics import metrics_server
+
+UPDATE = json.dumps({"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"},
+                                                  "text": "привет"}}).encode()
+
+
+def make_receiver(queue_size: int = 10) -> webhook.WebhookReceiver:
+    application = SimpleNamespace(bot=None, update_queue=asyncio.Queue(queue_size), update_processor=None)
+    return webhook.WebhookReceiver(application, "секрет-token")
+
+
+def post(receiver, secret: str, body: bytes = UPDATE):
+    headers = {"x-telegram-bot-api-secret-token": secret}
+    return asyncio.run(receiver.handle(HttpRequest("POST", WEBHOOK_PATH, headers, body)))
+
+
+def test_wrong_or_non_ascii_secret_is_rejected():
+    receiver = make_receiver()
+    assert post(receiver, "")[0] == 403
+    assert post(receiver, "wrong")[0] == 403
+    assert post(receiver, "другой-токен")[0] == 403
+    assert receiver.rejected == 3
+    assert receiver.application.update_queue.empty()
+
+
+def test_valid_update_is_queued():
+    receiver = make_receiver()
+    assert post(receiver, "секрет-token")[0] == 200
+    assert receiver.application.update_queue.get_nowait().message.text == "привет"
+
+
+def test_full_queue_answers_503():
+    receiver = make_receiver(queue_size=1)
+    assert post(receiver, "секрет-token")[0] == 200
+    assert post(receiver, "секрет-token")[0] == 503
+    assert receiver.dropped == 1
+
+
+def test_public_server_exposes_only_liveness(monkeypatch):
+    monkeypatch.setattr(metrics_server, "_routes", list(metrics_server._routes))
+    receiver = make_receiver()
+    server = webhook.create_server(receiver)
+
+    health = server._find("GET", "/health")
+    assert asyncio.run(health(HttpRequest("GET", "/health", {}, b""))) == (200, b'{"status": "ok"}',
+                                                                           "application/json")
+    assert server._find("GET", "/status") is None
+    assert ("GET", "/status", receiver.status) in metrics_server._routes
@@ -0,0 +1,84 @@
+"""Воспроизведение обновлений Telegram на вебхук бота (нагрузочная и ручная проверка)
+
+Запуск вместе с подменой Bot API:
+    python -m tests.fakes.fake_telegram 8081
+    TELEGRAM_BASE_URL=http://127.0.0.1:8081 BOT_MODE=webhook WEBHOOK_SET=0 WEBHOOK_SECRET=test python main.py
+    python webhook_replay.py --url http://127.0.0.1:8443/telegram --secret test --sample 200
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+
+
+def sample_updates(count: int, chats: int) -> list:
+    """Синтетические обновления: команды /start от нескольких чатов"""
+    updates = []
+    for number in range(count):
+        chat_id = 1000 + number % chats
+        updates.append({
+            "update_id": number + 1,
+            "message": {
+                "message_id": number + 1,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"},
+                "text": "/start",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 6}]
+            }
+        })
+    return updates
+
+
+def load_updates(path: str) -> list:
+    """Обновления из JSONL-файла, по одному на строку"""
+    with open(path, encoding='utf-8') as updates_file:
+        return [json.loads(line) for line in updates_file if line.strip()]
+
+
+async def replay(url: str, secret: str, updates: list, concurrency: int) -> dict:
+    """Отправка обновлений с ограниченным параллелизмом; возвращает статистику ответов"""
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+    latencies = []
+
+    async with httpx.AsyncClient(headers={"X-Telegram-Bot-Api-Secret-Token": secret}) as client:
+        async def send(update):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(url, json=update)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(update) for update in updates))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "sent": len(updates),
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(updates) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1) if latencies else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение обновлений на вебхук бота")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--file", help="JSONL с обновлениями Telegram")
+    parser.add_argument("--sample", type=int, default=50, help="число синтетических обновлений, если нет --file")
+    parser.add_argument("--chats", type=int, default=10, help="число разных чатов в синтетических обновлениях")
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    updates = load_updates(args.file) if args.file else sample_updates(args.sample, args.chats)
+    print(json.dumps(asyncio.run(replay(args.url, args.secret, updates, args.concurrency)), indent=2))
+
+
+if __name__ == "__main__":
+    main()